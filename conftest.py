@@ -0,0 +1,2 @@
+# test_api.py - ручной сценарий против живого узла (HTTP), не тест pytest
+collect_ignore = ["test_api.py"]
@@ -1,20 +1,46 @@
+import os
+import sys
+import struct
 import hashlib
+from array import array
 import nacl.signing
 import nacl.encoding
 
+# Режимы хеширования слов VM. Режим блока записывается в хранилище флагом
+# FLAG_WORD_HASH, поэтому цепочки с прежними хешами проверяются как раньше.
+HASH_BYTES = 0  # v0: от каждого слова берется младший байт (исходная модель)
+HASH_WORDS = 1  # v1: слово целиком, 8 байт big-endian
+HASH_MODES = (HASH_BYTES, HASH_WORDS)
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+_DIGEST = struct.Struct(">8Q")
+_LITTLE = sys.byteorder == "little"
+
 
 # Функция для превращения байтов в список 64-битных чисел (для VM)
 def bytes_to_vm_words(data_bytes):
-    words = []
-    # Разбиваем по 8 байт (64 бита)
-    for i in range(0, len(data_bytes), 8):
-        chunk = data_bytes[i:i + 8]
-        # Дополняем нулями, если кусок меньше 8 байт
-        if len(chunk) < 8:
-            chunk = chunk.ljust(8, b'\x00')
-        val = int.from_bytes(chunk, byteorder='big')
-        words.append(val)
-    return words
+    # Разбиваем по 8 байт (64 бита), неполный хвост дополняется нулями
+    n = (len(data_bytes) + 7) // 8
+    return list(struct.unpack(f">{n}Q", bytes(data_bytes).ljust(8 * n, b'\x00')))
+
+
+def pack_words(words, mode=HASH_BYTES):
+    """
+    Слова VM (array('Q') или список) -> байты для хеша в режиме mode одним
+    вызовом, без цикла по словам. array может быть переставлен на месте
+    (передается срез кучи).
+    """
+    if not isinstance(words, array):
+        words = array("Q", [w & MASK64 for w in words])
+    if mode == HASH_WORDS:
+        if _LITTLE: words.byteswap()
+        return words.tobytes()
+    return words.tobytes()[0 if _LITTLE else 7::8]
+
+
+def digest_words(digest):
+    """64 байта дайджеста -> 8 слов h0-h7."""
+    return _DIGEST.unpack(digest)
 
 
 def get_sha512_hash(data_bytes):
@@ -22,8 +48,7 @@ def get_sha512_hash(data_bytes):
     Возвращает хеш как список из 8 целых чисел (8 x 64 бит = 512 бит).
     Это соответствует структуре h0-h7 в chain.json.
     """
-    digest = hashlib.sha512(data_bytes).digest()
-    return bytes_to_vm_words(digest)
+    return list(digest_words(hashlib.sha512(data_bytes).digest()))
 
 
 def generate_ed25519_keys():
@@ -41,6 +66,14 @@ def generate_ed25519_keys():
     return bytes_to_vm_words(pub_bytes), bytes_to_vm_words(priv_bytes)
 
 
+def wallet_id(pub_key_words):
+    """
+    ID кошелька - первое слово публичного ключа: он одинаков после любого
+    перезапуска узла и не повторяется у разных ключей (64 случайных бита).
+    """
+    return pub_key_words[0]
+
+
 def sign_data(message_bytes, priv_key_words):
     """
     Подписывает сообщение.
@@ -53,4 +86,21 @@ def sign_data(message_bytes, priv_key_words):
     signed = signing_key.sign(message_bytes)
 
     # Возвращаем подпись (64 байта -> 8 слов)
-    return bytes_to_vm_words(signed.signature)
\ No newline at end of file
+    return bytes_to_vm_words(signed.signature)
+
+
+def load_signing_key(path):
+    """Ключ Ed25519 узла (32 байта seed в path); если файла нет, он создается (0600)."""
+    try:
+        with open(path, "rb") as f:
+            return nacl.signing.SigningKey(f.read())
+    except FileNotFoundError:
+        pass
+    key = nacl.signing.SigningKey.generate()
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:  # Ключ только что создал другой процесс
+        return load_signing_key(path)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key.encode())
+    return key
@@ -1,9 +1,20 @@
 import os
 import sys
+import shutil
+import tempfile
+import argparse
+import time
 from xlang_lexer import tokenize
 from xlang_parser import Parser
 from xlang_codegen import CodeGen
+from xlang_peephole import optimize
+from xlang_optimizer import optimize_ast
+from xlang_cache import load_artifact, save_artifact, artifact_path
 from xvm import XVM
+from xvm_memory import BACKENDS, DEFAULT_BACKEND, footprint
+from xvm_blockstore import CHAIN_STORE, CHAIN_JSON, reconcile
+from xvm_snapshot import load_snapshot, save_snapshot
+from xvm_sig import mint_message, sign_words
 
 
 def load_program(filename, visited=None):
@@ -66,26 +77,187 @@ def load_program(filename, visited=None):
     return all_vars, all_funcs
 
 
-def run_pipeline(entry_file):
-    try:
-        # 1. Сбор всех исходников
-        final_vars, final_funcs = load_program(entry_file)
-        print(f"[Compiler] Compiled {len(final_vars)} globals, {len(final_funcs)} functions.")
+# Уровни оптимизации: 0 - без оптимизаций, 1 - peephole,
+# 2 - свертка констант и удаление мертвого кода + peephole, 3 - 2 + инлайнинг
+OPT_LEVELS = (0, 1, 2, 3)
+DEFAULT_OPT_LEVEL = 3
 
-        # 2. Генерация байт-кода
-        cg = CodeGen()
-        bytecode = cg.gen(final_vars, final_funcs)
-        print(f"[Compiler] Bytecode size: {len(bytecode)} bytes.")
 
-        # 3. Запуск в виртуальной машине
-        print("--- EXECUTION START ---")
-        vm = XVM(bytecode)
+def compile_program(entry_file, opt_level=DEFAULT_OPT_LEVEL, use_cache=True):
+    """
+    Компилирует программу. Возвращает (CodeGen, статистика peephole или None).
+    С use_cache берет готовый байт-код из .xlc, если исходники не менялись.
+    """
+    if use_cache:
+        cg = load_artifact(entry_file, opt_level)
+        if cg is not None:
+            print(f"[Compiler] Loaded cached bytecode from {artifact_path(entry_file)}.")
+            return cg, None
+
+    sources = set()
+    final_vars, final_funcs = load_program(entry_file, sources)
+    print(f"[Compiler] Compiled {len(final_vars)} globals, {len(final_funcs)} functions.")
+    if opt_level >= 2:
+        final_vars, final_funcs, consts = optimize_ast(final_vars, final_funcs)
+        print(f"[Compiler] Constant globals propagated: {', '.join(sorted(consts)) or 'none'}.")
+    cg = CodeGen(inline=opt_level >= 3)
+    cg.gen(final_vars, final_funcs)
+    if cg.inline:
+        print(f"[Compiler] Inlined {len(cg.inline_stats['functions'])} functions, "
+              f"removed {cg.inline_stats['calls_removed']} CALL instructions.")
+    stats = optimize(cg) if opt_level >= 1 else None
+    if stats:
+        print(f"[Compiler] Peephole: {stats['size_before']} -> {stats['size_after']} words, "
+              f"{stats['fused']} fused, {stats['removed']} removed.")
+    if use_cache:
+        try:
+            save_artifact(entry_file, cg, sources, opt_level)
+        except OSError as e:
+            print(f"[Compiler] Could not write {artifact_path(entry_file)}: {e}")
+    return cg, stats
+
+
+def create_vm(cg, **kwargs):
+    """Создает VM для скомпилированной программы и загружает строки."""
+    vm = XVM(cg.code, functions=cg.func_addresses, **kwargs)
+    vm.load_strings(cg.string_pool)
+    vm.hp = vm.heap_high_water = cg.next_string_addr
+    return vm
+
+
+def init_globals(vm, cg):
+    """Прокручивает VM до начала main(), чтобы инициализировать глобальные переменные."""
+    main_addr = cg.func_addresses.get("main")
+    if main_addr is not None:
+        safety_limit = 50000
+        while vm.pc < main_addr and vm.running and safety_limit > 0:
+            vm.step()
+            safety_limit -= 1
+
+
+def boot_node(vm, cg, snapshot=None):
+    """
+    Загрузка узла: инициализация глобальных переменных, восстановление
+    состояния из хранилища блоков (или новая цепочка) и база организаций.
+    С snapshot (путь к снимку VM) состояние берется из снимка, если он
+    сделан тем же байт-кодом на той же вершине цепочки; иначе узел
+    загружается обычным путем и снимок перезаписывается.
+    """
+    # Старая цепочка только в chain.json переносится в chain.blk
+    store = vm.block_store(CHAIN_STORE)
+    reconcile(store, CHAIN_JSON)
+    if snapshot and load_snapshot(vm, store, snapshot):
+        print(f"[Server] VM state restored from snapshot {snapshot}.")
+        return
+
+    init_globals(vm, cg)
+
+    # Все, что выделено при глобальной инициализации, остается в постоянной
+    # области кучи; текст chain.json и прочее временное - в арене
+    with vm.arena():
+        # Попытка восстановить состояние из хранилища блоков
+        addr_load_state = cg.func_addresses.get("bc_load_state")
+        state_loaded = False
+        if addr_load_state:
+            res = vm.execute_function(addr_load_state, [])
+            if res == 1:
+                state_loaded = True
+
+        # Если файла нет или он пуст, инициализируем новую цепочку
+        if not state_loaded:
+            print("[Server] Initializing new chain...")
+            addr_init = cg.func_addresses.get("bc_init")
+            if addr_init:
+                vm.execute_function(addr_init, [])
 
-        # Загружаем строки в память VM
-        vm.load_strings(cg.string_pool)
-        vm.hp = cg.next_string_addr
+        # Инициализация базы организаций
+        addr_base_init = cg.func_addresses.get("base_init")
+        if addr_base_init:
+            vm.execute_function(addr_base_init, [])
 
+    if snapshot:
+        save_snapshot(vm, store, snapshot)
+
+
+def opt_report(entry_file):
+    """Размер байт-кода и число шагов VM на каждом уровне -O для main() и загрузки узла."""
+    chain = os.path.abspath("chain.json")
+    rows = []
+    for level in OPT_LEVELS:
+        cg, _ = compile_program(entry_file, opt_level=level, use_cache=False)
+        cwd = os.getcwd()
+        work = tempfile.mkdtemp(prefix="xlang_report_")
+        try:
+            os.chdir(work)
+            vm = create_vm(cg, engine="reference")
+            vm.run()
+            run_steps = vm.steps
+
+            if os.path.exists(chain): shutil.copy(chain, "chain.json")
+            else: os.remove("chain.json")
+            vm = create_vm(cg, engine="reference")
+            boot_node(vm, cg)
+            boot_steps = vm.steps
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(work, ignore_errors=True)
+        rows.append((level, len(cg.code), run_steps, boot_steps))
+
+    print(f"{'level':<10}{'size':>8}{'main steps':>14}{'boot steps':>14}")
+    for level, size, run_steps, boot_steps in rows:
+        print(f"{'-O' + str(level):<10}{size:>8}{run_steps:>14}{boot_steps:>14}")
+    return rows
+
+
+def memory_report(entry_file, mints=20):
+    """
+    Объем памяти VM (code + memory + heap) и шаги/сек эталонного движка для
+    каждого бэкенда. Нагрузка: новая цепочка, кошелек и mints NFT.
+    """
+    cg, _ = compile_program(entry_file)
+    rows = []
+    for backend in BACKENDS:
+        cwd = os.getcwd()
+        work = tempfile.mkdtemp(prefix="xlang_report_")
+        try:
+            os.chdir(work)
+            vm = create_vm(cg, engine="reference", backend=backend)
+            t = time.perf_counter()
+            boot_node(vm, cg)
+            keys = vm.execute_function(cg.func_addresses["action_create_wallet"], [1])
+            pub, priv, owner = vm.heap[keys:keys + 3]
+            for i in range(mints):
+                # Хеш документа (8 слов) и подпись создателя (8 слов); ключ лежит по адресу pub
+                doc = vm.hp
+                vm.hp += 16
+                for j in range(8): vm.heap[doc + j] = i * 8 + j
+                message = mint_message(i + 1, owner, owner, vm.heap[doc:doc + 8])
+                for j, w in enumerate(sign_words(vm.heap[priv:priv + 4], message)): vm.heap[doc + 8 + j] = w
+                vm.execute_function(cg.func_addresses["action_nft_create"], [i + 1, owner, owner, doc, pub, doc + 8])
+            elapsed = time.perf_counter() - t
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(work, ignore_errors=True)
+        size = footprint(vm.code) + footprint(vm.memory) + footprint(vm.heap)
+        rows.append((backend, size, len(vm.heap), vm.steps / elapsed if elapsed else 0))
+
+    print(f"{'backend':<10}{'footprint KiB':>16}{'heap words':>12}{'steps/s':>12}")
+    for backend, size, heap_words, rate in rows:
+        print(f"{backend:<10}{size // 1024:>16}{heap_words:>12}{rate:>12.0f}")
+    return rows
+
+
+def run_pipeline(entry_file, jit=True, opt_level=DEFAULT_OPT_LEVEL, use_cache=True, backend=DEFAULT_BACKEND):
+    try:
+        # 1-2. Сбор всех исходников и генерация байт-кода (или готовый .xlc)
+        cg, _ = compile_program(entry_file, opt_level=opt_level, use_cache=use_cache)
+        print(f"[Compiler] Bytecode size: {len(cg.code)} bytes.")
+
+        # 3. Запуск в виртуальной машине
+        print("--- EXECUTION START ---")
+        vm = create_vm(cg, jit=jit, backend=backend)
         vm.run()
+        vm.chain_writer.close()
         vm.dump_heap()
         print("--- EXECUTION FINISHED ---")
 
@@ -96,4 +268,20 @@ def run_pipeline(entry_file):
 
 
 if __name__ == "__main__":
-    run_pipeline("main.xl")
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="xlang compiler and XVM runner")
+    ap.add_argument("entry", nargs="?", default="main.xl")
+    ap.add_argument("--no-jit", action="store_true", help="disable the XVM JIT tier")
+    ap.add_argument("-O", dest="opt_level", type=int, choices=OPT_LEVELS, default=DEFAULT_OPT_LEVEL,
+                    help="optimization level")
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not write the .xlc bytecode cache")
+    ap.add_argument("--memory", choices=BACKENDS, default=DEFAULT_BACKEND, help="XVM memory backend")
+    ap.add_argument("--report", action="store_true", help="compare bytecode size and steps for every -O level")
+    ap.add_argument("--memory-report", action="store_true", help="compare footprint and steps/s of memory backends")
+    args = ap.parse_args()
+    if args.report:
+        opt_report(args.entry)
+    elif args.memory_report:
+        memory_report(args.entry)
+    else:
+        run_pipeline(args.entry, jit=not args.no_jit, opt_level=args.opt_level, use_cache=not args.no_cache,
+                     backend=args.memory)
\ No newline at end of file
@@ -1,20 +1,85 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List
+import time
+import asyncio
 from contextlib import asynccontextmanager
 import uvicorn
 import traceback
-import json
 import os
+import sys
+import subprocess
 
 # Импортируем компоненты компилятора
-from xlang_codegen import CodeGen
-from xvm import XVM
-from main import load_program
+from xvm import JIT_THRESHOLD
+from xvm_memory import store, DEFAULT_BACKEND
+from xvm_chainwriter import ChainWriter, DEFAULT_FSYNC, interval_sync
+from xvm_blockstore import CHAIN_STORE, BlockStore, block_record
+from xvm_audit import deep_audit, GENESIS_PREV
+from xvm_snapshot import SNAPSHOT_FILE, save_snapshot
+from xvm_state import WorldState, NFT_ACTIVE, READ_CACHE_SIZE
+from xvm_executor import VMExecutor, QueueFull, QUEUE_DEPTH
+from xvm_replica import ChainView, verify_chain
+from xvm_merkle import sign_root
+from xvm_sig import SIG_WORDS, mint_message, transfer_message
+from crypto import load_signing_key
+from main import compile_program, create_vm, boot_node, DEFAULT_OPT_LEVEL
 
 # Глобальные переменные
 vm = None
 cg = None
+world = None  # Индекс NFT и кошельков (xvm_state), только в потоке цикла событий
+executor = None  # Единственный поток, в котором выполняется VM
+node_key = None  # Ключ Ed25519, которым узел подписывает Merkle root (/root, /proof)
+pending_mints = set()  # nft_id, чей mint уже в очереди VM
+pending_transfers = set()  # nft_id, чья передача уже в очереди VM
+unsealed_nfts = {}  # nft_id -> (номер блока, владелец, nonce) после изменений, еще не запечатанных мемпулом
+unsealed_wallets = {}  # pub_key -> (номер блока, ключ Ed25519) кошельков, еще не запечатанных мемпулом
+seal_task = None  # Периодическое запечатывание мемпула
+fsync_task = None  # Таймер fsync политики XVM_FSYNC=interval:MS
+replica_verified = (1, GENESIS_PREV)  # Реплика: (с какого блока продолжать /verify, h предыдущего)
+
+# JIT-уровень VM: XVM_JIT=0 отключает, XVM_JIT_THRESHOLD - порог входов в функцию
+XVM_JIT = os.environ.get("XVM_JIT", "1") != "0"
+XVM_JIT_THRESHOLD = int(os.environ.get("XVM_JIT_THRESHOLD", JIT_THRESHOLD))
+# Хранилище слов VM: array (по умолчанию) или list (для отладки)
+XVM_MEMORY = os.environ.get("XVM_MEMORY", DEFAULT_BACKEND)
+# Политика fsync записи блоков: block | count:N | interval:MS | none
+XVM_FSYNC = os.environ.get("XVM_FSYNC", DEFAULT_FSYNC)
+# Уровень оптимизации компилятора xlang (как -O у main.py)
+XLANG_OPT = int(os.environ.get("XLANG_OPT", DEFAULT_OPT_LEVEL))
+# XLANG_CACHE=0 отключает кеш скомпилированного байт-кода (main.xlc)
+XLANG_CACHE = os.environ.get("XLANG_CACHE", "1") != "0"
+# Снимок VM после загрузки для быстрого старта; пустое значение отключает
+XVM_SNAPSHOT = os.environ.get("XVM_SNAPSHOT", SNAPSHOT_FILE)
+# Глубина очереди команд VM; при переполнении запрос получает 429
+XVM_QUEUE_DEPTH = int(os.environ.get("XVM_QUEUE_DEPTH", QUEUE_DEPTH))
+# Максимум операций в одном /batch (пакет занимает VM целиком)
+XVM_BATCH_MAX = int(os.environ.get("XVM_BATCH_MAX", "10000"))
+# Размер LRU-кеша ответов read-эндпоинтов (0 отключает)
+XVM_READ_CACHE = int(os.environ.get("XVM_READ_CACHE", READ_CACHE_SIZE))
+# Процессы глубокого аудита (/verify?mode=deep), 0 - по числу CPU
+XVM_AUDIT_WORKERS = int(os.environ.get("XVM_AUDIT_WORKERS", "0"))
+# Период полного переаудита цепочки в секундах (0 - только по запросу mode=full)
+XVM_VERIFY_FULL_EVERY = float(os.environ.get("XVM_VERIFY_FULL_EVERY", "0"))
+# Мемпул: блок запечатывается при XVM_BLOCK_TXS транзакциях или через XVM_BLOCK_MS мс
+# (1 - каждая транзакция сразу отдельным блоком, как раньше). Пока транзакция только
+# в мемпуле, ответ - status "pending" с номером будущего блока: до запечатывания
+# она в памяти и при сбое узла теряется
+XVM_BLOCK_TXS = int(os.environ.get("XVM_BLOCK_TXS", "1"))
+XVM_BLOCK_MS = float(os.environ.get("XVM_BLOCK_MS", "200"))
+# Режим хеша новых блоков: 1 - слова целиком (по умолчанию), 0 - младший байт слова (как раньше).
+# Режим записан в каждом блоке, поэтому старые блоки проверяются в своем
+XVM_HASH_MODE = int(os.environ.get("XVM_HASH_MODE", "1"))
+# Файл ключа подписи корней Merkle (общий для писателя и реплик; создается при первом старте)
+XVM_NODE_KEY = os.environ.get("XVM_NODE_KEY", "node.key")
+# writer - процесс с VM (запись и чтение), reader - реплика чтения без VM (mmap цепочки)
+XVM_ROLE = os.environ.get("XVM_ROLE", "writer")
+# Число процессов-реплик, которые писатель запускает на XVM_READER_PORT (0 - без реплик)
+XVM_READERS = int(os.environ.get("XVM_READERS", "0"))
+XVM_READER_PORT = int(os.environ.get("XVM_READER_PORT", "8001"))
+VERIFY_MODES = {"incremental": "bc_verify_incremental", "full": "bc_verify_full_integrity"}
+last_full_verify = 0.0
 
 
 @asynccontextmanager
@@ -23,49 +88,45 @@ async def lifespan(app: FastAPI):
     Обработчик жизненного цикла приложения.
     Запускается при старте сервера и инициализирует блокчейн.
     """
-    global vm, cg
+    global vm, cg, world, executor, seal_task, fsync_task, node_key
+    node_key = load_signing_key(XVM_NODE_KEY)
+    if XVM_ROLE == "reader":
+        # Реплика: только индекс состояния поверх mmap, вершину публикует писатель
+        world = WorldState(ChainView(CHAIN_STORE), cache_size=XVM_READ_CACHE)
+        print(f"[Replica {os.getpid()}] World state: {len(world.nfts)} NFTs, {len(world.wallets)} wallets.")
+        yield
+        world.store.close()
+        return
+
     print("[Server] Compiling blockchain logic...")
     try:
-        # 1. Загрузка и компиляция
-        vars_, funcs = load_program("main.xl")
-        cg = CodeGen()
-        bytecode = cg.gen(vars_, funcs)
+        # 1. Загрузка и компиляция (или готовый байт-код из main.xlc)
+        cg, _ = compile_program("main.xl", opt_level=XLANG_OPT, use_cache=XLANG_CACHE)
 
         # 2. Инициализация VM
-        vm = XVM(bytecode)
-        vm.load_strings(cg.string_pool)
-        vm.hp = cg.next_string_addr
+        vm = create_vm(cg, jit=XVM_JIT, jit_threshold=XVM_JIT_THRESHOLD, backend=XVM_MEMORY,
+                       chain_writer=ChainWriter(XVM_FSYNC))
 
-        # --- BOOT SEQUENCE ---
+        # 3. Загрузка: глобальные переменные, состояние цепочки, база организаций
+        # (или готовый снимок VM, если байт-код и вершина цепочки те же)
         print("[Server] Booting VM memory...")
-        main_addr = cg.func_addresses.get("main")
-
-        # Прокручиваем VM до начала main(), чтобы инициализировать глобальные переменные
-        if main_addr is not None:
-            safety_limit = 50000
-            while vm.pc < main_addr and vm.running and safety_limit > 0:
-                vm.step()
-                safety_limit -= 1
-
-        # 3. Попытка восстановить состояние из chain.json
-        addr_load_state = cg.func_addresses.get("bc_load_state")
-        state_loaded = False
-        if addr_load_state:
-            res = vm.execute_function(addr_load_state, [])
-            if res == 1:
-                state_loaded = True
-
-        # Если файла нет или он пуст, инициализируем новую цепочку
-        if not state_loaded:
-            print("[Server] Initializing new chain...")
-            addr_init = cg.func_addresses.get("bc_init")
-            if addr_init:
-                vm.execute_function(addr_init, [])
-
-        # Инициализация базы организаций
-        addr_base_init = cg.func_addresses.get("base_init")
-        if addr_base_init:
-            vm.execute_function(addr_base_init, [])
+        boot_node(vm, cg, snapshot=XVM_SNAPSHOT)
+        vm.execute_function(cg.func_addresses["bc_mempool_init"], [XVM_BLOCK_TXS])
+        vm.execute_function(cg.func_addresses["bc_hash_init"], [XVM_HASH_MODE])
+
+        # 4. Индекс состояния: один проход по цепочке, дальше - только новые блоки.
+        # Свой дескриптор хранилища, чтобы чтение не мешало записи из потока VM
+        world = WorldState(BlockStore(CHAIN_STORE, readonly=True), cache_size=XVM_READ_CACHE)
+        print(f"[Server] World state: {len(world.nfts)} NFTs, {len(world.wallets)} wallets.")
+
+        # 5. Очередь команд VM
+        executor = VMExecutor(XVM_QUEUE_DEPTH)
+        executor.start()
+        if XVM_BLOCK_TXS > 1:
+            seal_task = asyncio.get_running_loop().create_task(seal_loop())
+        if vm.chain_writer.policy == "interval":
+            # Блок без fsync синхронизируется не позже чем через MS, даже без нового трафика
+            fsync_task = asyncio.get_running_loop().create_task(interval_sync(vm.chain_writer, submit_background))
 
         print("[Server] Node started successfully. Ready for requests.")
 
@@ -75,6 +136,21 @@ async def lifespan(app: FastAPI):
 
     yield
     print("[Server] Shutting down...")
+    if seal_task:
+        seal_task.cancel()
+    if fsync_task:
+        fsync_task.cancel()
+    if executor:
+        await executor.stop()
+        # Поток VM остановлен - остаток мемпула запечатывается здесь
+        vm_seal()
+    if world:
+        world.store.close()
+    if vm:
+        vm.chain_writer.close()
+        # Снимок на текущей вершине: следующий старт восстановит его без загрузки
+        if XVM_SNAPSHOT and cg:
+            save_snapshot(vm, vm.block_store(CHAIN_STORE), XVM_SNAPSHOT)
 
 
 # Создаем приложение
@@ -83,132 +159,626 @@ app = FastAPI(title="Gem Blockchain API Node", lifespan=lifespan)
 
 # --- Схемы данных API ---
 
-class CreateWalletRequest(BaseModel):
+class Request(BaseModel):
+    """Запрос с неизвестными полями отклоняется (422), а не молча теряет их (например, private_key)."""
+    model_config = ConfigDict(extra="forbid")
+
+
+class CreateWalletRequest(Request):
     role: int
 
 
-class NFTRequest(BaseModel):
+# signature - подпись Ed25519 (8 слов) ключом кошелька, см. xvm_sig:
+# mint - создателем над [2, nft_id, owner, creator, doc_hash], transfer - владельцем
+# над [3, nft_id, new_owner, nonce]. Секретный ключ узлу не передается.
+
+class NFTRequest(Request):
     nft_id: int
     owner: int
     creator: int
-    private_key: int
     doc_hash: List[int]
+    signature: List[int] = []
 
 
-class TransferRequest(BaseModel):
+class TransferRequest(Request):
     nft_id: int
     new_owner: int
-    private_key: int
+    nonce: int
+    signature: List[int] = []
+
+
+class BatchOp(Request):
+    """Операция пакета: op = wallet | mint | transfer и поля соответствующего запроса."""
+    op: str
+    role: int = 0
+    nft_id: int = 0
+    owner: int = 0
+    creator: int = 0
+    new_owner: int = 0
+    nonce: int = 0
+    doc_hash: List[int] = []
+    signature: List[int] = []
+
+
+class BatchRequest(Request):
+    ops: List[BatchOp]
+
+
+# Операция пакета -> функция VM
+BATCH_ACTIONS = {"wallet": "action_create_wallet", "mint": "action_nft_create", "transfer": "action_nft_transfer"}
 
 
 # --- Вспомогательные функции ---
 
-def check_nft_exists(nft_id):
-    """Проверяет, существует ли уже NFT с таким ID в файле chain.json"""
-    if not os.path.exists("chain.json"):
-        return False
+def require_node():
+    if XVM_ROLE == "reader":
+        raise HTTPException(status_code=503, detail="Read replica: send writes to the writer node")
+    if not vm or not cg or not executor:
+        raise HTTPException(status_code=503, detail="Node not initialized")
+
+
+async def run_vm(fn, *args):
+    """Выполняет fn в потоке VM через очередь; полная очередь - 429."""
+    require_node()
+    try:
+        return await executor.submit(fn, *args)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+def world_state():
+    """Индекс состояния с примененными последними блоками."""
+    state = world.sync()
+    for unsealed in (unsealed_nfts, unsealed_wallets):
+        for key in [k for k, v in unsealed.items() if v[0] <= state.height]:
+            del unsealed[key]
+    return state
+
+
+def wallet_key(state, pub_key):
+    """Ключ Ed25519 кошелька (4 слова) с учетом мемпула или None."""
+    if pub_key in unsealed_wallets:
+        return unsealed_wallets[pub_key][1]
+    return state.verify_key(pub_key)
+
+
+def register_wallet(state, pub_key, block, verify_key):
+    """
+    Учитывает новый кошелек (если его блок еще в мемпуле); False, если ID
+    уже занят другим кошельком - тогда его блок не применяется (xvm_state),
+    а ключ прежнего владельца ID остается.
+    """
+    known = wallet_key(state, pub_key)
+    if known is None and state.role(pub_key) is None:
+        if block > state.height:
+            unsealed_wallets[pub_key] = (block, verify_key)
+        return True
+    return known is not None and list(known) == verify_key
+
+
+def nft_head(state, nft_id):
+    """
+    (владелец, nonce, статус) NFT с учетом мемпула или None. nonce - число
+    изменений NFT (создание - 1), подпись передачи привязана к нему.
+    """
+    if nft_id in unsealed_nfts:
+        _, owner, nonce = unsealed_nfts[nft_id]
+        return owner, nonce, NFT_ACTIVE
+    nft = state.nft(nft_id)
+    return nft and (nft.owner, len(state.history[nft_id]), nft.status)
+
+
+def signature_error(sig):
+    return None if len(sig) == SIG_WORDS else f"signature must be {SIG_WORDS} integers"
+
+
+def mempool_size():
+    return vm.memory[cg.globals["mempool_count"]]
+
+
+async def submit_background(fn):
+    """Фоновая команда VM (таймеры); при полной очереди пропускается до следующего раза."""
     try:
-        with open("chain.json", "r", encoding="utf-8") as f:
-            content = f.read().strip()
-            if not content: return False
-            data = json.loads(content)
-
-            for block in data:
-                # Тип 2 = NFT Creation
-                if block.get("type") == 2:
-                    payload = block.get("payload", {})
-                    if payload.get("nft_id") == nft_id:
-                        return True
-    except Exception:
-        # Если ошибка чтения JSON, считаем, что дубликатов нет (или файл битый)
-        pass
-    return False
+        return await executor.submit(fn)
+    except QueueFull:
+        return None
+
+
+async def seal_loop():
+    """Раз в XVM_BLOCK_MS запечатывает непустой мемпул; при полной очереди ждет следующего раза."""
+    while True:
+        await asyncio.sleep(XVM_BLOCK_MS / 1000)
+        if mempool_size():
+            try:
+                await submit_background(vm_seal)
+            except Exception:
+                traceback.print_exc()
+
+
+# --- Команды VM (выполняются только в потоке исполнителя) ---
+
+def vm_create_wallet(addr, role):
+    # Вызываем функцию VM. Она сама сгенерирует ключи.
+    # Возвращает адрес массива в памяти [pub, priv, wallet_id] (в арене запроса)
+    with vm.arena():
+        keys_ptr = vm.execute_function(addr, [role])
+
+        # Считываем ключи из памяти VM до конца арены: 4 слова ключа Ed25519 и seed
+        pub_ptr, priv_ptr, pub_key = vm.heap[keys_ptr:keys_ptr + 3]
+        verify_key = list(vm.heap[pub_ptr:pub_ptr + 4])
+        signing_key = list(vm.heap[priv_ptr:priv_ptr + 4])
+
+    # Блок, в который попадет кошелек (если он еще в мемпуле - будущий)
+    index, pending = vm.memory[cg.globals["block_index"]], mempool_size() > 0
+    return pub_key, verify_key, signing_key, (index if pending else index - 1), pending
+
+
+def wallet_record(pub_key, verify_key, signing_key):
+    return {"public_key": pub_key, "verify_key": verify_key, "signing_key": signing_key}
+
+
+def heap_words(values):
+    """Копирует слова в кучу VM (внутри арены запроса), возвращает указатель."""
+    ptr = vm.hp
+    for i, val in enumerate(values):
+        store(vm.heap, ptr + i, val)
+    vm.hp += len(values)
+    return ptr
+
+
+def vm_mint_nft(addr, req, creator_key):
+    with vm.arena():
+        # Хеш документа, ключ создателя и подпись - в память VM
+        hash_ptr = heap_words(req.doc_hash)
+        key_ptr = heap_words(creator_key)
+        sig_ptr = heap_words(req.signature)
+        return vm.execute_function(addr, [req.nft_id, req.owner, req.creator, hash_ptr, key_ptr, sig_ptr])
+
+
+def vm_transfer_nft(addr, req, owner_key):
+    with vm.arena():
+        key_ptr = heap_words(owner_key)
+        sig_ptr = heap_words(req.signature)
+        return vm.execute_function(addr, [req.nft_id, req.new_owner, key_ptr, sig_ptr, req.nonce])
+
+
+def vm_call(addr, args):
+    with vm.arena():
+        return vm.execute_function(addr, args)
+
+
+def vm_seal():
+    return vm_call(cg.func_addresses["bc_seal_block"], [])
+
+
+def vm_sealed_at(fn, *args):
+    """
+    fn(*args), номер блока с последней транзакцией и True, если она еще в
+    мемпуле (блок будущий, на диске транзакции пока нет).
+    """
+    result = fn(*args)
+    index, pending = vm.memory[cg.globals["block_index"]], mempool_size() > 0
+    return result, (index if pending else index - 1), pending
+
+
+def commit_status(pending):
+    """success - транзакция записана в блок; pending - ждет запечатывания мемпула."""
+    return "pending" if pending else "success"
+
+
+def vm_verify(addr):
+    with vm.arena():
+        result = vm.execute_function(addr, [])
+    return result, vm.memory[cg.globals["verify_checked"]]
+
+
+def vm_batch(ops, keys):
+    """
+    Пакет операций в одном входе в поток VM: блоки пишутся в chain.json
+    одним write с одним fsync. После исключения VM остальные операции
+    не выполняются (skipped). В конце мемпул запечатывается, так что
+    ответ приходит после записи всех блоков пакета. keys - ключи Ed25519
+    подписантов mint/transfer по номеру операции (подписи уже проверены).
+    """
+    addrs = {op: cg.func_addresses.get(name) for op, name in BATCH_ACTIONS.items()}
+    results = []
+    with vm.batch():
+        for i, (op, req) in enumerate(ops):
+            try:
+                if op == "wallet":
+                    *wallet, current_idx, _ = vm_create_wallet(addrs[op], req.role)
+                    results.append({"status": "success", "block_index": current_idx,
+                                    "wallet": wallet_record(*wallet)})
+                    continue
+                if op == "mint":
+                    result = vm_mint_nft(addrs[op], req, keys[i])
+                else:
+                    result = vm_transfer_nft(addrs[op], req, keys[i])
+                results.append({"status": "success"} if result else
+                               {"status": "error", "message": "Unauthorized or system error"})
+            except Exception as e:
+                traceback.print_exc()
+                results.append({"status": "error", "message": str(e)})
+                break
+        vm_seal()
+    return results + [{"status": "skipped"}] * (len(ops) - len(results))
+
+
+def vm_save_audit_checkpoint(report):
+    chain = vm.block_store(CHAIN_STORE)
+    if report["blocks"] == len(chain):
+        chain.save_checkpoint(report["blocks"], report["tip_hash"])
 
 
 # --- Эндпоинты ---
 
 @app.post("/create_wallet")
-def create_wallet(req: CreateWalletRequest):
-    if not vm or not cg:
-        raise HTTPException(status_code=503, detail="Node not initialized")
+async def create_wallet(req: CreateWalletRequest):
+    require_node()
 
     addr = cg.func_addresses.get("action_create_wallet")
     if addr is None:
         raise HTTPException(status_code=500, detail="Function not found")
 
-    # Вызываем функцию VM. Она сама сгенерирует ключи.
-    # Возвращает адрес массива в памяти [pub, priv]
-    keys_ptr = vm.execute_function(addr, [req.role])
-
-    # Считываем ключи из памяти VM
-    pub_key = vm.heap[keys_ptr]
-    priv_key = vm.heap[keys_ptr + 1]
-
-    # Получаем текущий индекс блока
-    idx_addr = cg.globals.get('block_index')
-    current_idx = vm.memory[idx_addr] if idx_addr is not None else -1
+    pub_key, verify_key, signing_key, current_idx, pending = await run_vm(vm_create_wallet, addr, req.role)
+    if not register_wallet(world_state(), pub_key, current_idx, verify_key):
+        raise HTTPException(status_code=409, detail=f"Wallet ID {pub_key} is already registered")
 
     return {
-        "status": "success",
+        "status": commit_status(pending),
         "block_index": current_idx,
-        "wallet": {
-            "public_key": pub_key,
-            "private_key": priv_key
-        }
+        "wallet": wallet_record(pub_key, verify_key, signing_key)
     }
 
 
+async def check_signature(key, words, signature):
+    """Подпись проверяется в пуле потоков до входа в VM; в VM она попадет в кеш."""
+    ok = await asyncio.get_running_loop().run_in_executor(None, vm.verifier.verify, key, words, signature)
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+
 @app.post("/mint_nft")
-def mint_nft(req: NFTRequest):
-    if not vm or not cg:
-        raise HTTPException(status_code=503, detail="Node not initialized")
+async def mint_nft(req: NFTRequest):
+    require_node()
 
     if len(req.doc_hash) != 8:
         raise HTTPException(status_code=400, detail="doc_hash must be 8 integers")
+    if signature_error(req.signature):
+        raise HTTPException(status_code=400, detail=signature_error(req.signature))
 
-    # --- ПРОВЕРКА НА ДУБЛИКАТЫ ---
-    if check_nft_exists(req.nft_id):
+    # --- ПРОВЕРКА НА ДУБЛИКАТЫ (включая mint того же ID, ждущий в очереди) ---
+    state = world_state()
+    if state.nft(req.nft_id) is not None or req.nft_id in pending_mints or req.nft_id in unsealed_nfts:
         raise HTTPException(status_code=400, detail=f"NFT ID {req.nft_id} already exists!")
     # -----------------------------
 
-    # Записываем хеш документа в память VM
-    hash_ptr = vm.hp
-    for i, val in enumerate(req.doc_hash):
-        vm.heap[hash_ptr + i] = val
-    vm.hp += 8
-
-    addr = cg.func_addresses.get("action_nft_create")
-    # Передаем: ID, Владелец, Создатель, Указатель на хеш, Приватный ключ
-    result = vm.execute_function(addr, [req.nft_id, req.owner, req.creator, hash_ptr, req.private_key])
+    # --- ПОДПИСЬ СОЗДАТЕЛЯ ---
+    creator_key = wallet_key(state, req.creator)
+    if creator_key is None:
+        raise HTTPException(status_code=404, detail=f"Wallet {req.creator} has no verify key")
+    pending_mints.add(req.nft_id)
+    try:
+        await check_signature(creator_key, mint_message(req.nft_id, req.owner, req.creator, req.doc_hash),
+                              req.signature)
+        addr = cg.func_addresses.get("action_nft_create")
+        result, block, pending = await run_vm(vm_sealed_at, vm_mint_nft, addr, req, creator_key)
+    finally:
+        pending_mints.discard(req.nft_id)
 
     if result == 0:
         return {"status": "error", "message": "Unauthorized or system error"}
-    return {"status": "success"}
+    if block > world.height:
+        unsealed_nfts[req.nft_id] = (block, req.owner, 1)
+    return {"status": commit_status(pending), "block_index": block, "nonce": 1}
 
 
 @app.post("/transfer_nft")
-def transfer_nft(req: TransferRequest):
-    if not vm or not cg:
-        raise HTTPException(status_code=503, detail="Node not initialized")
+async def transfer_nft(req: TransferRequest):
+    require_node()
+
+    if signature_error(req.signature):
+        raise HTTPException(status_code=400, detail=signature_error(req.signature))
+
+    # --- ПРОВЕРКА ВЛАДЕНИЯ: NFT должен существовать и быть активным ---
+    state = world_state()
+    head = nft_head(state, req.nft_id)
+    if head is None:
+        raise HTTPException(status_code=404, detail=f"NFT ID {req.nft_id} not found")
+    owner, nonce, status = head
+    if status != NFT_ACTIVE:
+        raise HTTPException(status_code=400, detail=f"NFT ID {req.nft_id} is not active")
+    # Одна передача NFT в очереди за раз: nonce следующей зависит от ее исхода
+    if req.nft_id in pending_transfers:
+        raise HTTPException(status_code=409, detail=f"NFT ID {req.nft_id} has a transfer in progress")
+    if req.nonce != nonce:
+        raise HTTPException(status_code=409, detail=f"Stale nonce {req.nonce}, expected {nonce}")
+
+    # --- ПОДПИСЬ ВЛАДЕЛЬЦА ---
+    owner_key = wallet_key(state, owner)
+    if owner_key is None:
+        raise HTTPException(status_code=404, detail=f"Wallet {owner} has no verify key")
+    pending_transfers.add(req.nft_id)
+    try:
+        await check_signature(owner_key, transfer_message(req.nft_id, req.new_owner, nonce), req.signature)
+        addr = cg.func_addresses.get("action_nft_transfer")
+        result, block, pending = await run_vm(vm_sealed_at, vm_transfer_nft, addr, req, owner_key)
+    finally:
+        pending_transfers.discard(req.nft_id)
+
+    if not result:
+        return {"status": "error"}
+    if block > world.height:
+        unsealed_nfts[req.nft_id] = (block, req.new_owner, nonce + 1)
+    return {"status": commit_status(pending), "block_index": block, "nonce": nonce + 1}
+
+
+# --- Пакеты: проверка всего пакета до входа в VM, затем один вход ---
+
+def validate_batch(ops):
+    """
+    Проверка пакета до VM: ошибки [(номер, текст)] (неизвестные операции,
+    дубликаты nft_id, чужие NFT, неверный nonce), ключи подписантов по номеру
+    операции и подписи к проверке [(номер, (ключ, слова, подпись))].
+    NFT, созданные и переданные в пакете, учитываются по ходу пакета.
+    """
+    state, errors, keys, checks = world_state(), [], {}, []
+    heads = {}  # nft_id -> (владелец, nonce, статус) после предыдущих операций пакета
+    for i, (op, req) in enumerate(ops):
+        if op not in BATCH_ACTIONS:
+            errors.append((i, f"Unknown op: {op}"))
+        elif op != "wallet" and signature_error(req.signature):
+            errors.append((i, signature_error(req.signature)))
+        elif op == "mint":
+            key = wallet_key(state, req.creator)
+            if len(req.doc_hash) != 8:
+                errors.append((i, "doc_hash must be 8 integers"))
+            elif state.nft(req.nft_id) is not None or req.nft_id in pending_mints or req.nft_id in unsealed_nfts:
+                errors.append((i, f"NFT ID {req.nft_id} already exists!"))
+            elif req.nft_id in heads:
+                errors.append((i, f"NFT ID {req.nft_id} is minted twice in this batch"))
+            elif key is None:
+                errors.append((i, f"Wallet {req.creator} has no verify key"))
+            else:
+                heads[req.nft_id] = (req.owner, 1, NFT_ACTIVE)
+                keys[i] = key
+                checks.append((i, (key, mint_message(req.nft_id, req.owner, req.creator, req.doc_hash),
+                                   req.signature)))
+        elif op == "transfer":
+            head = heads.get(req.nft_id) or nft_head(state, req.nft_id)
+            key = head and wallet_key(state, head[0])
+            if head is None:
+                errors.append((i, f"NFT ID {req.nft_id} not found"))
+            elif head[2] != NFT_ACTIVE:
+                errors.append((i, f"NFT ID {req.nft_id} is not active"))
+            elif req.nft_id in pending_transfers:
+                errors.append((i, f"NFT ID {req.nft_id} has a transfer in progress"))
+            elif req.nonce != head[1]:
+                errors.append((i, f"Stale nonce {req.nonce}, expected {head[1]}"))
+            elif key is None:
+                errors.append((i, f"Wallet {head[0]} has no verify key"))
+            else:
+                heads[req.nft_id] = (req.new_owner, head[1] + 1, NFT_ACTIVE)
+                keys[i] = key
+                checks.append((i, (key, transfer_message(req.nft_id, req.new_owner, req.nonce), req.signature)))
+    return errors, keys, checks
+
+
+async def run_batch(ops):
+    require_node()
+    if not ops:
+        return {"status": "success", "count": 0, "results": []}
+    if len(ops) > XVM_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {XVM_BATCH_MAX} operations")
+    errors, keys, checks = validate_batch(ops)
+    if errors:
+        raise HTTPException(status_code=400, detail=[{"index": i, "error": e} for i, e in errors])
+
+    mints = {req.nft_id for op, req in ops if op == "mint"}
+    transfers = {req.nft_id for op, req in ops if op == "transfer"}
+    pending_mints.update(mints)
+    pending_transfers.update(transfers)
+    try:
+        # Подписи пакета - параллельно в пуле потоков, до входа в VM
+        valid = await asyncio.get_running_loop().run_in_executor(
+            None, vm.verifier.verify_many, [check for _, check in checks])
+        errors = [(i, "Invalid signature") for (i, _), ok in zip(checks, valid) if not ok]
+        if errors:
+            raise HTTPException(status_code=400, detail=[{"index": i, "error": e} for i, e in errors])
+        results = await run_vm(vm_batch, ops, keys)
+    finally:
+        pending_mints.difference_update(mints)
+        pending_transfers.difference_update(transfers)
+    # Кошелек пакета с уже занятым ID не зарегистрирован (его блок не применяется)
+    state = world_state()
+    for i, result in enumerate(results):
+        wallet = result.get("wallet")
+        if wallet and not register_wallet(state, wallet["public_key"], result["block_index"], wallet["verify_key"]):
+            results[i] = {"status": "error", "message": f"Wallet ID {wallet['public_key']} is already registered"}
+    ok = sum(r["status"] == "success" for r in results)
+    return {"status": "success" if ok == len(ops) else "partial", "count": len(ops), "results": results}
+
+
+@app.post("/batch")
+async def batch(req: BatchRequest):
+    return await run_batch([(item.op, item) for item in req.ops])
 
-    addr = cg.func_addresses.get("action_nft_transfer")
 
-    result = vm.execute_function(addr, [req.nft_id, req.new_owner, req.private_key])
+@app.post("/batch/create_wallet")
+async def batch_create_wallet(reqs: List[CreateWalletRequest]):
+    return await run_batch([("wallet", r) for r in reqs])
 
-    return {"status": "success" if result else "error"}
+
+@app.post("/batch/mint_nft")
+async def batch_mint_nft(reqs: List[NFTRequest]):
+    return await run_batch([("mint", r) for r in reqs])
+
+
+@app.post("/batch/transfer_nft")
+async def batch_transfer_nft(reqs: List[TransferRequest]):
+    return await run_batch([("transfer", r) for r in reqs])
 
 
 @app.get("/verify")
-def verify_integrity():
-    if not vm or not cg:
+async def verify_integrity(mode: str = "incremental"):
+    """
+    incremental - проверяет только блоки после контрольной точки (chain.blk.ckpt),
+    full - всю цепочку, deep - пересчитывает хеш каждого блока (xvm_audit).
+    При XVM_VERIFY_FULL_EVERY инкрементальный запрос раз в заданный период
+    выполняется как полный.
+    """
+    global last_full_verify
+    if XVM_ROLE == "reader" and mode != "deep":
+        return await verify_replica(mode)
+    if XVM_ROLE != "reader":
+        require_node()
+    if mode == "deep":
+        # Аудит только читает хранилище - идет мимо очереди VM
+        report = await asyncio.get_running_loop().run_in_executor(
+            None, deep_audit, CHAIN_STORE, XVM_AUDIT_WORKERS or None)
+        if report["is_valid"] and XVM_ROLE != "reader":
+            await run_vm(vm_save_audit_checkpoint, report)
+        return {"is_valid": report["is_valid"], "mode": mode, "blocks_checked": report["blocks"],
+                "recomputed": report["recomputed"], "partial": report["partial"],
+                "errors": report["errors"], "seconds": report["seconds"],
+                "blocks_per_sec": report["blocks_per_sec"]}
+    if mode not in VERIFY_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown verify mode: {mode}")
+
+    now = time.monotonic()
+    if mode == "incremental" and XVM_VERIFY_FULL_EVERY and now - last_full_verify >= XVM_VERIFY_FULL_EVERY:
+        mode = "full"
+    if mode == "full":
+        last_full_verify = now
+
+    addr = cg.func_addresses.get(VERIFY_MODES[mode])
+    result, checked = await run_vm(vm_verify, addr)
+
+    return {"is_valid": True if result == 1 else False, "mode": mode, "blocks_checked": checked}
+
+
+async def verify_replica(mode):
+    """/verify реплики: проверка связей по mmap цепочки; incremental продолжает с прошлой проверки."""
+    global replica_verified
+    if mode not in VERIFY_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown verify mode: {mode}")
+    start, prev = replica_verified if mode == "incremental" else (1, GENESIS_PREV)
+    report = await asyncio.get_running_loop().run_in_executor(None, verify_chain, CHAIN_STORE, start, prev)
+    if report["is_valid"]:
+        replica_verified = (report["height"] + 1, report["tip_hash"])
+    return {"is_valid": report["is_valid"], "mode": mode, "blocks_checked": report["blocks_checked"]}
+
+
+# --- Чтение состояния: индексы и кеш ответов, без VM и без разбора chain.json ---
+
+def require_world():
+    if not world:
         raise HTTPException(status_code=503, detail="Node not initialized")
 
-    addr = cg.func_addresses.get("bc_verify_full_integrity")
-    result = vm.execute_function(addr, [])
 
-    return {"is_valid": True if result == 1 else False}
+def cached_read(key, build, missing):
+    require_world()
+    result = world_state().cache.get(key, build)
+    if result is None:
+        raise HTTPException(status_code=404, detail=missing)
+    return result
+
+
+@app.get("/nft/{nft_id}")
+async def get_nft(nft_id: int):
+    def build():
+        nft = world.nft(nft_id)
+        # nonce - число изменений NFT, его подписывает следующая передача
+        return nft and {"nft_id": nft_id, **nft._asdict(), "nonce": len(world.history[nft_id])}
+    return cached_read(("nft", nft_id), build, f"NFT ID {nft_id} not found")
+
+
+@app.get("/nft/{nft_id}/history")
+async def get_nft_history(nft_id: int):
+    def build():
+        blocks = world.history.get(nft_id)
+        return blocks and {"nft_id": nft_id, "blocks": [block_record(world.store.get(i)) for i in blocks]}
+    return cached_read(("history", nft_id), build, f"NFT ID {nft_id} not found")
+
+
+@app.get("/wallet/{pub_key}/nfts")
+async def get_wallet_nfts(pub_key: int):
+    def build():
+        role, nfts = world.role(pub_key), world.nfts_of(pub_key)
+        if role is None and not nfts:
+            return None
+        return {"wallet": pub_key, "role": role, "nfts": nfts}
+    return cached_read(("wallet", pub_key), build, f"Wallet {pub_key} not found")
+
+
+@app.get("/block/{index}")
+async def get_block(index: int):
+    def build():
+        block = world.store.get(index)
+        return block and block_record(block)
+    return cached_read(("block", index), build, f"Block {index} not found")
+
+
+# --- Доказательства включения: Merkle-аккумулятор хешей блоков (xvm_merkle) ---
+
+def signed_root(size):
+    """Корень дерева из size блоков с подписью узла."""
+    return sign_root(node_key, size, world.accumulator.root(size))
+
+
+@app.get("/root")
+async def get_root(size: int = 0):
+    """Подписанный корень по всем блокам (или по первым size)."""
+    require_world()
+    height = world_state().height
+    size = size or height
+    if not 1 <= size <= height:
+        raise HTTPException(status_code=404, detail=f"No Merkle root for {size} blocks")
+    return cached_read(("root", size), lambda: signed_root(size), "")
+
+
+@app.get("/proof/{block_index}")
+async def get_proof(block_index: int, size: int = 0):
+    """Доказательство включения блока в подписанный корень (текущий или по первым size блокам)."""
+    require_world()
+    height = world_state().height
+    size = size or height
+    if not 1 <= block_index <= size <= height:
+        raise HTTPException(status_code=404, detail=f"Block {block_index} is not in a tree of {size} blocks")
+
+    def build():
+        block = world.store.get(block_index)
+        return {"block": block_record(block), **world.accumulator.proof(block_index, size),
+                "signed_root": cached_read(("root", size), lambda: signed_root(size), "")}
+    return cached_read(("proof", block_index, size), build, "")
+
+
+@app.get("/heap")
+async def heap_stats():
+    """Указатель кучи, ее high-water mark и статистика арен запросов."""
+    if not vm:
+        raise HTTPException(status_code=503, detail="Node not initialized")
+    return vm.heap_stats()
+
+
+@app.get("/queue")
+async def queue_stats():
+    """Очередь команд VM: глубина, занятость, отказы (429), худшие ожидание и выполнение; транзакции в мемпуле."""
+    require_node()
+    return {**executor.queue_stats(), "mempool": mempool_size()}
 
 
 if __name__ == "__main__":
-    # Запускаем сервер на всех интерфейсах
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Реплики чтения - отдельные процессы uvicorn (общий порт, по процессу на ядро)
+    readers = None
+    if XVM_ROLE == "writer" and XVM_READERS:
+        readers = subprocess.Popen([sys.executable, "-m", "uvicorn", "server:app", "--host", "0.0.0.0",
+                                    "--port", str(XVM_READER_PORT), "--workers", str(XVM_READERS)],
+                                   env={**os.environ, "XVM_ROLE": "reader"})
+    try:
+        # Запускаем сервер на всех интерфейсах
+        uvicorn.run(app, host="0.0.0.0", port=8000)
+    finally:
+        if readers:
+            readers.terminate()
+            readers.wait()
\ No newline at end of file
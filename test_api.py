@@ -2,6 +2,8 @@ import requests
 import time
 import random
 
+from xvm_sig import mint_message, transfer_message, sign_words
+
 BASE_URL = "http://192.168.0.228:8000"
 
 
@@ -17,12 +19,12 @@ def run_full_test():
     try:
         resp = requests.post(f"{BASE_URL}/create_wallet", json=payload_wallet)
         data = resp.json()
-        if resp.status_code != 200 or data.get("status") != "success":
+        if resp.status_code != 200 or data.get("status") not in ("success", "pending"):
             print(f"❌ Wallet creation failed: {data}")
             return
 
         my_pub_key = data["wallet"]["public_key"]
-        my_priv_key = data["wallet"]["private_key"]
+        my_signing_key = data["wallet"]["signing_key"]
         print(f"✅ Wallet Created! ID: {my_pub_key}")
 
     except Exception as e:
@@ -39,14 +41,16 @@ def run_full_test():
         "nft_id": TEST_NFT_ID,
         "owner": my_pub_key,
         "creator": my_pub_key,
-        "private_key": my_priv_key,
-        "doc_hash": doc_hash
+        "doc_hash": doc_hash,
+        "signature": sign_words(my_signing_key, mint_message(TEST_NFT_ID, my_pub_key, my_pub_key, doc_hash))
     }
+    nonce = 1
 
     try:
         resp = requests.post(f"{BASE_URL}/mint_nft", json=payload_mint)
         data = resp.json()
-        if data.get("status") == "success":
+        if data.get("status") in ("success", "pending"):
+            nonce = data["nonce"]
             print(f"✅ NFT Minted successfully!\n")
         else:
             print(f"❌ Minting failed: {data}\n")
@@ -60,12 +64,13 @@ def run_full_test():
     payload_transfer = {
         "nft_id": TEST_NFT_ID,
         "new_owner": 999999,
-        "private_key": my_priv_key
+        "nonce": nonce,
+        "signature": sign_words(my_signing_key, transfer_message(TEST_NFT_ID, 999999, nonce))
     }
 
     try:
         resp = requests.post(f"{BASE_URL}/transfer_nft", json=payload_transfer)
-        if resp.json().get("status") == "success":
+        if resp.json().get("status") in ("success", "pending"):
             print(f"✅ NFT Transferred successfully!\n")
         else:
             print(f"❌ Transfer failed\n")
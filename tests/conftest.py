@@ -0,0 +1,41 @@
+import os
+import sys
+import random
+import shutil
+
+import pytest
+import nacl.signing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import crypto  # noqa: E402
+
+
+@pytest.fixture
+def xl_dir(tmp_path, monkeypatch):
+    """Временный рабочий каталог с копией исходников .xl (импорты xlang идут от cwd)."""
+    for name in os.listdir(ROOT):
+        if name.endswith(".xl"):
+            shutil.copy(os.path.join(ROOT, name), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def ed25519_keys(monkeypatch):
+    """
+    Детерминированные ключи Ed25519 для native_keygen (seed 1, 2, ...), чтобы
+    цепочки и подписи повторялись от запуска к запуску. Значение фикстуры -
+    функция, которая начинает последовательность заново.
+    """
+    def restart():
+        seeds = iter(range(1, 1000))
+
+        def generate():
+            key = nacl.signing.SigningKey(bytes([next(seeds)]) * 32)
+            return crypto.bytes_to_vm_words(key.verify_key.encode()), crypto.bytes_to_vm_words(key.encode())
+        monkeypatch.setattr(crypto, "generate_ed25519_keys", generate)
+        random.seed(0)
+    restart()
+    return restart
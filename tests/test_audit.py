@@ -0,0 +1,111 @@
+import pytest
+
+import xvm_audit
+from main import compile_program, create_vm, boot_node
+from xvm_blockstore import BlockStore, Block, FLAG_PARTIAL, FLAG_WORD_HASH, TX_BLOCK, import_json
+from xvm_audit import deep_audit, block_digest, split_ranges
+
+
+def build_store(path, n, tamper=None, partial=()):
+    """Цепочка с настоящими хешами; tamper(i, block) -> блок, записываемый вместо i."""
+    store = BlockStore(path)
+    prev = (0,) * 8
+    for i in range(1, n + 1):
+        block = Block(i, 3, FLAG_PARTIAL if i in partial else 0, prev, (0,) * 8, (i, 1000 + i, 1715000002))
+        block = block._replace(hash=block_digest(block))
+        if tamper:
+            block = tamper(i, block)
+        store.append(block)
+        prev = block.hash
+    store.close()
+
+
+def test_split_ranges_cover_chain():
+    for n, parts in ((1, 4), (10, 3), (100, 7), (5, 10)):
+        ranges = split_ranges(n, parts)
+        assert ranges[0][0] == 1 and ranges[-1][1] == n + 1
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+def commit_blocks(vm, cg, n, hash_mode):
+    fa = cg.func_addresses
+    vm.execute_function(fa["bc_hash_init"], [hash_mode])
+    for i in range(n):
+        data = vm.alloc_persistent(3)
+        for k, word in enumerate((i + 1, 0x1122334455667788 + i, 1715000002)): vm.heap[data + k] = word
+        vm.execute_function(fa["bc_commit_block"], [data, 3, 3])
+
+
+@pytest.mark.parametrize("hash_mode", [0, 1])
+def test_audit_recomputes_vm_hashes(xl_dir, hash_mode):
+    """Хеши, посчитанные VM (bc_commit_block), совпадают с пересчетом аудита в обоих режимах."""
+    cg, _ = compile_program("main.xl", use_cache=False)
+    vm = create_vm(cg)
+    boot_node(vm, cg)
+    commit_blocks(vm, cg, 4, hash_mode)
+    vm.chain_writer.close()
+    for store in vm.block_stores.values(): store.close()
+
+    report = deep_audit("chain.blk", workers=1)
+    assert report["is_valid"] and report["blocks"] == report["recomputed"] == 4
+    store = BlockStore("chain.blk")
+    assert all(block_digest(block) == block.hash for block in store.blocks())
+    block = store.get(2)
+    assert bool(block.flags & FLAG_WORD_HASH) == bool(hash_mode)
+    tampered = Block(*block[:5], (block.payload[0], block.payload[1] ^ 1 << 40, block.payload[2]))
+    # Режим 0 хеширует только младший байт слова, режим 1 - слово целиком
+    assert (block_digest(tampered) != block.hash) == bool(hash_mode)
+    store.close()
+
+
+def test_mixed_hash_modes_verify(xl_dir):
+    """Цепочка из блоков режима 0, продолженная блоками режима 1 (и блоком мемпула), проверяется целиком."""
+    cg, _ = compile_program("main.xl", use_cache=False)
+    vm = create_vm(cg)
+    boot_node(vm, cg)
+    fa = cg.func_addresses
+    commit_blocks(vm, cg, 2, 0)
+    commit_blocks(vm, cg, 2, 1)
+    vm.execute_function(fa["bc_mempool_init"], [3])
+    for i in range(2):
+        data = vm.alloc_persistent(3)
+        for k, word in enumerate((10 + i, 2 ** 40 + i, 1715000003)): vm.heap[data + k] = word
+        vm.execute_function(fa["bc_submit"], [data, 3, 3])
+    assert vm.execute_function(fa["bc_seal_block"], []) == 1
+    assert vm.execute_function(fa["bc_verify_full_integrity"], []) == 1
+    store = vm.block_stores["chain.blk"]
+    assert [b.flags & FLAG_WORD_HASH for b in store.blocks()] == [0, 0] + [FLAG_WORD_HASH] * 3
+    assert store.get(5).type == TX_BLOCK
+    vm.chain_writer.close()
+    store.close()
+
+    assert deep_audit("chain.blk", workers=1)["is_valid"]
+    # chain.json несет режим блока: импорт восстанавливает те же хеши и флаги
+    store = BlockStore("chain.blk")
+    blocks = list(store.blocks())
+    store.close()
+    imported = BlockStore("imported.blk")
+    import_json("chain.json", imported)
+    assert list(imported.blocks()) == blocks
+    imported.close()
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_audit_finds_tampering(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(xvm_audit, "MIN_CHUNK", 1)  # пул процессов и на короткой цепочке
+    path = str(tmp_path / "chain.blk")
+    build_store(path, 40, partial={5})
+    report = deep_audit(path, workers=workers)
+    assert report["is_valid"] and report["recomputed"] == 39 and report["partial"] == 1
+    assert report["workers"] == workers
+
+    # Подмена payload без пересчета хеша и разрыв связи на границе диапазонов
+    def tamper(i, block):
+        if i == 17: return block._replace(payload=(17, 1, 1715000002))
+        if i == 21: return block._replace(prev=(9,) * 8)
+        return block
+    path = str(tmp_path / "broken.blk")
+    build_store(path, 40, tamper=tamper)
+    report = deep_audit(path, workers=workers)
+    assert not report["is_valid"]
+    assert report["errors"] == [(17, "hash mismatch"), (21, "hash mismatch"), (21, "prev hash mismatch")]
@@ -0,0 +1,68 @@
+import os
+
+from xvm_audit import deep_audit
+from xvm_bench import build_chain, compare, meta_mismatch, report, run_suite, spread, NOISE_FACTOR
+from xvm_replica import verify_chain
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def case(value, spread=0.0):
+    return {"value": value, "spread": spread, "unit": "us"}
+
+
+def test_compare_threshold():
+    base = {"steady": case(100), "fast": case(100), "slow": case(100), "empty": case(0)}
+    current = {"steady": case(120), "fast": case(60), "slow": case(130), "empty": case(5), "added": case(1)}
+    rows = {row[0]: row for row in compare(current, base, 0.25)}
+    assert rows["steady"][5] == "ok" and rows["fast"][5] == "faster" and rows["slow"][5] == "REGRESSION"
+    assert abs(rows["slow"][3] - 0.3) < 1e-9
+    assert rows["empty"][5] == rows["added"][5] == "new"
+
+
+def test_spread():
+    assert spread([1.0]) == 0.0
+    assert spread([1.0, 1.0, 1.0, 1.0]) == 0.0
+    assert spread([1.0, 1.0, 1.0, 10.0]) > 0
+
+
+def test_compare_threshold_and_noise():
+    base = {"steady": case(100), "noisy": case(100, 0.2), "fast": case(100)}
+    rows = {row[0]: row for row in compare(
+        {"steady": case(130), "noisy": case(130, 0.05), "fast": case(60), "added": case(1)}, base, 0.25)}
+    assert rows["steady"][5] == "REGRESSION"
+    # Разброс базы 20% раздвигает порог до NOISE_FACTOR * 20%
+    assert rows["noisy"][4] == NOISE_FACTOR * 0.2 and rows["noisy"][5] == "ok"
+    assert rows["fast"][5] == "faster"
+    assert rows["added"][5] == "new"
+
+
+def test_noisy_run_does_not_widen_its_own_limit():
+    base = {"case": case(100, 0.01)}
+    # Прогон с разбросом 50% и замедлением на 150% - все равно регрессия
+    (row,) = compare({"case": case(250, 0.5)}, base, 0.25)
+    assert row[4] == 0.25 and row[5] == "REGRESSION"
+
+
+def test_meta_mismatch():
+    base = report({}, quick=False, repeat=9)
+    assert meta_mismatch(base, report({}, quick=False, repeat=5)) == []
+    assert [key for key, _, _ in meta_mismatch(base, report({}, quick=True, repeat=5))] == ["quick"]
+    other = {**base, "meta": {**base["meta"], "machine": "riscv64", "python": "2.7"}}
+    assert {key for key, _, _ in meta_mismatch(other, base)} == {"machine", "python"}
+    assert meta_mismatch({**base, "version": 1}, base)[0][0] == "version"
+
+
+def test_synthetic_chain_is_valid(tmp_path):
+    path = str(tmp_path / "chain.blk")
+    build_chain(path, 50)
+    assert verify_chain(path)["blocks_checked"] == 50
+    report = deep_audit(path, workers=1)
+    assert report["is_valid"] and report["recomputed"] == 50
+
+
+def test_suite_runs_subset_in_a_copy(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = run_suite(ROOT, repeat=1, only="chain.commit_block")
+    assert list(results) == ["chain.commit_block"] and results["chain.commit_block"]["value"] > 0
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,306 @@
+import os
+
+import pytest
+
+from xvm_sig import mint_message, sign_words
+from xvm_blockstore import BlockStore, Block, FLAG_PARTIAL, import_json, export_json, reconcile, json_matches_tip
+
+STORE = "chain.blk"
+
+
+def make_block(i, prev):
+    """Кошелек, NFT и передача по кругу; хеши - произвольные слова (связь ph -> h сохраняется)."""
+    type_id = (i - 1) % 3 + 1
+    payload = {1: (1000 + i, 1, 1715000000),
+               2: (i, 1000 + i, 1000 + i, *range(8), 1715000001, 1),
+               3: (i, 2000 + i, 1715000002)}[type_id]
+    return Block(i, type_id, 0, prev, tuple(i * 100 + k for k in range(8)), payload)
+
+
+def fill(path, n):
+    store = BlockStore(path)
+    prev, blocks = (0,) * 8, []
+    for i in range(1, n + 1):
+        block = make_block(i, prev)
+        store.append(block)
+        blocks.append(block)
+        prev = block.hash
+    store.save_tip(0)
+    return store, blocks
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_append_get_round_trip(workdir):
+    store, blocks = fill(STORE, 7)
+    assert [store.get(i) for i in range(1, 8)] == blocks
+    assert store.get(0) is None and store.get(8) is None
+    assert store.field(2, "h3") == 203 and store.field(2, "p1") == 1002 and store.field(2, "size") == 13
+    assert store.field(2, "ph0") == 100 and store.field(99, "h0") == 0
+    store.close()
+
+    store = BlockStore(STORE)
+    assert store.tip is not None and store.tip.index == 7 and store.tip.hash == blocks[-1].hash
+    assert list(store.blocks()) == blocks
+    store.close()
+
+
+def test_reopen_after_torn_record(workdir):
+    store, blocks = fill(STORE, 5)
+    cut = store._offsets[-1] + 10  # середина записи блока 5
+    store.close()
+    with open(STORE, "r+b") as f:
+        f.truncate(cut)
+
+    store = BlockStore(STORE)
+    assert len(store) == 4 and store.tip is None
+    assert list(store.blocks()) == blocks[:4]
+    assert os.path.getsize(STORE + ".idx") == 4 * 8
+    store.append(blocks[4])
+    assert store.get(5) == blocks[4]
+    store.close()
+
+
+def test_reopen_after_corrupt_tip(workdir):
+    store, blocks = fill(STORE, 5)
+    store.close()
+    with open(STORE + ".tip", "r+b") as f:
+        f.seek(3)
+        byte = f.read(1)
+        f.seek(3)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    store = BlockStore(STORE)
+    assert store.tip is None
+    assert list(store.blocks()) == blocks
+    store.close()
+
+
+def test_tip_behind_data_is_dropped(workdir):
+    store, blocks = fill(STORE, 5)
+    store.append(make_block(6, blocks[-1].hash))  # сбой до записи вершины
+    assert store.dirty and store.tip is None
+    store.close()
+
+    store = BlockStore(STORE)
+    assert len(store) == 6 and store.tip is None
+    store.close()
+
+
+def test_index_longer_than_data(workdir):
+    store, blocks = fill(STORE, 5)
+    size = os.path.getsize(STORE)
+    store.close()
+    with open(STORE + ".idx", "ab") as f:
+        f.write(size.to_bytes(8, "little") + (size + 500).to_bytes(8, "little") + b"\x01\x02\x03")
+
+    store = BlockStore(STORE)
+    assert len(store) == 5 and list(store.blocks()) == blocks
+    assert os.path.getsize(STORE + ".idx") == 5 * 8
+    store.close()
+
+
+def test_index_shorter_than_data(workdir):
+    store, blocks = fill(STORE, 5)
+    store.close()
+    with open(STORE + ".idx", "r+b") as f:
+        f.truncate(2 * 8 + 3)
+
+    store = BlockStore(STORE)
+    assert len(store) == 5 and list(store.blocks()) == blocks
+    assert os.path.getsize(STORE + ".idx") == 5 * 8
+    store.close()
+
+
+def legacy_block(index, type_id, fields, prev, block_hash):
+    """Текст блока chain.json в формате bc_commit_block."""
+    lines = [f",\n  {{" if index > 1 else "\n  {", f'\n    "index": {index},\n', f'    "type": {type_id},\n',
+             '    "payload": {\n']
+    lines += [f'      "{name}": {value}{"," if n + 1 < len(fields) else ""}\n'
+              for n, (name, value) in enumerate(fields)]
+    lines.append("    },\n")
+    lines += [f'    "ph{k}": "{w}",\n' for k, w in enumerate(prev)]
+    lines += [f'    "h{k}": "{w}",\n' for k, w in enumerate(block_hash)]
+    lines[-1] = lines[-1][:-2] + "\n  }"
+    return "".join(lines)
+
+
+H1, H2, H3 = (tuple(range(11, 19)), tuple(range(21, 29)), tuple(range(31, 39)))
+LEGACY_JSON = "[" + "".join([
+    legacy_block(1, 1, [("pub_key", 200100), ("role", 1), ("timestamp", 1715000000)], (0,) * 8, H1),
+    legacy_block(2, 2, [("nft_id", 7), ("owner", 200100), ("status", 1)], H1, H2),
+    legacy_block(3, 3, [("nft_id", 7), ("new_owner", 200200), ("timestamp", 1715000002)], H2, H3),
+]) + "\n]"
+
+
+def test_import_legacy_json(workdir):
+    with open("chain.json", "w", encoding="utf-8") as f:
+        f.write(LEGACY_JSON)
+    store = BlockStore(STORE)
+    assert import_json("chain.json", store) == 3
+
+    wallet, nft, transfer = store.blocks()
+    # В JSON нет ключа кошелька, хеша документа и создателя NFT - payload восстановлен частично
+    assert wallet.flags == FLAG_PARTIAL and wallet.payload == (200100, 1, 1715000000, 0, 0, 0, 0)
+    assert nft.flags == FLAG_PARTIAL and len(nft.payload) == 13
+    assert nft.payload[:3] == (7, 200100, 0) and nft.payload[12] == 1
+    assert transfer.flags == 0 and transfer.payload == (7, 200200, 1715000002)
+    assert (wallet.prev, wallet.hash, nft.prev, nft.hash, transfer.hash) == ((0,) * 8, H1, H1, H2, H3)
+
+    # Экспорт воспроизводит исходный текст байт в байт
+    export_json(store, "export.json", finished=True)
+    assert open("export.json", encoding="utf-8").read() == LEGACY_JSON
+    store.close()
+
+
+def test_reconcile_imports_once(workdir):
+    with open("chain.json", "w", encoding="utf-8") as f:
+        f.write(LEGACY_JSON)
+    store = BlockStore(STORE)
+    reconcile(store, "chain.json")
+    assert len(store) == 3 and store.tip is not None
+    store.close()
+
+    # Второй старт: хранилище и chain.json сходятся, ничего не импортируется и не переписывается
+    before = os.stat("chain.json").st_mtime_ns, open("chain.json").read()
+    store = BlockStore(STORE)
+    assert json_matches_tip(store, "chain.json")
+    reconcile(store, "chain.json")
+    assert len(store) == 3
+    assert (os.stat("chain.json").st_mtime_ns, open("chain.json").read()) == before
+    store.close()
+
+    # chain.json потерян: восстанавливается экспортом, блоки не дублируются
+    os.remove("chain.json")
+    store = BlockStore(STORE)
+    reconcile(store, "chain.json")
+    assert len(store) == 3
+    assert open("chain.json").read() == LEGACY_JSON[:-2]
+    store.close()
+
+
+def test_json_mismatch_is_reexported(workdir):
+    with open("chain.json", "w", encoding="utf-8") as f:
+        f.write(LEGACY_JSON)
+    store = BlockStore(STORE)
+    reconcile(store, "chain.json")
+    store.close()
+
+    # Сбой между chain.blk и chain.json: в JSON недописан последний блок
+    with open("chain.json", "r+b") as f:
+        f.truncate(len(LEGACY_JSON) - 40)
+    store = BlockStore(STORE)
+    assert not json_matches_tip(store, "chain.json")
+    reconcile(store, "chain.json")
+    assert len(store) == 3 and json_matches_tip(store, "chain.json")
+    assert open("chain.json").read() == LEGACY_JSON[:-2]
+    store.close()
+
+
+def boot_chain(mints):
+    """Узел с кошельком и mints NFT: (vm, cg, wallet), wallet - (pub, priv, owner) из action_create_wallet."""
+    from main import compile_program, create_vm, boot_node
+    cg, _ = compile_program("main.xl", use_cache=False)
+    vm = create_vm(cg)
+    boot_node(vm, cg)
+    keys = vm.execute_function(cg.func_addresses["action_create_wallet"], [1])
+    wallet = vm.heap[keys:keys + 3]
+    mint(vm, cg, wallet, range(1, mints + 1))
+    return vm, cg, wallet
+
+
+def mint(vm, cg, wallet, ids):
+    pub, priv, owner = wallet
+    for nft_id in ids:
+        with vm.arena():
+            doc = vm.hp
+            vm.hp += 16
+            for j in range(8): vm.heap[doc + j] = nft_id * 10 + j
+            message = mint_message(nft_id, owner, owner, vm.heap[doc:doc + 8])
+            for j, w in enumerate(sign_words(vm.heap[priv:priv + 4], message)): vm.heap[doc + 8 + j] = w
+            args = [nft_id, owner, owner, doc, pub, doc + 8]
+            assert vm.execute_function(cg.func_addresses["action_nft_create"], args) == 1
+
+
+def test_store_matches_live_chain_json(xl_dir, ed25519_keys):
+    vm, cg, _ = boot_chain(3)
+    assert vm.execute_function(cg.func_addresses["bc_verify_full_integrity"], []) == 1
+    vm.chain_writer.close()
+    store = vm.block_stores[STORE]
+    assert len(store) == 4
+    nft = store.get(2)
+    assert nft.flags == 0 and nft.payload[3:11] == tuple(range(10, 18))  # хеш документа есть только в chain.blk
+    export_json(store, "export.json")
+    assert open("export.json").read() == open("chain.json").read()
+
+
+def test_checkpoint_round_trip_and_invalidation(workdir):
+    store, blocks = fill(STORE, 5)
+    assert store.load_checkpoint() is None
+    store.save_checkpoint(3, blocks[2].hash)
+    assert store.load_checkpoint() == (3, blocks[2].hash)
+    store.save_checkpoint(9, blocks[2].hash)  # за вершиной - не сохраняется
+    assert store.load_checkpoint() == (3, blocks[2].hash)
+    store.close()
+
+    # Блок с индексом точки заменен (другой хеш) - точка недействительна
+    store = BlockStore(STORE)
+    store.reset()
+    for block in blocks[:2] + [blocks[2]._replace(hash=(7,) * 8)]:
+        store.append(block)
+    store.close()
+    store = BlockStore(STORE)
+    assert store.load_checkpoint() is None
+    store.save_checkpoint(3, (7,) * 8)
+    assert store.load_checkpoint() == (3, (7,) * 8)
+    store.reset()
+    assert store.load_checkpoint() is None and not os.path.exists(STORE + ".ckpt")
+    store.close()
+
+
+def verify(vm, cg, name):
+    result = vm.execute_function(cg.func_addresses[name], [])
+    return result, vm.memory[cg.globals["verify_checked"]]
+
+
+def test_incremental_verify_checks_only_new_blocks(xl_dir, ed25519_keys):
+    vm, cg, wallet = boot_chain(3)
+    assert verify(vm, cg, "bc_verify_incremental") == (1, 4)  # точки еще нет - с первого блока
+    assert verify(vm, cg, "bc_verify_incremental") == (1, 0)
+    mint(vm, cg, wallet, [10, 11])
+    assert verify(vm, cg, "bc_verify_incremental") == (1, 2)
+    assert verify(vm, cg, "bc_verify_full_integrity") == (1, 6)
+    assert verify(vm, cg, "bc_verify_incremental") == (1, 0)
+
+
+def test_checkpoint_past_tip_falls_back_to_full(xl_dir, ed25519_keys):
+    vm, cg, _ = boot_chain(3)
+    store = vm.block_stores[STORE]
+    assert verify(vm, cg, "bc_verify_full_integrity") == (1, 4)
+    # Точка от более длинной цепочки (например, хранилище восстановлено из копии)
+    import struct
+    with open(STORE + ".ckpt", "wb") as f:
+        f.write(struct.pack("<Q8QQ", 40, *range(8), 10 ** 6))
+    assert store.load_checkpoint() is None
+    assert verify(vm, cg, "bc_verify_incremental") == (1, 4)
+    assert store.load_checkpoint() == (4, store.get(4).hash)
+
+
+def test_restart_restores_from_tip(xl_dir, ed25519_keys):
+    from main import create_vm, boot_node
+    vm, cg, _ = boot_chain(3)
+    vm.chain_writer.close()
+    store = vm.block_stores[STORE]
+    tip = store.tip
+    assert tip is not None and tip.index == 4 and tip.json_end == os.path.getsize("chain.json")
+    for s in vm.block_stores.values(): s.close()
+
+    restarted = create_vm(cg)
+    boot_node(restarted, cg)
+    assert restarted.block_stores[STORE].tip == tip
+    assert restarted.memory[cg.globals["block_index"]] == vm.memory[cg.globals["block_index"]]
+    assert restarted.execute_function(cg.func_addresses["bc_verify_full_integrity"], []) == 1
@@ -0,0 +1,60 @@
+import os
+
+import xlang_cache
+from main import compile_program, create_vm
+from xlang_cache import artifact_path, load_artifact
+
+
+def compile_main(capsys, **kwargs):
+    cg, stats = compile_program("main.xl", **kwargs)
+    return cg, "Loaded cached" in capsys.readouterr().out
+
+
+def test_artifact_is_reused(xl_dir, capsys):
+    fresh, cached = compile_main(capsys)
+    assert not cached and os.path.exists("main.xlc")
+    loaded, cached = compile_main(capsys)
+    assert cached
+    assert (loaded.code, loaded.string_pool, loaded.globals, loaded.func_addresses, loaded.next_string_addr) == \
+        (fresh.code, fresh.string_pool, fresh.globals, fresh.func_addresses, fresh.next_string_addr)
+
+    states = []
+    for n, cg in enumerate((fresh, loaded)):
+        os.mkdir(f"run{n}")
+        os.chdir(f"run{n}")
+        vm = create_vm(cg)
+        vm.run()
+        states.append((vm.stack, vm.memory, vm.heap[:vm.hp]))
+        os.chdir(xl_dir)
+    assert states[0] == states[1]
+
+
+def test_imported_source_change_invalidates(xl_dir, capsys):
+    compile_main(capsys)
+    with open("crypto.xl", "a") as f:
+        f.write("\n// изменение\n")
+    _, cached = compile_main(capsys)
+    assert not cached
+    _, cached = compile_main(capsys)
+    assert cached
+
+
+def test_opt_level_and_compiler_invalidate(xl_dir, capsys, monkeypatch):
+    compile_main(capsys, opt_level=3)
+    assert load_artifact("main.xl", 2) is None
+    assert load_artifact("main.xl", 3) is not None
+    monkeypatch.setattr(xlang_cache, "COMPILER_VERSION", "xlang-test")
+    assert load_artifact("main.xl", 3) is None
+
+
+def test_broken_artifact_is_rebuilt(xl_dir, capsys):
+    with open(artifact_path("main.xl"), "w") as f:
+        f.write("{not json")
+    _, cached = compile_main(capsys)
+    assert not cached
+    assert load_artifact("main.xl", 3) is not None
+
+
+def test_cache_can_be_disabled(xl_dir, capsys):
+    _, cached = compile_main(capsys, use_cache=False)
+    assert not cached and not os.path.exists("main.xlc")
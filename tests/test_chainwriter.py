@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+
+import pytest
+
+from xvm_chainwriter import ChainWriter, parse_policy, interval_sync
+from xvm_executor import VMExecutor
+
+INTERVAL_MS = 100
+
+
+def write_block(writer, text="{}"):
+    writer.append("chain.json", text)
+    return writer.commit("chain.json")
+
+
+@pytest.mark.parametrize("spec,parsed", [
+    ("block", ("block", 1)), ("none", ("none", 1)), ("count:5", ("count", 5)), ("interval:200", ("interval", 200)),
+])
+def test_parse_policy(spec, parsed):
+    assert parse_policy(spec) == parsed
+
+
+@pytest.mark.parametrize("spec", ["always", "count", "count:0", "interval:-5", "interval:x"])
+def test_parse_policy_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_policy(spec)
+
+
+@pytest.mark.parametrize("spec,fsyncs,after_close", [
+    ("block", 7, 7), ("count:3", 2, 3), ("none", 0, 0), ("interval:60000", 0, 1),
+])
+def test_fsync_policies(tmp_path, monkeypatch, spec, fsyncs, after_close):
+    monkeypatch.chdir(tmp_path)
+    writer = ChainWriter(spec)
+    for k in range(7):
+        writer.append("chain.json", f"[{k}")
+        writer.append("chain.json", "]")
+        writer.commit("chain.json")
+    assert writer.stats["blocks"] == 7 and writer.stats["writes"] == 7
+    assert writer.stats["fsyncs"] == fsyncs
+    writer.close()
+    assert writer.stats["fsyncs"] == after_close
+    assert open("chain.json").read() == "".join(f"[{k}]" for k in range(7))
+
+
+def test_release_keeps_write_order(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    writer = ChainWriter("none")
+    write_block(writer, "a")
+    writer.append("chain.json", "b")
+    writer.release("chain.json")  # как перед fappend
+    with open("chain.json", "a") as f:
+        f.write("c")
+    write_block(writer, "d")
+    writer.close()
+    assert open("chain.json").read() == "abcd"
+
+
+def test_chain_output_does_not_depend_on_policy(xl_dir, ed25519_keys):
+    from main import compile_program, create_vm
+    from xvm_sig import mint_message, sign_words
+    cg, _ = compile_program("main.xl", use_cache=False)
+    fa = cg.func_addresses
+    outputs = []
+    for spec in ("block", "count:4", "none"):
+        os.mkdir(spec.replace(":", "_"))
+        os.chdir(spec.replace(":", "_"))
+        ed25519_keys()
+        vm = create_vm(cg, chain_writer=ChainWriter(spec))
+        vm.run()
+        keys = vm.execute_function(fa["action_create_wallet"], [1])
+        pub, priv, owner = vm.heap[keys:keys + 3]
+        for nft_id in range(1, 6):
+            doc = vm.hp
+            vm.hp += 16
+            for j in range(8): vm.heap[doc + j] = nft_id * j
+            message = mint_message(nft_id, owner, owner, vm.heap[doc:doc + 8])
+            for j, w in enumerate(sign_words(vm.heap[priv:priv + 4], message)): vm.heap[doc + 8 + j] = w
+            assert vm.execute_function(fa["action_nft_create"], [nft_id, owner, owner, doc, pub, doc + 8]) == 1
+        assert vm.execute_function(fa["bc_verify_full_integrity"], []) == 1
+        vm.chain_writer.close()
+        assert vm.chain_writer.stats["blocks"] == 6  # кошелек и 5 NFT
+        outputs.append(open("chain.json").read())
+        os.chdir(xl_dir)
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+def test_interval_arms_deadline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    writer = ChainWriter(f"interval:{INTERVAL_MS}")
+    write_block(writer)
+    assert writer.stats["fsyncs"] == 0
+    assert 0 < writer.sync_delay() <= INTERVAL_MS / 1000
+    assert not writer.sync_if_due()
+    time.sleep(writer.sync_delay())
+    assert writer.sync_if_due()
+    assert writer.stats["fsyncs"] == 1 and writer.sync_delay() is None
+    writer.close()
+    assert open("chain.json").read() == "{}"
+
+
+def test_block_policy_has_no_deadline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    writer = ChainWriter("block")
+    write_block(writer)
+    assert writer.stats["fsyncs"] == 1 and writer.sync_delay() is None
+    writer.close()
+
+
+def test_lone_block_synced_within_interval(tmp_path, monkeypatch):
+    """Одиночный блок на простаивающем узле получает fsync от таймера примерно через MS."""
+    monkeypatch.chdir(tmp_path)
+
+    async def scenario():
+        executor = VMExecutor()
+        executor.start()
+        writer = ChainWriter(f"interval:{INTERVAL_MS}")
+        timer = asyncio.get_running_loop().create_task(interval_sync(writer, executor.submit))
+        try:
+            await asyncio.sleep(INTERVAL_MS / 1000)  # узел простаивал дольше интервала
+            await executor.submit(write_block, writer)  # первый блок: срок уже прошел, fsync сразу
+            assert writer.stats["fsyncs"] == 1
+            await executor.submit(write_block, writer)  # второй - в пределах интервала, без fsync
+            written = time.monotonic()
+            assert writer.stats["fsyncs"] == 1
+            while writer.stats["fsyncs"] == 1 and time.monotonic() - written < 1:
+                await asyncio.sleep(0.005)
+            elapsed = time.monotonic() - written
+        finally:
+            timer.cancel()
+            await executor.stop()
+            writer.close()
+        assert writer.stats["fsyncs"] == 2
+        assert elapsed <= INTERVAL_MS / 1000 + 0.05
+        return elapsed
+
+    asyncio.run(scenario())
+
+
+def test_skipped_sync_is_retried(tmp_path, monkeypatch):
+    """Пропущенная команда (полная очередь) повторяется через MS/4, а не в цикле без ожидания."""
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    async def submit(fn):
+        calls.append(time.monotonic())
+        return fn() if len(calls) > 2 else None
+
+    async def scenario():
+        writer = ChainWriter(f"interval:{INTERVAL_MS}")
+        write_block(writer)
+        timer = asyncio.get_running_loop().create_task(interval_sync(writer, submit))
+        try:
+            while writer.stats["fsyncs"] == 0:
+                await asyncio.sleep(0.005)
+        finally:
+            timer.cancel()
+            writer.close()
+        assert len(calls) == 3
+        assert calls[2] - calls[0] >= 2 * INTERVAL_MS / 4000 * 0.9
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
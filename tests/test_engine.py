@@ -0,0 +1,132 @@
+import os
+
+import pytest
+
+from xlang_lexer import tokenize
+from xlang_parser import Parser
+from xlang_codegen import CodeGen
+from xvm import XVM, ENGINES
+
+PROGRAM = """
+var table = new(Int(16));
+var greeting = "hello";
+
+func mix(a, b) {
+    return ((a << Int(7)) ^ (b >>> Int(3))) * Int(31) - (a & b) + (a | b);
+}
+
+func fill(n) {
+    for (var i = Int(0); i < n; i = i + Int(1)) {
+        var m = mix(i, i * Int(1000003));
+        table[i] = m;
+    }
+    var best = Int(0);
+    var k = Int(0);
+    while (k < n) {
+        if (table[k] > best && k != Int(3)) { best = table[k]; }
+        k = k + Int(1);
+    }
+    return best / Int(3) + Int(7) / Int(0) + (Int(5) == Int(5)) + (Int(0) || Int(9));
+}
+
+func main() {
+    prints(greeting);
+    printi(Int(42));
+    return fill(Int(16));
+}
+"""
+
+
+def compile_source(source):
+    _, vars_, funcs = Parser(tokenize(source)).parse()
+    cg = CodeGen()
+    cg.gen(vars_, funcs)
+    return cg
+
+
+def run_program(cg, engine):
+    vm = XVM(cg.code, engine=engine)
+    vm.load_strings(cg.string_pool)
+    vm.hp = cg.next_string_addr
+    vm.run()
+    return vm
+
+
+def vm_state(vm):
+    return vm.stack, vm.memory, vm.heap[:vm.hp + 16], vm.hp
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        XVM([], engine="fast")
+
+
+def test_engines_agree_on_program(capsys):
+    cg = compile_source(PROGRAM)
+    reference = run_program(cg, "reference")
+    assert reference.execute_function(cg.func_addresses["fill"], [16]) > 0
+    out = capsys.readouterr().out
+    for engine in ENGINES:
+        vm = run_program(cg, engine)
+        vm.execute_function(cg.func_addresses["fill"], [16])
+        assert vm_state(vm) == vm_state(reference), engine
+        assert capsys.readouterr().out == out
+
+
+def test_execute_function_matches(capsys):
+    cg = compile_source(PROGRAM)
+    results = []
+    for engine in ENGINES:
+        vm = run_program(cg, engine)
+        results.append([vm.execute_function(cg.func_addresses["mix"], [a, a * 3 + 1]) for a in range(50)])
+        assert not vm.stack and not vm.call_stack
+    assert results[0] == results[1]
+
+
+def test_engines_agree_on_main_xl(xl_dir):
+    """main.xl целиком (SHA-512 на xlang, запись chain.json) на обоих движках."""
+    from main import load_program
+    vars_, funcs = load_program("main.xl")
+    cg = CodeGen()
+    cg.gen(vars_, funcs)
+    states, chains = [], []
+    for engine in ENGINES:
+        os.mkdir(engine)
+        os.chdir(engine)
+        states.append(vm_state(run_program(cg, engine)))
+        chains.append(open("chain.json").read())
+        os.chdir(xl_dir)
+    assert states[0] == states[1]
+    assert chains[0] == chains[1]
+
+
+CALLS = """
+var out = new(Int(4));
+
+func sq(x) { return x * x; }
+
+func fib(n) {
+    if (n < Int(2)) { return n; }
+    return fib(n - Int(1)) + fib(n - Int(2));
+}
+
+func mixed(a, b) {
+    out[Int(1)] = sq(b);
+    return a + sq(b) * Int(10) + sq(a);
+}
+
+func main() { return Int(0); }
+"""
+
+
+@pytest.mark.parametrize("kwargs", [{"engine": "reference"}, {"engine": "table"},
+                                    {"engine": "table", "jit": True, "jit_threshold": 0}])
+def test_ret_keeps_caller_temporaries(kwargs):
+    """RET снимает только кадр вызываемой функции и ее аргументы."""
+    cg = compile_source(CALLS)
+    vm = XVM(cg.code, functions=cg.func_addresses, **kwargs)
+    vm.run()
+    assert vm.execute_function(cg.func_addresses["fib"], [15]) == 610
+    assert vm.execute_function(cg.func_addresses["mixed"], [3, 4]) == 3 + 160 + 9
+    assert vm.heap[vm.memory[cg.globals["out"]] + 1] == 16
+    assert not vm.stack and not vm.call_stack
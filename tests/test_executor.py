@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+import pytest
+
+from xvm_executor import VMExecutor, QueueFull
+
+
+def test_commands_run_in_order_on_one_thread():
+    async def scenario():
+        executor = VMExecutor(depth=8)
+        executor.start()
+        seen = []
+
+        def command(k):
+            seen.append((k, threading.current_thread().name))
+            return k * 2
+        results = await asyncio.gather(*(executor.submit(command, k) for k in range(8)))
+        await executor.stop()
+        return results, seen, executor.stats
+
+    results, seen, stats = asyncio.run(scenario())
+    assert results == [k * 2 for k in range(8)]
+    assert [k for k, _ in seen] == list(range(8))
+    assert len({name for _, name in seen}) == 1 and seen[0][1].startswith("xvm")
+    assert stats["executed"] == 8 and stats["rejected"] == 0
+
+
+def test_full_queue_rejects_and_errors_propagate():
+    async def scenario():
+        executor = VMExecutor(depth=1)
+        executor.start()
+        started, gate = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            gate.wait()
+            return "done"
+        running = asyncio.ensure_future(executor.submit(block))
+        while not started.is_set():
+            await asyncio.sleep(0.001)
+        queued = asyncio.ensure_future(executor.submit(lambda: "queued"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            await executor.submit(lambda: "rejected")
+        gate.set()
+        assert await running == "done" and await queued == "queued"
+
+        def fail():
+            raise ValueError("boom")
+        with pytest.raises(ValueError):
+            await executor.submit(fail)
+        stats = executor.queue_stats()
+        await executor.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1 and stats["failed"] == 1 and stats["executed"] == 3
+    assert stats["depth"] == 1 and stats["queued"] == 0
+
+
+def test_submit_requires_start():
+    with pytest.raises(RuntimeError):
+        asyncio.run(VMExecutor().submit(lambda: None))
@@ -0,0 +1,51 @@
+import hashlib
+
+import pytest
+
+import crypto
+from xvm import XVM
+from xvm_memory import BACKENDS
+
+WORDS = [1, 0xFF, 0x1122334455667788, 2 ** 64 - 1, 300, 7, 0]
+
+
+def reference(words, mode):
+    """Независимая упаковка: младший байт слова (режим 0) или 8 байт big-endian (режим 1)."""
+    if mode == crypto.HASH_WORDS:
+        data = b"".join(w.to_bytes(8, "big") for w in words)
+    else:
+        data = bytes(w & 0xFF for w in words)
+    return list(crypto.digest_words(hashlib.sha512(data).digest()))
+
+
+def syscall(vm, name, *args):
+    vm.stack.extend(args)
+    getattr(vm, name)()
+    return vm.stack.pop()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("mode", crypto.HASH_MODES)
+def test_streaming_matches_one_shot(backend, mode):
+    vm = XVM([22, 0], backend=backend)
+    base = vm.hp
+    for k, w in enumerate(WORDS): vm.heap[base + k] = w
+    vm.hp += len(WORDS)
+    one_shot = syscall(vm, "_sys_sha512_words" if mode else "_sys_sha512", base, len(WORDS))
+    expected = reference(WORDS, mode)
+    assert list(vm.heap[one_shot:one_shot + 8]) == expected
+
+    h = syscall(vm, "_sys_sha512_init", mode)
+    for start, end in ((0, 3), (3, 3), (3, len(WORDS))):
+        assert syscall(vm, "_sys_sha512_update", h, base + start, end - start) == 1
+    streamed = syscall(vm, "_sys_sha512_final", h)
+    assert list(vm.heap[streamed:streamed + 8]) == expected
+    assert not vm.hashers
+    # Входные слова кучи не переставлены упаковкой
+    assert list(vm.heap[base:base + len(WORDS)]) == WORDS
+
+
+def test_unknown_hash_mode_rejected():
+    vm = XVM([22, 0])
+    with pytest.raises(RuntimeError):
+        syscall(vm, "_sys_sha512_init", 2)
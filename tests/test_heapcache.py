@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from xvm import XVM
+
+DOC, KEY = 1000, 200
+KEYS = ("h0", "h1", "nft_id", "missing", "index")
+
+
+def legacy_json_get_hash(text, key, i):
+    """Прежняя реализация json_get_hash: split и re.search по блоку."""
+    parts = text.split("  {")
+    if not 1 <= i < len(parts):
+        return 0
+    m = re.search(f'"{key}":\\s*"(-?\\d+)"', parts[i])
+    return int(m.group(1)) if m else 0
+
+
+def chain_text(n):
+    blocks = []
+    for i in range(1, n + 1):
+        fields = [f'"index": {i}', f'"nft_id": "{i * 7}"', f'"h0": "{i * 1000003}"', f'"h1": "-{i}"',
+                  f'"h0": "999"']  # повторный ключ: берется первое вхождение
+        blocks.append("  {\n    " + ",\n    ".join(fields) + "\n  }")
+    return "[\n" + ",\n".join(blocks) + "\n]"
+
+
+def get_hash(vm, key, i):
+    # Стек: [json, i, key] -> значение; у каждого ключа свой адрес строки
+    addr = KEY + 10 * KEYS.index(key)
+    vm.load_strings({addr: key})
+    vm.stack += [DOC, i, addr]
+    vm._sys_json_get_hash()
+    return vm.stack.pop()
+
+
+@pytest.mark.parametrize("backend", ["array", "list"])
+def test_parsed_doc_matches_legacy_search(backend):
+    vm = XVM([], backend=backend)
+    text = chain_text(30)
+    vm.load_strings({DOC: text})
+    for key in KEYS:
+        for i in range(0, 33):
+            assert get_hash(vm, key, i) == legacy_json_get_hash(text, key, i), (key, i)
+
+
+def test_heap_writes_invalidate_cache():
+    code = [1, DOC + 20, 1, 0, 1, ord("X"), 43, 0, 1, 0, 22, 0]  # HSTORE внутри документа
+    vm = XVM(code, functions={"f": 0})
+    vm.load_strings({DOC: chain_text(3)})
+    assert get_hash(vm, "h0", 2) == 2000006
+    assert ("doc", DOC) in vm.heap_cache
+    vm.execute_function(0, [])
+    assert ("doc", DOC) not in vm.heap_cache
+    # Новый документ по тому же адресу разбирается заново
+    vm.load_strings({DOC: chain_text(3).replace('"2000006"', '"5"')})
+    assert get_hash(vm, "h0", 2) == 5
+
+
+def test_arena_reset_invalidates_cache():
+    vm = XVM([])
+    vm.hp = 100000
+    with vm.arena():
+        addr = vm.hp
+        vm.hp += 10
+        vm.load_strings({addr: "chain.json"})
+        assert vm._heap_str(addr) == "chain.json"
+    assert not vm.heap_cache and vm.cache_span == [1, 0]
+    assert vm._heap_str(addr) == ""
@@ -0,0 +1,98 @@
+import pytest
+
+from xlang_lexer import tokenize
+from xlang_parser import Parser
+from xlang_codegen import CodeGen, SYSCALLS
+from xlang_optimizer import inline_candidates
+from xvm import XVM
+
+SOURCE = """
+var acc = Int(0);
+var buf = new(Int(4));
+
+func rotl(x, n) { return (x << n) | (x >>> (Int(64) - n)); }
+
+func pick(a, b) {
+    if (a > b) { return a; }
+    return b;
+}
+
+func mix(a, b) { return rotl(a, Int(13)) ^ pick(a, b); }
+
+noinline func tiny(x) { return x + Int(1); }
+
+inline func big(x) {
+    var s = x;
+    s = s * Int(3) + Int(1); s = s * Int(3) + Int(1); s = s * Int(3) + Int(1);
+    s = s * Int(3) + Int(1); s = s * Int(3) + Int(1); s = s * Int(3) + Int(1);
+    s = s * Int(3) + Int(1); s = s * Int(3) + Int(1); s = s * Int(3) + Int(1);
+    return s;
+}
+
+func fib(n) {
+    if (n < Int(2)) { return n; }
+    return fib(n - Int(1)) + fib(n - Int(2));
+}
+
+func store(i, v) {
+    buf[i] = v;
+    return v;
+}
+
+func run(k) {
+    var r = mix(k, Int(7)) + pick(Int(2), k) * tiny(k);
+    r = r + big(k) + fib(Int(10)) + store(Int(1), mix(Int(5), k));
+    acc = acc + r;
+    return r;
+}
+
+func main() { return Int(0); }
+"""
+
+
+def codegen(source, inline=False):
+    _, vars_, funcs = Parser(tokenize(source)).parse()
+    cg = CodeGen(inline=inline)
+    cg.gen(vars_, funcs)
+    return cg
+
+
+def test_candidates_follow_size_hints_and_recursion():
+    _, _, funcs = Parser(tokenize(SOURCE)).parse()
+    names = set(inline_candidates(funcs, SYSCALLS))
+    assert {"rotl", "pick", "mix", "big", "store"} <= names
+    assert not names & {"tiny", "fib"}
+    # Размер mix учитывает подставленные rotl и pick; inline снимает ограничение размера
+    small = inline_candidates(funcs, SYSCALLS, max_nodes=20)
+    assert "mix" not in small and "big" in small
+
+
+@pytest.mark.parametrize("kwargs", [{"engine": "reference"}, {"engine": "table"},
+                                    {"engine": "table", "jit": True, "jit_threshold": 0}])
+def test_inlined_code_matches_calls(kwargs):
+    results = []
+    for inline in (False, True):
+        cg = codegen(SOURCE, inline=inline)
+        vm = XVM(cg.code, functions=cg.func_addresses, **kwargs)
+        vm.run()
+        out = [vm.execute_function(cg.func_addresses["run"], [k]) for k in (0, 1, 9, 2 ** 63 + 5)]
+        assert not vm.stack and not vm.call_stack
+        results.append((out, vm.memory[cg.globals["acc"]], vm.heap[vm.memory[cg.globals["buf"]] + 1]))
+    assert results[0] == results[1]
+
+
+def test_inlining_removes_calls():
+    plain, inlined = codegen(SOURCE), codegen(SOURCE, inline=True)
+    assert inlined.inline_stats["functions"] == {"rotl", "pick", "mix", "big", "store"}
+    calls = lambda cg: sum(1 for k in range(0, len(cg.code), 2) if cg.code[k] == 21)
+    # tiny (noinline) и fib (рекурсия) остаются вызовами; вложенные подстановки тоже считаются
+    assert (calls(plain), calls(inlined)) == (11, 4)
+    assert inlined.inline_stats["calls_removed"] == 11
+
+
+def test_string_literals_share_one_copy():
+    lines = "".join(f'prints("s{k % 50}");' for k in range(2000))
+    cg = codegen(f"func main() {{ {lines} return Int(0); }}")
+    assert len(cg.string_pool) == 50
+    assert sorted(cg.string_pool.values()) == sorted(f"s{k}" for k in range(50))
+    assert cg.next_string_addr == 100000 + sum(len(f"s{k}") + 1 for k in range(50))
@@ -0,0 +1,105 @@
+"""Дифференциальная проверка JIT: эталонный движок и сгенерированный код дают одно состояние VM."""
+import os
+
+import pytest
+
+from main import compile_program, create_vm, boot_node
+from xvm import XVM
+from xvm_memory import BACKENDS
+from xvm_sig import mint_message, sign_words
+
+ENGINES = [
+    {"engine": "reference"},
+    {"engine": "table"},
+    {"engine": "table", "jit": True, "jit_threshold": 0},
+]
+
+STR = 300  # адрес строки в куче, которая попадает в кеш строк (cache_span)
+
+
+def edge_program():
+    """Байт-код одной функции f(x): пограничные случаи опкодов, результаты - в memory[10..]."""
+    ops = [
+        (1, -5), (1, 3), (10, 0), (4, 10),            # отрицательный литерал: -5 + 3
+        (1, -5), (4, 11),                             # отрицательное слово в память
+        (1, -7), (1, 2), (13, 0), (4, 12),            # деление с отрицательным
+        (1, 9), (1, 0), (13, 0), (4, 13),             # деление на 0
+        (1, 1), (1, 70), (33, 0), (4, 14),            # сдвиг влево на >= 64
+        (1, -1), (1, 64), (32, 0), (4, 15),           # сдвиг вправо на 64
+        (1, 12345), (1, 65), (32, 0), (4, 16),        # сдвиг вправо на 65
+        (5, 50), (4, 17),                             # LOADL ниже стека
+        (5, -10), (4, 18),                            # LOADL выше стека
+        (1, 1), (1, 2), (5, 50), (10, 0), (10, 0), (4, 19),  # LOADL за стеком при значениях в блоке
+        (5, 0), (1, 7), (12, 0), (6, 0),              # STORL параметра
+        (5, 0), (4, 20),
+        (1, STR), (1, 1), (1, 66), (43, 0),           # HSTORE внутри cache_span
+        (1, STR), (1, 1), (42, 0), (4, 21),
+        (1, STR), (1, 40), (1, -2), (43, 0),          # HSTORE отрицательного значения
+        (1, 11), (1, -3),                             # временные значения остаются на стеке
+        (5, 0), (22, 1),
+    ]
+    return [w for op in ops for w in op]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_edge_opcodes_match_reference(backend):
+    states = []
+    for kwargs in ENGINES:
+        vm = XVM(edge_program(), functions={"f": 0}, backend=backend, **kwargs)
+        for k, ch in enumerate("hello"):
+            vm.heap[STR + k] = ord(ch)
+        assert vm._heap_str(STR) == "hello"
+        assert vm.cache_span[0] <= STR + 1 <= vm.cache_span[1]
+        vm.stack.append(99)  # значение вызывающего под кадром
+        result = vm.execute_function(0, [6])
+        states.append((result, list(vm.memory), list(vm.heap), vm.stack, vm._heap_str(STR)))
+    reference = states[0]
+    assert reference[4] == "hBllo"  # кеш строки сброшен записью
+    for kwargs, state in zip(ENGINES[1:], states[1:]):
+        assert state[0] == reference[0], kwargs
+        assert state[1] == reference[1], kwargs
+        assert state[2] == reference[2], kwargs
+        assert state[3] == reference[3], kwargs
+        assert state[4] == reference[4], kwargs
+
+
+def run_chain(cg, mints=5, **kwargs):
+    """Загрузка узла, кошелек, mints NFT и полная проверка; состояние VM и файлы цепочки."""
+    vm = create_vm(cg, **kwargs)
+    boot_node(vm, cg)
+    fa = cg.func_addresses
+    keys = vm.execute_function(fa["action_create_wallet"], [1])
+    pub, priv, owner = vm.heap[keys:keys + 3]
+    results = []
+    for i in range(mints):
+        doc = vm.hp
+        vm.hp += 16
+        for j in range(8): vm.heap[doc + j] = i * 8 + j
+        message = mint_message(i + 1, owner, owner, vm.heap[doc:doc + 8])
+        for j, w in enumerate(sign_words(vm.heap[priv:priv + 4], message)): vm.heap[doc + 8 + j] = w
+        results.append(vm.execute_function(fa["action_nft_create"], [i + 1, owner, owner, doc, pub, doc + 8]))
+    results.append(vm.execute_function(fa["bc_verify_full_integrity"], []))
+    vm.chain_writer.close()
+    for store in vm.block_stores.values(): store.close()
+    files = {name: open(name, "rb").read() for name in ("chain.json", "chain.blk")}
+    return results, list(vm.memory), list(vm.heap[:vm.hp]), vm.stack, files
+
+
+@pytest.mark.parametrize("opt_level", [0, 3])
+def test_chain_flow_matches_reference(xl_dir, ed25519_keys, opt_level):
+    cg, _ = compile_program("main.xl", opt_level=opt_level, use_cache=False)
+    runs = []
+    for n, kwargs in enumerate(ENGINES + [{"engine": "table", "jit": True, "jit_threshold": 0, "backend": "list"}]):
+        os.mkdir(f"run{n}")
+        os.chdir(f"run{n}")
+        ed25519_keys()
+        runs.append(run_chain(cg, **kwargs))
+        os.chdir(xl_dir)
+    reference = runs[0]
+    assert reference[0] == [1] * 6
+    for run in runs[1:]:
+        assert run[0] == reference[0]
+        assert run[1] == reference[1]
+        assert run[2] == reference[2]
+        assert run[3] == reference[3]
+        assert run[4] == reference[4]
@@ -0,0 +1,88 @@
+from array import array
+
+import pytest
+
+from xvm import XVM
+from xvm_memory import MASK64, BACKENDS, words, store, footprint
+
+
+def test_store_masks_and_grows():
+    buf = words(4, "array")
+    store(buf, 1, -1)
+    store(buf, 10, 1 << 70 | 5)
+    assert buf[1] == MASK64 and buf[10] == 5
+    assert isinstance(buf, array) and len(buf) >= 11
+
+
+def test_array_backend_is_smaller():
+    values = [w * 1000003 for w in range(1000)]
+    sizes = {}
+    for backend in BACKENDS:
+        buf = words(1000, backend)
+        for k, v in enumerate(values): buf[k] = v
+        sizes[backend] = footprint(buf)
+    assert sizes["array"] < sizes["list"]
+
+
+@pytest.mark.parametrize("engine", ["reference", "table"])
+def test_heap_grows_past_initial_capacity(engine):
+    # HSTORE за концом начальной емкости array-кучи и отрицательное значение
+    code = [1, 0, 1, 600000, 1, -3, 43, 0, 1, 0, 1, 600000, 42, 0, 22, 0]
+    vm = XVM(code, functions={"f": 0}, engine=engine, backend="array")
+    assert vm.execute_function(0, []) == MASK64 - 2
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_arena_resets_but_keeps_persistent(backend):
+    vm = XVM([], backend=backend)
+    vm.hp = vm.heap_high_water = start = 100000
+    with vm.arena():
+        scratch = vm.hp
+        vm.hp += 50
+        vm.heap[scratch] = 7
+        with vm.arena():  # вложенная арена сливается с внешней
+            vm.hp += 10
+        assert vm.hp == start + 60
+        keys = vm.alloc_persistent(4)
+        for k in range(4): vm.heap[keys + k] = k + 1
+        vm.hp += 20
+        vm.heap[vm.hp - 1] = 9
+    assert vm.hp == keys + 4
+    assert vm.heap[scratch] == 7  # ниже закрепленных слов арена не сбрасывается
+    assert list(vm.heap[keys:keys + 4]) == [1, 2, 3, 4]
+    assert vm.heap[keys + 4 + 19] == 0
+    stats = vm.heap_stats()
+    assert stats["arenas"] == 1 and stats["reclaimed"] == 20 and stats["peak"] == 84
+    assert stats["high_water"] == keys + 24 and stats["persistent"] == vm.hp
+
+    with vm.arena():
+        vm.hp += 1000
+    assert vm.hp == keys + 4 and vm.heap_stats()["arenas"] == 2
+
+
+def test_requests_do_not_grow_heap(xl_dir):
+    from main import compile_program, create_vm, boot_node
+    from xvm_sig import mint_message, sign_words
+    cg, _ = compile_program("main.xl", use_cache=False)
+    vm = create_vm(cg)
+    boot_node(vm, cg)
+    fa = cg.func_addresses
+    hp = vm.hp
+    with vm.arena():
+        keys = vm.execute_function(fa["action_create_wallet"], [1])
+        pub, priv, owner = vm.heap[keys:keys + 3]
+        pub, priv = list(vm.heap[pub:pub + 4]), list(vm.heap[priv:priv + 4])
+    assert vm.hp == hp  # ключи кошелька - в арене запроса
+    for nft_id in range(1, 11):
+        with vm.arena():
+            doc = vm.hp
+            vm.hp += 20
+            for j in range(8): vm.heap[doc + j] = nft_id + j
+            message = mint_message(nft_id, owner, owner, vm.heap[doc:doc + 8])
+            for j, w in enumerate(sign_words(priv, message)): vm.heap[doc + 8 + j] = w
+            for j, w in enumerate(pub): vm.heap[doc + 16 + j] = w
+            assert vm.execute_function(fa["action_nft_create"], [nft_id, owner, owner, doc, doc + 16, doc + 8]) == 1
+        assert vm.hp == hp
+    with vm.arena():
+        assert vm.execute_function(fa["bc_verify_full_integrity"], []) == 1
+    assert vm.hp == hp and vm.heap_stats()["reclaimed"] > 0
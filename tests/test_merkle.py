@@ -0,0 +1,68 @@
+import pytest
+import nacl.signing
+
+from xvm_merkle import MerkleAccumulator, verify_proof, sign_root, verify_root, root_message, mountains
+
+MAX_SIZE = 64
+
+
+def block_hash(i):
+    return tuple((i * 8 + k) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF for k in range(8))
+
+
+@pytest.fixture(scope="module")
+def accumulator():
+    acc = MerkleAccumulator()
+    for i in range(1, MAX_SIZE + 1):
+        acc.append(block_hash(i))
+    return acc
+
+
+def test_mountains_cover_leaves():
+    for size in range(1, MAX_SIZE + 1):
+        mounts = mountains(size)
+        assert sum(1 << level for level, _ in mounts) == size
+        assert [level for level, _ in mounts] == sorted((level for level, _ in mounts), reverse=True)
+
+
+def test_every_proof_verifies(accumulator):
+    for size in range(1, MAX_SIZE + 1):
+        root = accumulator.root(size).hex()
+        for index in range(1, size + 1):
+            proof = accumulator.proof(index, size)
+            assert proof["root"] == root
+            assert verify_proof(block_hash(index), proof, root), (index, size)
+            # Чужой лист и тот же лист на другом месте не проходят
+            assert not verify_proof(block_hash(index % size + 1) if size > 1 else block_hash(0), proof, root)
+            if size > 1:
+                assert not verify_proof(block_hash(index), {**proof, "index": index % size + 1}, root)
+
+
+def test_old_roots_stay_stable(accumulator):
+    acc = MerkleAccumulator()
+    for i in range(1, MAX_SIZE + 1):
+        acc.append(block_hash(i))
+        assert acc.root() == accumulator.root(i)
+
+
+def test_proof_out_of_range(accumulator):
+    with pytest.raises(IndexError):
+        accumulator.proof(5, 4)
+    with pytest.raises(IndexError):
+        accumulator.root(MAX_SIZE + 1)
+
+
+def test_signed_root_verifies():
+    key = nacl.signing.SigningKey(bytes(range(32)))
+    acc = MerkleAccumulator()
+    for i in range(1, 6):
+        acc.append(block_hash(i))
+    signed = sign_root(key, 5, acc.root(5))
+    assert signed["root"] == acc.root(5).hex()
+    nacl.signing.VerifyKey(bytes.fromhex(signed["public_key"])).verify(
+        root_message(5, acc.root(5)), bytes.fromhex(signed["signature"]))
+    assert verify_root(signed, key.verify_key.encode().hex())
+    assert not verify_root({**signed, "size": 4})
+    assert not verify_root({**signed, "root": acc.root(4).hex()})
+    other = nacl.signing.SigningKey(bytes(32)).verify_key.encode().hex()
+    assert not verify_root(signed, other)
@@ -0,0 +1,115 @@
+import pytest
+
+from main import OPT_LEVELS, compile_program, create_vm, opt_report
+from xlang_lexer import tokenize
+from xlang_parser import Parser, BinOp, Number, Var, VarDecl, Return, Call
+from xlang_optimizer import MASK64, fold_expr, constant_globals, optimize_ast
+
+SOURCE = """
+var SIZE = Int(4) * Int(2);
+var STEP = SIZE / Int(4);
+var counter = Int(0);
+var table = new(SIZE);
+
+func bump(SIZE) {
+    counter = counter + SIZE;
+    return counter;
+}
+
+func fill() {
+    var i = Int(0);
+    while (i < SIZE) {
+        table[i] = i * STEP;
+        i = i + STEP;
+    }
+    if (Int(0)) {
+        var dead = Int(5);
+        counter = dead;
+    } else {
+        counter = counter + Int(1);
+    }
+    while (Int(0)) { counter = Int(99); }
+    var x = bump(Int(3));
+    return table[6] + x;
+    counter = Int(1000);
+}
+
+func main() {
+    return Int(0);
+}
+"""
+
+
+def parse(source):
+    _, vars_, funcs = Parser(tokenize(source)).parse()
+    return vars_, funcs
+
+
+@pytest.mark.parametrize("op,a,b,expected", [
+    ("+", MASK64, 2, 1),
+    ("-", 0, 1, MASK64),
+    ("*", 1 << 63, 2, 0),
+    ("/", 7, 0, 0),
+    ("/", 7, 2, 3),
+    ("<<", 1, 65, 2),
+    (">>>", 8, 67, 1),
+    ("&&", 3, 0, 0),
+    ("||", 0, 9, 1),
+    ("==", 5, 5, 1),
+])
+def test_fold_follows_vm_rules(op, a, b, expected):
+    assert fold_expr(BinOp(Number(a), op, Number(b))) == Number(expected)
+
+
+def test_fold_keeps_unknown_names():
+    e = BinOp(Var("x"), "+", BinOp(Number(2), "*", Number(3)))
+    assert fold_expr(e) == BinOp(Var("x"), "+", Number(6))
+    assert fold_expr(e, {"x": 1}) == Number(7)
+    assert fold_expr(Call("f", [BinOp(Number(1), "+", Number(1))])) == Call("f", [Number(2)])
+
+
+def test_constant_globals_skip_reassigned():
+    vars_, funcs = parse(SOURCE)
+    assert constant_globals(vars_, funcs) == {"SIZE": 8, "STEP": 2}
+
+
+def test_dead_code_keeps_slots_and_shadowing():
+    vars_, funcs = parse(SOURCE)
+    _, new_funcs, _ = optimize_ast(vars_, funcs)
+    by_name = {f.name: f for f in new_funcs}
+    # Параметр SIZE перекрывает глобальную константу
+    assert "SIZE" in repr(by_name["bump"].body)
+    body = by_name["fill"].body
+    assert VarDecl("dead", None) in body
+    assert "99" not in repr(body) and "1000" not in repr(body)
+    assert isinstance(body[-1], Return)
+
+
+def run_fill(cg, **kwargs):
+    vm = create_vm(cg, **kwargs)
+    vm.run()
+    return vm.execute_function(cg.func_addresses["fill"], []), vm.memory
+
+
+def test_levels_agree(xl_dir):
+    with open("opt_test.xl", "w") as f:
+        f.write(SOURCE)
+    sizes, results = [], []
+    for level in OPT_LEVELS:
+        cg, stats = compile_program("opt_test.xl", opt_level=level)
+        assert (stats is None) == (level == 0)
+        sizes.append(len(cg.code))
+        results.append(run_fill(cg, engine="reference"))
+    assert results[0][0] == 12 + 3 + 1
+    assert results[1] == results[0] and results[2] == results[0]
+    assert sizes[0] > sizes[1] > sizes[2]
+
+
+def test_main_report_levels(xl_dir):
+    rows = opt_report("main.xl")
+    assert [row[0] for row in rows] == list(OPT_LEVELS)
+    for (level, size, run, boot), (_, size2, run2, boot2) in zip(rows, rows[1:]):
+        # Инлайнинг (-O3) может увеличить код, но не число шагов
+        assert size2 <= size or level == 2
+        assert run2 <= run and boot2 <= boot
+    assert rows[2][1] < rows[0][1]
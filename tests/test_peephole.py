@@ -0,0 +1,103 @@
+import pytest
+
+from main import create_vm, opt_report
+from xlang_lexer import tokenize
+from xlang_parser import Parser
+from xlang_codegen import CodeGen
+from xlang_peephole import optimize
+from xvm_superops import SUPER_OPS, expand, instructions
+
+SOURCE = """
+var table = new(Int(8));
+var total = Int(0);
+
+func scale(x) {
+    return x * Int(3) + Int(1);
+}
+
+func fill(n) {
+    var i = Int(0);
+    while (i < Int(8)) {
+        var v = scale(i + n);
+        table[i] = v;
+        i = i + Int(1);
+    }
+    total = table[2] + table[7] - Int(4);
+    var k = Int(1);
+    if (k == Int(1)) { total = total + table[k]; }
+    if (total > Int(1000)) { total = Int(0); }
+    return total;
+}
+
+func main() {
+    return Int(0);
+}
+"""
+
+ENGINES = [{"engine": "reference"}, {"engine": "table"}, {"engine": "table", "jit": True, "jit_threshold": 0}]
+
+
+def compile_source(source, peephole):
+    _, vars_, funcs = Parser(tokenize(source)).parse()
+    cg = CodeGen()
+    cg.gen(vars_, funcs)
+    if peephole:
+        optimize(cg)
+    return cg
+
+
+def run_fill(cg, **kwargs):
+    vm = create_vm(cg, **kwargs)
+    vm.run()
+    result = vm.execute_function(cg.func_addresses["fill"], [5])
+    return vm, result
+
+
+def test_optimize_fuses_and_remaps():
+    LOAD, PUSH, ADD, POP, JZ, JMP, RET = 3, 1, 7, 2, 30, 20, 22
+    cg = CodeGen()
+    cg.code = [LOAD, 0, PUSH, 3, ADD, 0,   # -> LOAD_OPC
+               PUSH, 9, POP, 0,           # удаляется
+               JZ, 12,                    # JZ на JMP -> сразу на RET
+               JMP, 16,
+               PUSH, 1,                   # начало функции g
+               RET, 0]
+    cg.func_addresses = {"f": 0, "g": 14}
+    stats = optimize(cg)
+    assert cg.code == [71, 0, ADD, 3, JZ, 10, JMP, 10, PUSH, 1, RET, 0]
+    assert cg.func_addresses == {"f": 0, "g": 8}
+    assert stats == {"size_before": 18, "size_after": 12, "fused": 1, "removed": 2}
+
+
+def test_superops_expand_to_original_sequence():
+    plain = compile_source(SOURCE, peephole=False)
+    fused = compile_source(SOURCE, peephole=True)
+    ops = {op for _, op, _ in instructions(fused.code)}
+    assert ops & SUPER_OPS
+    assert len(fused.code) < len(plain.code)
+    for pc, op, arg in instructions(fused.code):
+        if op in SUPER_OPS:
+            seq = expand(op, arg, fused.code[pc + 2], fused.code[pc + 3])
+            assert len(seq) == 3
+    with pytest.raises(ValueError):
+        expand(1, 0, 0, 0)
+
+
+@pytest.mark.parametrize("kwargs", ENGINES, ids=["reference", "table", "jit"])
+def test_peephole_preserves_results(kwargs):
+    plain_vm, plain = run_fill(compile_source(SOURCE, peephole=False), **kwargs)
+    fused_vm, fused = run_fill(compile_source(SOURCE, peephole=True), **kwargs)
+    assert fused == plain
+    assert fused_vm.memory == plain_vm.memory
+    assert fused_vm.heap == plain_vm.heap
+
+
+def test_reference_counts_fewer_steps():
+    plain_vm, _ = run_fill(compile_source(SOURCE, peephole=False), engine="reference")
+    fused_vm, _ = run_fill(compile_source(SOURCE, peephole=True), engine="reference")
+    assert fused_vm.steps < plain_vm.steps
+
+
+def test_main_report(xl_dir):
+    (_, off_size, off_run, off_boot), (_, on_size, on_run, on_boot) = opt_report("main.xl")[:2]
+    assert on_size < off_size and on_run < off_run and on_boot < off_boot
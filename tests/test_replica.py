@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from xvm_blockstore import BlockStore, Block
+from xvm_replica import ChainView, verify_chain
+from xvm_state import WorldState
+from xvm_audit import GENESIS_PREV
+
+STORE = "chain.blk"
+
+
+def append(store, n):
+    """n блоков: кошелек и NFT по очереди, ph каждого - h предыдущего."""
+    for _ in range(n):
+        i = len(store) + 1
+        prev = store.get(i - 1).hash if i > 1 else GENESIS_PREV
+        payload = (1000 + i, 1, 0) if i % 2 else (i, 1000 + i - 1, 1000 + i - 1, *range(8), 0, 1)
+        store.append(Block(i, 1 if i % 2 else 2, 0, prev, (i,) * 8, payload))
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = BlockStore(STORE)
+    yield store
+    store.close()
+
+
+def test_view_follows_published_tip(writer):
+    append(writer, 4)
+    writer.save_tip(0)
+    view = ChainView(STORE)
+    assert len(view) == 4 and list(view.blocks()) == list(writer.blocks())
+    state = WorldState(view)
+    assert sorted(state.nfts) == [2, 4]
+
+    # Неопубликованные блоки реплике не видны
+    append(writer, 2)
+    assert view.refresh() == 4 and view.get(5) is None
+    writer.save_tip(0)
+    assert view.refresh() == 6 and view.get(6) == writer.get(6)
+    assert state.sync().height == 6 and sorted(state.nfts) == [2, 4, 6]
+    view.close()
+
+
+def test_view_without_tip_skips_torn_record(writer):
+    append(writer, 3)
+    end = writer._end
+    writer.close()
+    os.remove(STORE + ".tip")
+    with open(STORE, "r+b") as f:
+        f.truncate(end - 5)  # запись блока 3 обрезана, индекс ее еще содержит
+    view = ChainView(STORE)
+    assert view.tip is None and len(view) == 2
+    view.close()
+
+
+def test_verify_chain_resumes_and_detects_break(writer):
+    append(writer, 5)
+    writer.save_tip(0)
+    report = verify_chain(STORE)
+    assert report == {"is_valid": True, "blocks_checked": 5, "broken_at": None, "height": 5,
+                      "tip_hash": (5,) * 8}
+    append(writer, 2)
+    writer.save_tip(0)
+    report = verify_chain(STORE, report["height"] + 1, report["tip_hash"])
+    assert report["is_valid"] and report["blocks_checked"] == 2 and report["height"] == 7
+    # Продолжение с хешем, которого нет в цепочке - проверка с начала
+    assert verify_chain(STORE, 6, (9,) * 8)["blocks_checked"] == 7
+
+    writer.append(Block(8, 1, 0, (1,) * 8, (8,) * 8, (1008, 1, 0)))
+    writer.save_tip(0)
+    report = verify_chain(STORE)
+    assert not report["is_valid"] and report["broken_at"] == 8 and report["height"] == 7
@@ -0,0 +1,273 @@
+import threading
+
+import pytest
+import nacl.signing
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+import crypto
+import server
+from xvm_audit import GENESIS_PREV
+from xvm_merkle import root_message, verify_proof
+from xvm_sig import sign_words, mint_message, transfer_message
+
+DOC = list(range(10, 18))
+
+
+@pytest.fixture
+def node(xl_dir, monkeypatch):
+    """node(**настройки server) -> TestClient; узел стартует в with (lifespan) в каталоге xl_dir."""
+    def start(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(server, name, value)
+        for pending in (server.pending_mints, server.pending_transfers, server.unsealed_nfts, server.unsealed_wallets):
+            pending.clear()
+        return TestClient(server.app)
+    return start
+
+
+def create_wallet(client):
+    response = client.post("/create_wallet", json={"role": 1})
+    assert response.status_code == 200, response.text
+    return response.json()["wallet"]
+
+
+def mint(client, wallet, nft_id, owner=None):
+    owner = owner or wallet["public_key"]
+    signature = sign_words(wallet["signing_key"], mint_message(nft_id, owner, wallet["public_key"], DOC))
+    return client.post("/mint_nft", json={"nft_id": nft_id, "owner": owner, "creator": wallet["public_key"],
+                                          "doc_hash": DOC, "signature": signature})
+
+
+def transfer(client, wallet, nft_id, new_owner, nonce):
+    signature = sign_words(wallet["signing_key"], transfer_message(nft_id, new_owner, nonce))
+    return client.post("/transfer_nft", json={"nft_id": nft_id, "new_owner": new_owner, "nonce": nonce,
+                                              "signature": signature})
+
+
+def test_full_queue_answers_429(node):
+    with node(XVM_QUEUE_DEPTH=1) as client:
+        started, gate = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            gate.wait()
+        # Первая команда занимает поток VM, вторая ждет в очереди глубины 1
+        running = client.portal.start_task_soon(server.executor.submit, block)
+        assert started.wait(5)
+        queued = client.portal.start_task_soon(server.executor.submit, lambda: None)
+        while client.get("/queue").json()["queued"] < 1:
+            pass
+        response = client.post("/create_wallet", json={"role": 1})
+        assert response.status_code == 429
+        gate.set()
+        running.result(5), queued.result(5)
+        assert client.get("/queue").json()["rejected"] == 1
+        wallet = create_wallet(client)
+        assert mint(client, wallet, 1).json()["status"] == "success"
+
+
+def test_mint_and_read_endpoints(node):
+    with node() as client:
+        wallet = create_wallet(client)
+        assert mint(client, wallet, 1).json()["status"] == "success"
+        assert mint(client, wallet, 1).status_code == 400
+        nft = client.get("/nft/1").json()
+        assert nft["owner"] == wallet["public_key"] and nft["status"] == 1
+        assert [b["type"] for b in client.get("/nft/1/history").json()["blocks"]] == [2]
+        assert client.get(f"/wallet/{wallet['public_key']}/nfts").json()["nfts"] == [1]
+        assert client.get("/block/2").json()["payload"]["nft_id"] == 1
+        assert client.get("/nft/5").status_code == 404
+        assert transfer(client, wallet, 5, 1, 1).status_code == 404
+        assert client.get("/verify").json() == {"is_valid": True, "mode": "incremental", "blocks_checked": 2}
+
+
+def batch_mint(wallet, nft_id):
+    owner = wallet["public_key"]
+    return {"op": "mint", "nft_id": nft_id, "owner": owner, "creator": owner, "doc_hash": DOC,
+            "signature": sign_words(wallet["signing_key"], mint_message(nft_id, owner, owner, DOC))}
+
+
+def batch_transfer(wallet, nft_id, new_owner, nonce):
+    return {"op": "transfer", "nft_id": nft_id, "new_owner": new_owner, "nonce": nonce,
+            "signature": sign_words(wallet["signing_key"], transfer_message(nft_id, new_owner, nonce))}
+
+
+def test_batch_rejects_invalid_items(node):
+    with node() as client:
+        wallet = create_wallet(client)
+        assert mint(client, wallet, 1).json()["status"] == "success"
+        ops = [batch_mint(wallet, 1), {"op": "burn"}, batch_mint(wallet, 2), batch_mint(wallet, 2),
+               batch_transfer(wallet, 2, 5, 1), batch_transfer(wallet, 9, 5, 1)]
+        response = client.post("/batch", json={"ops": ops})
+        assert response.status_code == 400
+        assert [item["index"] for item in response.json()["detail"]] == [0, 1, 3, 5]
+        assert client.get("/nft/2").status_code == 404  # ничего не выполнено
+
+
+def test_batch_partial_failure(node, monkeypatch):
+    with node() as client:
+        wallet = create_wallet(client)
+        mint_nft = server.vm_mint_nft
+
+        def failing_mint(addr, req, key):
+            if req.nft_id == 2:
+                raise RuntimeError("VM fault")
+            return mint_nft(addr, req, key)
+        monkeypatch.setattr(server, "vm_mint_nft", failing_mint)
+        ops = [batch_mint(wallet, 1), batch_mint(wallet, 2), batch_mint(wallet, 3)]
+        body = client.post("/batch", json={"ops": ops}).json()
+        assert body["status"] == "partial" and body["count"] == 3
+        assert [r["status"] for r in body["results"]] == ["success", "error", "skipped"]
+        assert body["results"][1]["message"] == "VM fault"
+        # Блок первой операции записан, пропущенные не выполнялись и не заняли nft_id
+        assert client.get("/nft/1").status_code == 200
+        assert client.get("/nft/3").status_code == 404
+        assert not server.pending_mints
+        monkeypatch.setattr(server, "vm_mint_nft", mint_nft)
+        body = client.post("/batch/mint_nft", json=[{k: v for k, v in batch_mint(wallet, n).items() if k != "op"}
+                                                   for n in (2, 3)]).json()
+        assert body["status"] == "success" and [r["status"] for r in body["results"]] == ["success"] * 2
+        assert client.get("/verify?mode=full").json()["is_valid"]
+
+
+def test_batch_size_limit(node):
+    with node(XVM_BATCH_MAX=2) as client:
+        response = client.post("/batch/create_wallet", json=[{"role": 1}] * 3)
+        assert response.status_code == 413
+
+
+def test_mempool_seals_block_of_transactions(node):
+    with node(XVM_BLOCK_TXS=3, XVM_BLOCK_MS=60000) as client:
+        wallet = create_wallet(client)
+        assert mint(client, wallet, 1).json() == {"status": "pending", "block_index": 1, "nonce": 1}
+        assert client.get("/queue").json()["mempool"] == 2
+        assert client.get("/block/1").status_code == 404
+        # Mint в мемпуле уже занимает nft_id, а его передача принимается до записи блока
+        assert mint(client, wallet, 1).status_code == 400
+        assert transfer(client, wallet, 1, 999, 1).json() == {"status": "success", "block_index": 1, "nonce": 2}
+        block = client.get("/block/1").json()
+        assert block["type"] == 5 and block["payload"]["tx_count"] == 3
+        assert client.get("/queue").json()["mempool"] == 0
+        assert client.get("/nft/1").json()["owner"] == 999
+        assert client.get("/verify?mode=full").json()["is_valid"]
+        # Остаток мемпула запечатывается при остановке узла
+        assert mint(client, wallet, 2).json() == {"status": "pending", "block_index": 2, "nonce": 1}
+    with node() as client:
+        assert client.get("/nft/2").json()["owner"] == wallet["public_key"]
+
+
+def test_reader_role_serves_reads_only(node):
+    with node() as client:
+        wallet = create_wallet(client)
+        assert mint(client, wallet, 1).json()["status"] == "success"
+    with node(XVM_ROLE="reader", replica_verified=(1, GENESIS_PREV)) as client:
+        assert client.get("/nft/1").json()["owner"] == wallet["public_key"]
+        assert client.get(f"/wallet/{wallet['public_key']}/nfts").json()["nfts"] == [1]
+        assert client.post("/create_wallet", json={"role": 1}).status_code == 503
+        assert client.get("/verify").json() == {"is_valid": True, "mode": "incremental", "blocks_checked": 2}
+        assert client.get("/verify").json()["blocks_checked"] == 0
+        assert client.get("/verify?mode=full").json()["blocks_checked"] == 2
+
+
+def test_proof_verifies_against_signed_root(node):
+    with node() as client:
+        wallet = create_wallet(client)
+        for nft_id in (1, 2, 3):
+            assert mint(client, wallet, nft_id).json()["status"] == "success"
+        signed = client.get("/root").json()
+        assert signed["size"] == 4
+        nacl.signing.VerifyKey(bytes.fromhex(signed["public_key"])).verify(
+            root_message(4, bytes.fromhex(signed["root"])), bytes.fromhex(signed["signature"]))
+        store = server.world.store
+        for index in (1, 3):
+            proof = client.get(f"/proof/{index}?size=3").json()
+            assert proof["block"]["index"] == index and proof["signed_root"]["size"] == 3
+            assert verify_proof(store.get(index).hash, proof, proof["signed_root"]["root"])
+            assert not verify_proof(store.get(index).hash, proof, signed["root"])
+        assert client.get("/proof/5").status_code == 404
+        assert client.get("/root?size=9").status_code == 404
+
+
+def test_signatures_and_nonces(node):
+    with node() as client:
+        alice, bob = create_wallet(client), create_wallet(client)
+        forged = {**alice, "signing_key": bob["signing_key"]}
+        assert mint(client, forged, 1).status_code == 401
+        assert mint(client, alice, 1).json()["nonce"] == 1
+        assert client.get("/nft/1").json()["nonce"] == 1
+        assert transfer(client, bob, 1, bob["public_key"], 1).status_code == 401
+        assert transfer(client, alice, 1, bob["public_key"], 2).status_code == 409
+        assert transfer(client, alice, 1, bob["public_key"], 1).json()["nonce"] == 2
+        # Повтор той же подписи отклонен: nonce уже другой
+        assert transfer(client, alice, 1, bob["public_key"], 1).status_code == 409
+        assert transfer(client, bob, 1, alice["public_key"], 2).json()["status"] == "success"
+        assert client.get("/nft/1").json()["owner"] == alice["public_key"]
+        # Подпись в VM - попадание в кеш: сервер проверил ее до входа в VM
+        assert server.vm.verifier.stats["cache_hits"] >= 3
+
+        bad = batch_mint(alice, 3)
+        bad["signature"] = [w ^ 1 for w in bad["signature"]]
+        response = client.post("/batch", json={"ops": [batch_mint(alice, 2), bad]})
+        assert response.status_code == 400 and response.json()["detail"] == [{"index": 1, "error": "Invalid signature"}]
+        assert client.get("/nft/2").status_code == 404
+        ops = [batch_mint(alice, 2), batch_transfer(alice, 2, bob["public_key"], 1),
+               batch_transfer(bob, 2, alice["public_key"], 2)]
+        assert [r["status"] for r in client.post("/batch", json={"ops": ops}).json()["results"]] == ["success"] * 3
+        assert client.get("/nft/2").json()["nonce"] == 3
+
+
+def test_wallet_ids_survive_restart_without_snapshot(node):
+    # Без снимка (сбой, XVM_SNAPSHOT="", новый байт-код) куча VM начинается заново
+    with node(XVM_SNAPSHOT="") as client:
+        owner = create_wallet(client)
+        assert mint(client, owner, 5).json()["status"] == "success"
+    with node(XVM_SNAPSHOT="") as client:
+        wallets = [create_wallet(client) for _ in range(3)]
+        assert owner["public_key"] not in {w["public_key"] for w in wallets}
+        for wallet in wallets:
+            assert transfer(client, wallet, 5, 999, 1).status_code == 401
+        assert client.get("/nft/5").json()["owner"] == owner["public_key"]
+        assert transfer(client, owner, 5, 999, 1).json()["status"] == "success"
+
+
+def test_wallet_id_collision_keeps_first_key(node, monkeypatch):
+    first, second = crypto.generate_ed25519_keys(), crypto.generate_ed25519_keys()
+    # Второй ключ с тем же первым словом - тот же ID кошелька
+    keys = iter([first, ([first[0][0], *second[0][1:]], second[1])])
+    monkeypatch.setattr(crypto, "generate_ed25519_keys", lambda: next(keys))
+    with node() as client:
+        owner = create_wallet(client)
+        assert owner["public_key"] == crypto.wallet_id(first[0])
+        response = client.post("/create_wallet", json={"role": 2})
+        assert response.status_code == 409
+        assert client.get(f"/wallet/{owner['public_key']}/nfts").json()["role"] == 1
+        assert mint(client, owner, 7).json()["status"] == "success"
+        thief = {"public_key": owner["public_key"], "signing_key": second[1]}
+        assert transfer(client, thief, 7, 999, 1).status_code == 401
+
+
+def test_requests_reject_private_key(node):
+    with node() as client:
+        wallet = create_wallet(client)
+        assert set(wallet) == {"public_key", "verify_key", "signing_key"}
+        body = {"nft_id": 1, "owner": wallet["public_key"], "creator": wallet["public_key"], "doc_hash": DOC,
+                "signature": [0] * 8, "private_key": 1}
+        assert client.post("/mint_nft", json=body).status_code == 422
+        assert client.post("/batch", json={"ops": [{"op": "wallet", "private_key": 1}]}).status_code == 422
+
+
+def test_mempool_answers_pending_until_sealed(node):
+    with node(XVM_BLOCK_TXS=3, XVM_BLOCK_MS=60000) as client:
+        created = client.post("/create_wallet", json={"role": 1}).json()
+        assert created["status"] == "pending" and created["block_index"] == 1
+        wallet = created["wallet"]
+        minted = mint(client, wallet, 1).json()
+        assert minted == {"status": "pending", "block_index": 1, "nonce": 1}
+        assert client.get("/block/1").status_code == 404
+        # Третья транзакция запечатывает блок
+        moved = transfer(client, wallet, 1, 999, 1).json()
+        assert moved == {"status": "success", "block_index": 1, "nonce": 2}
+        assert client.get("/nft/1").json()["owner"] == 999
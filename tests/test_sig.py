@@ -0,0 +1,52 @@
+import crypto
+from xvm_sig import SignatureVerifier, BATCH_CHUNK, sign_words, mint_message, transfer_message
+
+
+def test_verify_checks_key_words_and_signature():
+    pub, priv = crypto.generate_ed25519_keys()
+    other, _ = crypto.generate_ed25519_keys()
+    words = mint_message(1, 7, 7, [2 ** 64 - 1, *range(7)])
+    sig = sign_words(priv, words)
+    verifier = SignatureVerifier()
+    assert verifier.verify(pub, words, sig)
+    # Слово целиком входит в подпись, не только младший байт
+    assert not verifier.verify(pub, mint_message(1, 7, 7, [2 ** 63 - 1, *range(7)]), sig)
+    assert not verifier.verify(other, words, sig)
+    assert not verifier.verify(pub, transfer_message(1, 7, 1), sig)
+    assert not verifier.verify(pub, words, sig[:7]) and not verifier.verify(pub[:3], words, sig)
+    assert verifier.stats["verified"] == 1 and verifier.stats["rejected"] == 3
+
+
+def test_verified_and_key_caches():
+    pub, priv = crypto.generate_ed25519_keys()
+    verifier = SignatureVerifier(key_cache=1, verified_cache=2)
+    messages = [transfer_message(1, 7, nonce) for nonce in (1, 2, 3)]
+    sigs = [sign_words(priv, words) for words in messages]
+    for words, sig in zip(messages, sigs):
+        assert verifier.verify(pub, words, sig)
+    assert verifier.stats["key_misses"] == 1 and verifier.stats["key_hits"] == 2
+    # Последние две подписи - из кеша, первая вытеснена и проверяется заново
+    assert verifier.verify(pub, messages[2], sigs[2]) and verifier.verify(pub, messages[1], sigs[1])
+    assert verifier.stats["cache_hits"] == 2
+    assert verifier.verify(pub, messages[0], sigs[0])
+    assert verifier.stats["cache_hits"] == 2 and verifier.stats["verified"] == 4
+
+
+def test_verify_many_counts_every_signature():
+    pub, priv = crypto.generate_ed25519_keys()
+    items = []
+    for n in range(BATCH_CHUNK * 8):
+        words = mint_message(n + 1, 7, 7, [n] * 8)
+        sig = sign_words(priv, words)
+        # Каждая третья подпись испорчена
+        items.append((pub, words, sig if n % 3 else [sig[0] ^ 1, *sig[1:]]))
+    verifier = SignatureVerifier()
+    results = verifier.verify_many(items, workers=8)
+    assert results == [n % 3 != 0 for n in range(len(items))]
+    assert verifier.stats["verified"] == results.count(True)
+    assert verifier.stats["rejected"] == results.count(False)
+    assert verifier.stats["key_hits"] + verifier.stats["key_misses"] == len(items)
+    # Повтор: верные из кеша, неверные снова отклонены
+    assert verifier.verify_many(items, workers=8) == results
+    assert verifier.stats["cache_hits"] == results.count(True)
+    assert verifier.stats["rejected"] == 2 * results.count(False)
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from main import compile_program, create_vm, boot_node
+from xvm_blockstore import CHAIN_STORE
+from xvm_memory import BACKENDS
+from xvm_snapshot import load_snapshot, save_snapshot
+from xvm_sig import mint_message, sign_words
+
+SNAP = "xvm.snap"
+
+
+def vm_state(vm):
+    return list(vm.memory), list(vm.heap[:vm.hp]), list(vm.stack), vm.hp, vm.pc, vm.fp
+
+
+def restart(cg, capsys, **kwargs):
+    vm = create_vm(cg, **kwargs)
+    boot_node(vm, cg, snapshot=SNAP)
+    restored = "restored from snapshot" in capsys.readouterr().out
+    return vm, restored
+
+
+def mint(vm, cg, wallet, nft_id):
+    pub, priv, owner = wallet
+    with vm.arena():
+        doc = vm.hp
+        vm.hp += 16
+        for j in range(8): vm.heap[doc + j] = nft_id + j
+        message = mint_message(nft_id, owner, owner, vm.heap[doc:doc + 8])
+        for j, w in enumerate(sign_words(vm.heap[priv:priv + 4], message)): vm.heap[doc + 8 + j] = w
+        return vm.execute_function(cg.func_addresses["action_nft_create"], [nft_id, owner, owner, doc, pub, doc + 8])
+
+
+def close(vm):
+    vm.chain_writer.close()
+    for store in vm.block_stores.values(): store.close()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_boot_restores_snapshot(xl_dir, capsys, ed25519_keys, backend):
+    cg, _ = compile_program("main.xl", use_cache=False)
+    vm, restored = restart(cg, capsys, backend=backend)
+    assert not restored and os.path.exists(SNAP)
+    keys = vm.execute_function(cg.func_addresses["action_create_wallet"], [1])
+    wallet = vm.heap[keys:keys + 3]
+    assert mint(vm, cg, wallet, 1) == 1
+    save_snapshot(vm, vm.block_stores[CHAIN_STORE], SNAP)  # как при остановке сервера
+    state = vm_state(vm)
+    close(vm)
+
+    vm, restored = restart(cg, capsys, backend=backend)
+    assert restored and vm_state(vm) == state
+    # Ключи кошелька, созданного во время работы, сохранились - им можно подписать следующий блок
+    assert mint(vm, cg, wallet, 2) == 1
+    assert vm.execute_function(cg.func_addresses["bc_verify_full_integrity"], []) == 1
+    close(vm)
+
+
+def test_tip_mismatch_falls_back_to_boot(xl_dir, capsys, ed25519_keys):
+    cg, _ = compile_program("main.xl", use_cache=False)
+    vm, _ = restart(cg, capsys)
+    vm.execute_function(cg.func_addresses["action_create_wallet"], [1])
+    close(vm)  # блок кошелька записан после снимка
+
+    vm, restored = restart(cg, capsys)
+    assert not restored
+    assert vm.memory[cg.globals["block_index"]] == 2
+    close(vm)
+    # Снимок перезаписан на новой вершине
+    vm, restored = restart(cg, capsys)
+    assert restored
+    close(vm)
+
+
+def test_other_bytecode_or_broken_file_is_ignored(xl_dir, capsys):
+    cg, _ = compile_program("main.xl", use_cache=False)
+    vm, _ = restart(cg, capsys)
+    store = vm.block_stores[CHAIN_STORE]
+    other, _ = compile_program("main.xl", opt_level=0, use_cache=False)
+    fresh = create_vm(other)
+    before = vm_state(fresh)
+    assert not load_snapshot(fresh, store, SNAP)
+    assert vm_state(fresh) == before
+
+    with open(SNAP, "r+b") as f:
+        f.truncate(os.path.getsize(SNAP) - 8)
+    assert not load_snapshot(create_vm(cg), store, SNAP)
+    assert not load_snapshot(create_vm(cg), store, "missing.snap")
+
+    with vm.arena():
+        with pytest.raises(RuntimeError):
+            save_snapshot(vm, store, SNAP)
+    close(vm)
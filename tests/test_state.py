@@ -0,0 +1,163 @@
+from main import compile_program, create_vm, boot_node
+import json
+
+from xvm_blockstore import BlockStore, Block, CHAIN_STORE, TX_BLOCK, TX_HEADER, _HEAD, _LEN, block_record, transactions
+from xvm_sig import mint_message, transfer_message, sign_words
+from xvm_state import WorldState, NFTState, NFT_ACTIVE, ResponseCache
+
+
+def node():
+    cg, _ = compile_program("main.xl", use_cache=False)
+    vm = create_vm(cg)
+    boot_node(vm, cg)
+    return vm, cg
+
+
+def call(vm, cg, name, *args):
+    with vm.arena():
+        return vm.execute_function(cg.func_addresses[name], list(args))
+
+
+def wallet(vm, cg, role):
+    """ID кошелька и его ключи (слова): в куче они живут только до конца арены запроса."""
+    with vm.arena():
+        keys = vm.execute_function(cg.func_addresses["action_create_wallet"], [role])
+        pub, priv, wallet_id = vm.heap[keys:keys + 3]
+        return wallet_id, (list(vm.heap[pub:pub + 4]), list(vm.heap[priv:priv + 4]))
+
+
+def heap_words(vm, words):
+    ptr = vm.hp
+    for j, w in enumerate(words): vm.heap[ptr + j] = w
+    vm.hp += len(words)
+    return ptr
+
+
+def mint(vm, cg, nft_id, owner, keys):
+    pub, priv = keys
+    with vm.arena():
+        doc = heap_words(vm, [0] * 8)
+        sig = heap_words(vm, sign_words(priv, mint_message(nft_id, owner, owner, [0] * 8)))
+        args = [nft_id, owner, owner, doc, heap_words(vm, pub), sig]
+        return vm.execute_function(cg.func_addresses["action_nft_create"], args)
+
+
+def transfer(vm, cg, nft_id, new_owner, keys, nonce):
+    pub, priv = keys
+    with vm.arena():
+        sig = heap_words(vm, sign_words(priv, transfer_message(nft_id, new_owner, nonce)))
+        args = [nft_id, new_owner, heap_words(vm, pub), sig, nonce]
+        return vm.execute_function(cg.func_addresses["action_nft_transfer"], args)
+
+
+def snapshot(state):
+    return dict(state.nfts), dict(state.wallets), dict(state.history), dict(state.owned), state.height
+
+
+def test_replay_matches_chain(xl_dir):
+    vm, cg = node()
+    store = vm.block_stores[CHAIN_STORE]
+    alice, alice_keys = wallet(vm, cg, 1)
+    bob, _ = wallet(vm, cg, 2)
+    state = WorldState(store)
+    assert state.wallets == {alice: 1, bob: 2} and not state.nfts
+
+    for nft_id in (1, 2, 3):
+        assert mint(vm, cg, nft_id, alice, alice_keys) == 1
+    assert transfer(vm, cg, 2, bob, alice_keys, 1) == 1
+    state.sync()
+    assert state.height == len(store) == 6
+    assert state.nft(1) == NFTState(alice, alice, NFT_ACTIVE, 3)
+    assert state.nft(2) == NFTState(bob, alice, NFT_ACTIVE, 6)
+    assert state.nft(9) is None and state.role(bob) == 2
+
+    assert state.history[2] == [4, 6] and state.history[1] == [3]
+    assert state.nfts_of(alice) == [1, 3] and state.nfts_of(bob) == [2]
+
+    # Инкрементальная синхронизация дает то же, что полный проход
+    assert snapshot(state) == snapshot(WorldState(store))
+
+    # Записи блоков совпадают с объектами chain.json
+    vm.chain_writer.close()
+    records = json.loads(open("chain.json").read() + "\n]")
+    assert [block_record(store.get(i)) for i in range(1, 7)] == records
+
+
+def test_rebuild_after_rewrite(tmp_path):
+    store = BlockStore(str(tmp_path / "chain.blk"))
+    nft = (5, 100, 100, *range(8), 1715000000, NFT_ACTIVE)
+    store.append(Block(1, 1, 0, (0,) * 8, (1,) * 8, (100, 1, 0)))
+    store.append(Block(2, 2, 0, (1,) * 8, (2,) * 8, nft))
+    state = WorldState(store)
+    store.append(Block(3, 4, 0, (2,) * 8, (3,) * 8, (5, 0, 0)))  # деактивация
+    assert state.sync().nft(5).status == 0
+    assert state.sync().height == 3
+
+    # Хранилище переписано: блок height уже другой - индекс строится заново
+    store.reset()
+    store.append(Block(1, 1, 0, (0,) * 8, (9,) * 8, (200, 2, 0)))
+    store.append(Block(2, 1, 0, (9,) * 8, (8,) * 8, (300, 1, 0)))
+    store.append(Block(3, 3, 0, (8,) * 8, (7,) * 8, (5, 300, 0)))  # передача неизвестного NFT
+    state.sync()
+    assert state.wallets == {200: 2, 300: 1} and state.nfts == {} and state.height == 3
+    store.close()
+
+
+def test_response_cache_lru():
+    cache = ResponseCache(2)
+    assert cache.get("a", lambda: 1) == 1 and cache.get("a", lambda: 2) == 1
+    assert cache.get("none", lambda: None) is None and cache.get("none", lambda: 5) == 5
+    cache.get("b", lambda: 3)  # вытесняет "a" (давно не использовался)
+    assert cache.get("a", lambda: 4) == 4
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 5
+
+
+def test_apply_invalidates_touched_keys(tmp_path):
+    store = BlockStore(str(tmp_path / "chain.blk"))
+    store.append(Block(1, 2, 0, (0,) * 8, (1,) * 8, (5, 100, 100, *range(8), 0, NFT_ACTIVE)))
+    store.append(Block(2, 2, 0, (1,) * 8, (2,) * 8, (6, 100, 100, *range(8), 0, NFT_ACTIVE)))
+    state = WorldState(store)
+    for key in (("nft", 5), ("nft", 6), ("wallet", 100), ("wallet", 200), ("block", 1)):
+        state.cache.get(key, lambda: "old")
+    store.append(Block(3, 3, 0, (2,) * 8, (3,) * 8, (5, 200, 0)))
+    state.sync()
+    fresh = {key: state.cache.get(key, lambda: "new")
+             for key in (("nft", 5), ("nft", 6), ("wallet", 100), ("wallet", 200), ("block", 1))}
+    assert fresh == {("nft", 5): "new", ("nft", 6): "old", ("wallet", 100): "new", ("wallet", 200): "new",
+                     ("block", 1): "old"}
+    assert state.nfts_of(100) == [6] and state.nfts_of(200) == [5]
+    store.close()
+
+
+def test_mempool_block_replay_and_merkle(xl_dir):
+    vm, cg = node()
+    store = vm.block_stores[CHAIN_STORE]
+    call(vm, cg, "bc_mempool_init", 3)
+    alice, alice_keys = wallet(vm, cg, 1)
+    assert mint(vm, cg, 1, alice, alice_keys) == 1
+    assert len(store) == 0 and vm.memory[cg.globals["mempool_count"]] == 2
+    # Третья транзакция запечатывает блок типа 5
+    assert mint(vm, cg, 2, alice, alice_keys) == 1
+    assert len(store) == 1 and vm.memory[cg.globals["mempool_count"]] == 0
+    block = store.get(1)
+    assert block.type == TX_BLOCK and block.payload[0] == 3
+    assert [tx.type for tx in transactions(block)] == [1, 2, 2]
+    assert mint(vm, cg, 3, alice, alice_keys) == 1
+    assert call(vm, cg, "bc_seal_block") == 1 and call(vm, cg, "bc_seal_block") == 0
+    assert len(store) == 2 and store.get(2).payload[0] == 1
+
+    state = WorldState(store)
+    assert state.wallets == {alice: 1} and sorted(state.nfts) == [1, 2, 3]
+    assert state.history[1] == [1] and state.history[3] == [2]
+    assert call(vm, cg, "bc_verify_full_integrity") == 1
+    vm.chain_writer.close()
+    records = json.loads(open("chain.json").read() + "\n]")
+    assert [block_record(store.get(i)) for i in (1, 2)] == records
+
+    # Подмена слова транзакции (ph/h не меняются) ловит только Merkle root
+    offset = store._offsets[0] + _LEN.size + _HEAD.size + 8 * (16 + TX_HEADER + 2)
+    with open(CHAIN_STORE, "r+b") as f:
+        f.seek(offset)
+        f.write((12345).to_bytes(8, "little"))
+    store._last = (None, None)
+    assert call(vm, cg, "bc_verify_full_integrity") == 0
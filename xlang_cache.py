@@ -0,0 +1,79 @@
+"""
+Кеш скомпилированного байт-кода (.xlc) для быстрого старта узла.
+
+Артефакт хранит code, string_pool, globals, func_addresses и
+next_string_addr. Ключ - хеши содержимого всех файлов, которые посетил
+load_program, версия компилятора (вместе с хешем исходников компилятора)
+и уровень оптимизации. Если хоть что-то не совпадает, артефакт считается
+устаревшим и программа компилируется заново.
+"""
+import os
+import json
+import hashlib
+
+from xlang_codegen import CodeGen
+
+COMPILER_VERSION = "xlang-1"
+
+# Модули, от которых зависит результат компиляции
+_COMPILER_MODULES = ("xlang_lexer.py", "xlang_parser.py", "xlang_codegen.py",
+                     "xlang_optimizer.py", "xlang_peephole.py", "xvm_superops.py")
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def compiler_fingerprint():
+    h = hashlib.sha256(COMPILER_VERSION.encode())
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in _COMPILER_MODULES:
+        h.update(_file_hash(os.path.join(base, name)).encode())
+    return h.hexdigest()
+
+
+def artifact_path(entry_file):
+    return os.path.splitext(entry_file)[0] + ".xlc"
+
+
+def load_artifact(entry_file, opt_level):
+    """Возвращает CodeGen из артефакта или None, если его нет или он устарел."""
+    path = artifact_path(entry_file)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            art = json.load(f)
+        if art["compiler"] != compiler_fingerprint() or art["opt_level"] != opt_level:
+            return None
+        for src, digest in art["sources"].items():
+            if _file_hash(src) != digest:
+                return None
+    except (OSError, ValueError, KeyError):
+        return None
+
+    cg = CodeGen()
+    cg.code = art["code"]
+    cg.string_pool = {int(addr): s for addr, s in art["string_pool"].items()}
+    cg.globals = art["globals"]
+    cg.func_addresses = art["func_addresses"]
+    cg.next_string_addr = art["next_string_addr"]
+    return cg
+
+
+def save_artifact(entry_file, cg, sources, opt_level):
+    """Сохраняет артефакт. sources - абсолютные пути файлов, которые посетил load_program."""
+    art = {
+        "compiler": compiler_fingerprint(),
+        "opt_level": opt_level,
+        "sources": {src: _file_hash(src) for src in sorted(sources)},
+        "code": cg.code,
+        "string_pool": {str(addr): s for addr, s in cg.string_pool.items()},
+        "globals": cg.globals,
+        "func_addresses": cg.func_addresses,
+        "next_string_addr": cg.next_string_addr,
+    }
+    path = artifact_path(entry_file)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(art, f)
+    os.replace(tmp, path)
@@ -1,16 +1,41 @@
 from xlang_parser import *
+from xlang_optimizer import inline_candidates, constant_params, fold_body
+
+# Системные вызовы: имя -> опкод (аргументы вычисляются слева направо)
+SYSCALLS = {
+    "prints": 45, "printi": 46, "fwrite": 50, "fappend": 51, "fappend_int": 53, "fread": 52,
+    "chain_append": 54, "chain_append_int": 55, "chain_commit": 56,  # Буферизованная запись блока
+    "block_append": 57, "block_count": 58, "block_get": 59, "block_reset": 64,  # Бинарное хранилище блоков
+    "verify_ckpt_load": 65, "verify_ckpt_save": 66,  # Контрольная точка верификации
+    "block_payload": 67,  # Ожидает: (name, i, ptr), копирует payload блока в ptr
+    "random": 60, "json_get_hash": 61,
+    "native_sha512": 62,  # Ожидает: (data_ptr, size)
+    "native_sha512_words": 80,  # Ожидает: (data_ptr, size), слова целиком (режим хеша 1)
+    "sha512_init": 81, "sha512_update": 82, "sha512_final": 83,  # Потоковый хеш: (mode), (h, ptr, size), (h)
+    "native_verify": 84,  # Ожидает: (key_ptr, msg_ptr, size, sig_ptr), подпись Ed25519
+    "native_keygen": 63,  # Не ожидает аргументов
+}
 
 
 class CodeGen:
-    def __init__(self):
+    def __init__(self, inline=False):
         self.code = [];
         self.globals = {};
         self.next_mem = 100
         self.locals = {};
         self.func_addresses = {};
         self.string_pool = {}
+        self.string_addrs = {}  # Обратный пул: строка -> адрес (одна копия на значение)
         self.next_string_addr = 100000;
         self.current_func = None
+        # Инлайнинг: подставляемые функции, слоты параметров текущей подстановки,
+        # адреса выходов (return) и цепочка подстановок для защиты от рекурсии
+        self.inline = inline
+        self.inlinable = {}
+        self.inline_params = {}
+        self.inline_exits = None
+        self.inline_chain = []
+        self.inline_stats = {"calls_removed": 0, "functions": set()}
 
     def emit(self, op, arg=0):
         self.code += [op, arg]
@@ -33,12 +58,13 @@ class CodeGen:
         self.emit(20, 0)
 
         # 3. Компиляция функций
+        if self.inline: self.inlinable = inline_candidates(funcs, SYSCALLS)
         for f in funcs:
             self.current_func = f;
             self.func_addresses[f.name] = len(self.code)
             self.locals = {p: i for i, p in enumerate(f.params)}
             for stmt in f.body: self.gen_stmt(stmt, calls_to_patch)
-            self.emit(22)  # RET
+            self.emit(22, len(f.params))  # RET (снимает аргументы со стека)
 
         # 4. Патчинг прыжка в main
         if "main" in self.func_addresses: self.patch(main_jmp + 1, self.func_addresses["main"])
@@ -56,6 +82,7 @@ class CodeGen:
         if isinstance(s, VarDecl):
             name = f"{self.current_func.name}_{s.name}" if self.current_func else s.name
             if name not in self.globals: self.globals[name] = self.next_mem; self.next_mem += 1
+            if s.value is None: return  # Только объявление (инициализация выброшена оптимизатором)
             self.gen_expr(s.value, calls_to_patch);
             self.emit(4, self.globals[name])
         elif isinstance(s, Assign):
@@ -63,6 +90,8 @@ class CodeGen:
             pre = f"{self.current_func.name}_{s.name}" if self.current_func else s.name
             if s.name in self.locals:
                 self.emit(6, self.locals[s.name])
+            elif s.name in self.inline_params:
+                self.emit(4, self.inline_params[s.name])
             else:
                 self.emit(4, self.globals.get(pre, self.globals.get(s.name)))
         elif isinstance(s, ArrayAssign):
@@ -102,7 +131,12 @@ class CodeGen:
             self.emit(20, start);
             self.patch(ex, len(self.code))
         elif isinstance(s, Return):
-            self.gen_expr(s.expr, calls_to_patch); self.emit(22)
+            self.gen_expr(s.expr, calls_to_patch)
+            if self.inline_exits is not None:
+                # return внутри подставленной функции - переход в конец подстановки
+                self.emit(20, 0); self.inline_exits.append(len(self.code) - 1)
+            else:
+                self.emit(22, len(self.current_func.params) if self.current_func else 0)
         else:
             self.gen_expr(s, calls_to_patch); self.emit(2)
 
@@ -110,16 +144,18 @@ class CodeGen:
         if isinstance(e, Number):
             self.emit(1, e.value)
         elif isinstance(e, StringLiteral):
-            if e.value not in self.string_pool:
-                addr = self.next_string_addr;
+            addr = self.string_addrs.get(e.value)
+            if addr is None:
+                addr = self.string_addrs[e.value] = self.next_string_addr;
                 self.string_pool[addr] = e.value;
                 self.next_string_addr += len(e.value) + 1
-            addr = [k for k, v in self.string_pool.items() if v == e.value][0];
             self.emit(1, addr)
         elif isinstance(e, Var):
             pre = f"{self.current_func.name}_{e.name}" if self.current_func else e.name
             if e.name in self.locals:
                 self.emit(5, self.locals[e.name])
+            elif e.name in self.inline_params:
+                self.emit(3, self.inline_params[e.name])
             else:
                 self.emit(3, self.globals.get(pre, self.globals.get(e.name)))
         elif isinstance(e, BinOp):
@@ -134,36 +170,52 @@ class CodeGen:
             self.gen_expr(Var(e.name), calls_to_patch); self.gen_expr(e.index, calls_to_patch); self.emit(42)
         elif isinstance(e, Call):
             # Системные вызовы
-            if e.name == "prints":
-                self.gen_expr(e.args[0], calls_to_patch); self.emit(45)
-            elif e.name == "printi":
-                self.gen_expr(e.args[0], calls_to_patch); self.emit(46)
-            elif e.name == "fwrite":
-                self.gen_expr(e.args[0], calls_to_patch); self.gen_expr(e.args[1], calls_to_patch); self.emit(50)
-            elif e.name == "fappend":
-                self.gen_expr(e.args[0], calls_to_patch); self.gen_expr(e.args[1], calls_to_patch); self.emit(51)
-            elif e.name == "fappend_int":
-                self.gen_expr(e.args[0], calls_to_patch); self.gen_expr(e.args[1], calls_to_patch); self.emit(53)
-            elif e.name == "fread":
-                self.gen_expr(e.args[0], calls_to_patch); self.emit(52)
-            elif e.name == "random":
-                self.emit(60)
-            elif e.name == "json_get_hash":
+            if e.name in SYSCALLS:
                 for arg in e.args: self.gen_expr(arg, calls_to_patch)
-                self.emit(61)
-            elif e.name == "native_sha512":
-                # Ожидает: (data_ptr, size)
-                self.gen_expr(e.args[0], calls_to_patch)
-                self.gen_expr(e.args[1], calls_to_patch)
-                self.emit(62)
-            elif e.name == "native_keygen":
-                # Не ожидает аргументов
-                self.emit(63)
-            # ... остальные проверки (prints, printi и т.д.) ...
+                self.emit(SYSCALLS[e.name])
+            elif (e.name in self.inlinable and e.name not in self.inline_chain
+                  and len(e.args) == len(self.inlinable[e.name].params)):
+                self.gen_inline(self.inlinable[e.name], e.args, calls_to_patch)
             else:
                 # Обычный вызов функции
                 for arg in reversed(e.args): self.gen_expr(arg, calls_to_patch)
                 self.emit(21, 0)  # Записываем 0 как заглушку
                 if calls_to_patch is not None:
                     # Запоминаем позицию (len-1, т.к. 0 - это последний байт) для патчинга
-                    calls_to_patch.append((len(self.code) - 1, e.name))
\ No newline at end of file
+                    calls_to_patch.append((len(self.code) - 1, e.name))
+
+    def gen_inline(self, f, args, calls_to_patch=None):
+        """
+        Подставляет тело функции f вместо CALL. Параметры становятся
+        собственными слотами памяти (f@param), параметры с литеральным
+        аргументом - константами; результат остается на стеке, как после RET.
+        """
+        consts = constant_params(f, args)
+        # Аргументы вычисляются в том же порядке, что и при CALL (с конца),
+        # и сохраняются в слоты только после вычисления всех аргументов
+        slots = {}
+        for p in f.params:
+            if p in consts: continue
+            slot = f"{f.name}@{p}"
+            if slot not in self.globals: self.globals[slot] = self.next_mem; self.next_mem += 1
+            slots[p] = self.globals[slot]
+        stored = [p for p in f.params if p in slots]
+        for p, arg in reversed(list(zip(f.params, args))):
+            if p in slots: self.gen_expr(arg, calls_to_patch)
+        for p in stored: self.emit(4, slots[p])
+
+        saved = (self.current_func, self.locals, self.inline_params, self.inline_exits)
+        self.current_func, self.locals, self.inline_params, self.inline_exits = f, {}, slots, []
+        self.inline_chain.append(f.name)
+        body = fold_body(f.body, consts)
+        for i, stmt in enumerate(body):
+            if i == len(body) - 1 and isinstance(stmt, Return):
+                self.gen_expr(stmt.expr, calls_to_patch)  # Последний return: переход не нужен
+            else:
+                self.gen_stmt(stmt, calls_to_patch)
+        for pos in self.inline_exits: self.patch(pos, len(self.code))
+        self.inline_chain.pop()
+        self.current_func, self.locals, self.inline_params, self.inline_exits = saved
+
+        self.inline_stats["calls_removed"] += 1
+        self.inline_stats["functions"].add(f.name)
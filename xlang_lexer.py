@@ -2,7 +2,7 @@ import re
 from collections import namedtuple
 
 Token = namedtuple("Token", ["type", "value", "line", "column"])
-KEYWORDS = {"var", "func", "if", "else", "while", "return", "new", "for", "import"}
+KEYWORDS = {"var", "func", "if", "else", "while", "return", "new", "for", "import", "inline", "noinline"}
 
 TOKEN_SPEC = [
     ("COMMENT", r"//.*"),
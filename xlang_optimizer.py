@@ -0,0 +1,231 @@
+"""
+AST-оптимизации xlang (между load_program и CodeGen.gen).
+
+- свертка константных подвыражений по семантике XVM (маска 64 бита и т.д.);
+- подстановка глобальных констант (var X = <константа>, которые нигде
+  не переприсваиваются), например WALLET_STRUCT_SIZE / NFT_STRUCT_SIZE;
+- удаление веток if/while/for с константным условием и кода после return.
+
+Литералы Int(...) парсер и так превращает в Number, поэтому отдельной
+инструкции для Int() в байт-коде нет.
+"""
+from xlang_parser import *
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+# Те же правила, что у опкодов 7-19, 32, 33 в XVM
+FOLD = {
+    "+": lambda a, b: (a + b) & MASK64, "-": lambda a, b: (a - b) & MASK64,
+    "*": lambda a, b: (a * b) & MASK64, "/": lambda a, b: a // b if b != 0 else 0,
+    "==": lambda a, b: 1 if a == b else 0, "!=": lambda a, b: 1 if a != b else 0,
+    "<": lambda a, b: 1 if a < b else 0, ">": lambda a, b: 1 if a > b else 0,
+    "&&": lambda a, b: 1 if a and b else 0, "||": lambda a, b: 1 if a or b else 0,
+    "&": lambda a, b: a & b, "|": lambda a, b: a | b, "^": lambda a, b: a ^ b,
+    ">>>": lambda a, b: (a & MASK64) >> (b % 64), "<<": lambda a, b: (a << (b % 64)) & MASK64,
+}
+
+
+def fold_expr(e, consts=None):
+    """Сворачивает выражение. consts - имя -> значение известных констант."""
+    consts = consts or {}
+    if isinstance(e, Var) and e.name in consts:
+        return Number(consts[e.name])
+    if isinstance(e, BinOp):
+        left, right = fold_expr(e.left, consts), fold_expr(e.right, consts)
+        if isinstance(left, Number) and isinstance(right, Number) and e.op in FOLD:
+            return Number(FOLD[e.op](left.value, right.value))
+        return BinOp(left, e.op, right)
+    if isinstance(e, Call):
+        return Call(e.name, [fold_expr(a, consts) for a in e.args])
+    if isinstance(e, ArrayAlloc):
+        return ArrayAlloc(fold_expr(e.size, consts))
+    if isinstance(e, ArrayAccess):
+        return ArrayAccess(e.name, fold_expr(e.index, consts))
+    return e
+
+
+def _declarations(stmts):
+    """Объявления переменных внутри выброшенного кода: слоты памяти сохраняются."""
+    out = []
+    for s in stmts:
+        if isinstance(s, VarDecl):
+            out.append(VarDecl(s.name, None))
+        elif isinstance(s, If):
+            out += _declarations(s.then_body) + _declarations(s.else_body)
+        elif isinstance(s, While):
+            out += _declarations(s.body)
+        elif isinstance(s, For):
+            out += _declarations([s.init] + s.body + [s.step])
+    return out
+
+
+def fold_body(stmts, consts=None):
+    """Сворачивает список операторов и выбрасывает недостижимые ветки."""
+    out = []
+    for i, s in enumerate(stmts):
+        out += fold_stmt(s, consts)
+        if isinstance(s, Return):
+            out += _declarations(stmts[i + 1:])
+            break
+    return out
+
+
+def fold_stmt(s, consts=None):
+    """Возвращает список операторов, заменяющих s."""
+    if isinstance(s, VarDecl):
+        return [VarDecl(s.name, None if s.value is None else fold_expr(s.value, consts))]
+    if isinstance(s, Assign):
+        return [Assign(s.name, fold_expr(s.expr, consts))]
+    if isinstance(s, ArrayAssign):
+        return [ArrayAssign(s.name, fold_expr(s.index, consts), fold_expr(s.value, consts))]
+    if isinstance(s, Return):
+        return [Return(fold_expr(s.expr, consts))]
+    if isinstance(s, If):
+        cond = fold_expr(s.cond, consts)
+        then_body, else_body = fold_body(s.then_body, consts), fold_body(s.else_body, consts)
+        if isinstance(cond, Number):
+            # JZ переходит на else, когда условие == 0
+            taken, dropped = (then_body, else_body) if cond.value != 0 else (else_body, then_body)
+            return taken + _declarations(dropped)
+        return [If(cond, then_body, else_body)]
+    if isinstance(s, While):
+        cond = fold_expr(s.cond, consts)
+        body = fold_body(s.body, consts)
+        if isinstance(cond, Number) and cond.value == 0:
+            return _declarations(body)
+        return [While(cond, body)]
+    if isinstance(s, For):
+        init = fold_stmt(s.init, consts)
+        cond = fold_expr(s.cond, consts)
+        body = fold_body(s.body, consts)
+        step = fold_stmt(s.step, consts)
+        if isinstance(cond, Number) and cond.value == 0:
+            return init + _declarations(body + step)
+        if len(init) != 1 or len(step) != 1:
+            return [For(s.init, cond, s.step, body)]
+        return [For(init[0], cond, step[0], body)]
+    return [fold_expr(s, consts)]
+
+
+def _assigned_names(stmts, acc):
+    for s in stmts:
+        if isinstance(s, Assign):
+            acc.add(s.name)
+        elif isinstance(s, If):
+            _assigned_names(s.then_body, acc); _assigned_names(s.else_body, acc)
+        elif isinstance(s, While):
+            _assigned_names(s.body, acc)
+        elif isinstance(s, For):
+            _assigned_names([s.init, s.step] + s.body, acc)
+    return acc
+
+
+def _declared_names(stmts):
+    return {d.name for d in _declarations(stmts)}
+
+
+def constant_globals(vars_, funcs):
+    """
+    Глобальные переменные с константным значением: объявлены один раз,
+    инициализированы константным выражением и нигде не присваиваются.
+    """
+    assigned = set()
+    for f in funcs:
+        _assigned_names(f.body, assigned)
+    counts = {}
+    for v in vars_:
+        counts[v.name] = counts.get(v.name, 0) + 1
+
+    consts = {}
+    for v in vars_:
+        value = fold_expr(v.value, consts)
+        if isinstance(value, Number) and counts[v.name] == 1 and v.name not in assigned:
+            consts[v.name] = value.value
+    return consts
+
+
+def optimize_ast(vars_, funcs):
+    """Свертка констант и удаление мертвого кода. Возвращает (vars_, funcs, консты)."""
+    consts = constant_globals(vars_, funcs)
+    new_vars = [VarDecl(v.name, fold_expr(v.value, consts)) for v in vars_]
+    new_funcs = []
+    for f in funcs:
+        # Параметры и локальные переменные функции перекрывают глобальные имена
+        shadowed = set(f.params) | _declared_names(f.body)
+        visible = {k: v for k, v in consts.items() if k not in shadowed}
+        new_funcs.append(Func(f.name, f.params, fold_body(f.body, visible), f.hint))
+    return new_vars, new_funcs, consts
+
+
+# --- Инлайнинг (решение принимается здесь, подстановку делает CodeGen) ---
+
+# Максимальный размер тела функции (узлы AST) для автоматического инлайнинга
+INLINE_MAX_NODES = 60
+
+
+def ast_size(node):
+    """Число узлов AST."""
+    if isinstance(node, list):
+        return sum(ast_size(n) for n in node)
+    if not hasattr(node, "__dataclass_fields__"):
+        return 0
+    return 1 + sum(ast_size(getattr(node, f)) for f in node.__dataclass_fields__)
+
+
+def called_functions(node, syscalls, acc=None):
+    """Имена пользовательских функций, вызываемых в узле (без системных вызовов)."""
+    acc = set() if acc is None else acc
+    if isinstance(node, list):
+        for n in node: called_functions(n, syscalls, acc)
+    elif hasattr(node, "__dataclass_fields__"):
+        if isinstance(node, Call) and node.name not in syscalls:
+            acc.add(node.name)
+        for f in node.__dataclass_fields__:
+            called_functions(getattr(node, f), syscalls, acc)
+    return acc
+
+
+def inline_candidates(funcs, syscalls, max_nodes=INLINE_MAX_NODES):
+    """
+    Функции, которые можно подставлять в место вызова: тело заканчивается
+    return (нет "падения" с конца функции), вызывают только другие
+    подставляемые функции (без рекурсии), размер с учетом вложенных
+    подстановок не больше max_nodes. inline снимает ограничение размера,
+    noinline запрещает подстановку.
+    """
+    by_name = {f.name: f for f in funcs}
+    sizes = {}
+    changed = True
+    while changed:
+        changed = False
+        for f in by_name.values():
+            if f.name in sizes or f.hint == "noinline" or not f.body or not isinstance(f.body[-1], Return):
+                continue
+            callees = called_functions(f.body, syscalls)
+            if not callees <= set(sizes):
+                continue
+            size = ast_size(f.body) + sum(sizes[c] for c in callees)
+            if size <= max_nodes or f.hint == "inline":
+                sizes[f.name] = size
+                changed = True
+    return {name: by_name[name] for name in sizes}
+
+
+def constant_params(f, args):
+    """
+    Параметры, для которых в месте вызова передан литерал и которые можно
+    подставить как константу: функция их не меняет и не индексирует.
+    """
+    fixed = _assigned_names(f.body, set()) | _declared_names(f.body) | _array_names(f.body, set())
+    return {p: a.value for p, a in zip(f.params, args) if isinstance(a, Number) and p not in fixed}
+
+
+def _array_names(node, acc):
+    if isinstance(node, list):
+        for n in node: _array_names(n, acc)
+    elif hasattr(node, "__dataclass_fields__"):
+        if isinstance(node, (ArrayAccess, ArrayAssign)):
+            acc.add(node.name)
+        for f in node.__dataclass_fields__:
+            _array_names(getattr(node, f), acc)
+    return acc
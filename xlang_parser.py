@@ -6,7 +6,7 @@ class VarDecl: name: str; value: any
 
 
 @dataclass
-class Func: name: str; params: list; body: list
+class Func: name: str; params: list; body: list; hint: str = None  # "inline" / "noinline"
 
 
 @dataclass
@@ -107,6 +107,12 @@ class Parser:
                 vars_.append(self.parse_var_decl())
             elif t.type == "FUNC":
                 funcs.append(self.parse_func())
+            elif t.type in ("INLINE", "NOINLINE"):
+                # Подсказка для инлайнинга: inline func f(...) / noinline func f(...)
+                hint = self.eat().value
+                f = self.parse_func()
+                f.hint = hint
+                funcs.append(f)
             else:
                 self.eat()
         return imports, vars_, funcs
@@ -0,0 +1,115 @@
+"""
+Peephole-оптимизатор байт-кода xlang.
+
+Запускается после CodeGen.gen (когда вызовы уже слинкованы): сливает частые
+последовательности в суперинструкции XVM (см. xvm_superops), убирает пары
+PUSH/POP и цепочки переходов. Все адреса (переходы, CALL, func_addresses)
+пересчитываются по карте "старый pc -> новый pc".
+"""
+from xvm_superops import (LLOAD_OPC, LOAD_OPC, CMPC_JZ, LOAD_HLOADC, LLOAD_HLOADC, LOAD2_HLOAD,
+                          BINARY_OPS, COMPARE_OPS, instructions)
+
+PUSH, POP, LOAD, LLOAD, JMP, JZ, CALL, HLOAD = 1, 2, 3, 5, 20, 30, 21, 42
+# Инструкции, аргумент которых - адрес в коде
+ADDR_OPS = {JMP, JZ, CALL}
+
+
+def _thread(code, target):
+    """Следует по цепочке безусловных переходов JMP -> JMP -> ..."""
+    seen = set()
+    while 0 <= target < len(code) - 1 and code[target] == JMP and target not in seen:
+        seen.add(target)
+        target = code[target + 1]
+    return target
+
+
+def _fuse(ins, i, targets):
+    """
+    Пытается слить инструкции начиная с ins[i].
+    Возвращает (новые слова или None если удаляются, сколько инструкций поглощено)
+    или None, если шаблон не подошел.
+    """
+    def at(k):
+        return ins[i + k] if i + k < len(ins) else (None, None, None)
+
+    def free(n):
+        # Внутрь сливаемой последовательности не должно быть переходов
+        return all(i + k < len(ins) and ins[i + k][0] not in targets for k in range(1, n))
+
+    (_, op0, a0), (_, op1, a1), (_, op2, a2), (_, op3, a3) = at(0), at(1), at(2), at(3)
+
+    # PUSH/LOAD/LLOAD + POP: значение сразу выбрасывается
+    if op0 in (PUSH, LOAD, LLOAD) and op1 == POP and free(2):
+        return [], 2
+    # JMP на следующую инструкцию
+    if op0 == JMP and a0 == ins[i][0] + 2:
+        return [], 1
+    # PUSH c; cmp; JZ t
+    if op0 == PUSH and op1 in COMPARE_OPS and op2 == JZ and free(3):
+        return [CMPC_JZ, a0, op1, a2], 3
+    if op0 in (LOAD, LLOAD):
+        # Не мешаем слиянию PUSH c; cmp; JZ, которое начинается со следующей инструкции
+        if op1 == PUSH and op2 in COMPARE_OPS and op3 == JZ:
+            return None
+        if op1 == PUSH and op2 == HLOAD and free(3):
+            return [LOAD_HLOADC if op0 == LOAD else LLOAD_HLOADC, a0, 0, a1], 3
+        if op0 == LOAD and op1 == LOAD and op2 == HLOAD and free(3):
+            return [LOAD2_HLOAD, a0, 0, a1], 3
+        if op1 == PUSH and op2 in BINARY_OPS and free(3):
+            return [LOAD_OPC if op0 == LOAD else LLOAD_OPC, a0, op2, a1], 3
+    return None
+
+
+def optimize(cg):
+    """
+    Оптимизирует cg.code на месте и обновляет cg.func_addresses.
+    Возвращает статистику {"size_before", "size_after", "fused", "removed"}.
+    """
+    code = cg.code
+    ins = list(instructions(code))
+    targets = set(cg.func_addresses.values())
+    for pc, op, arg in ins:
+        if op in ADDR_OPS:
+            targets.add(arg)
+
+    # 1. Сокращение цепочек переходов
+    for k, (pc, op, arg) in enumerate(ins):
+        if op in (JMP, JZ):
+            ins[k] = (pc, op, _thread(code, arg))
+    targets |= {arg for _, op, arg in ins if op in (JMP, JZ)}
+
+    # 2. Слияние и удаление
+    out, addr_map, patches = [], {}, []
+    stats = {"size_before": len(code), "fused": 0, "removed": 0}
+    i = 0
+    while i < len(ins):
+        pc, op, arg = ins[i]
+        fused = _fuse(ins, i, targets)
+        for k in range(fused[1] if fused else 1):
+            addr_map[ins[i + k][0]] = len(out)
+        if fused is None:
+            if op in ADDR_OPS:
+                patches.append(len(out) + 1)
+            out += [op, arg]
+            i += 1
+            continue
+        words, n = fused
+        if words:
+            if words[0] == CMPC_JZ:
+                patches.append(len(out) + 3)
+            out += words
+            stats["fused"] += 1
+        else:
+            stats["removed"] += n
+        i += n
+    addr_map[len(code)] = len(out)
+
+    # 3. Пересчет адресов
+    for pos in patches:
+        out[pos] = addr_map.get(out[pos], out[pos])
+    for name, addr in cg.func_addresses.items():
+        cg.func_addresses[name] = addr_map.get(addr, addr)
+
+    cg.code[:] = out
+    stats["size_after"] = len(out)
+    return stats
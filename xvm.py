@@ -1,20 +1,158 @@
 import sys
 import re
 import random
+import hashlib
 import crypto  # <--- Добавляем модуль криптографии
+from array import array
+from contextlib import contextmanager
+import xvm_jit
+from xvm_chainwriter import ChainWriter
+from xvm_blockstore import BlockStore, Block
+from xvm_sig import SignatureVerifier
+from xvm_superops import SUPER_OPS, instructions, expand
+from xvm_memory import (DEFAULT_BACKEND, BACKENDS, MEMORY_WORDS, HEAP_WORDS, HEAP_INITIAL, HEAP_SLACK,
+                        words, code_words, grow, store, clear)
+
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+# Движки исполнения: "table" - таблица обработчиков (быстрый),
+# "reference" - исходный интерпретатор на if/elif (эталон для отладки)
+ENGINES = ("table", "reference")
+# pc-маркер останова табличного движка (self.pc уже выставлен обработчиком)
+HALT = -2
+# Сколько входов в функцию до ее JIT-компиляции (0 - компилировать сразу)
+JIT_THRESHOLD = 50
+# Кеш строк кучи: разобранные документы json_get_hash и короткие строки
+# (ключи полей, имена файлов), которые системные вызовы читают постоянно
+DOC_CACHE_SIZE = 2
+STR_CACHE_SIZE = 256
+STR_CACHE_MAX_LEN = 256
+# Пары "ключ": "число" - ровно то, что находил прежний поиск json_get_hash
+_JSON_HASH_FIELD = re.compile(r'"([^"]+)":\s*"(-?\d+)"')
+
+
+# Бинарные операции (a - второй сверху, b - вершина стека)
+BINOPS = {
+    10: lambda a, b: (a + b) & MASK64, 11: lambda a, b: (a - b) & MASK64,
+    12: lambda a, b: (a * b) & MASK64, 13: lambda a, b: a // b if b != 0 else 0,
+    14: lambda a, b: 1 if a == b else 0, 15: lambda a, b: 1 if a != b else 0,
+    16: lambda a, b: 1 if a < b else 0, 17: lambda a, b: 1 if a > b else 0,
+    18: lambda a, b: 1 if a and b else 0, 19: lambda a, b: 1 if a or b else 0,
+    7: lambda a, b: a & b, 8: lambda a, b: a | b, 9: lambda a, b: a ^ b,
+    32: lambda a, b: (a & MASK64) >> (b % 64), 33: lambda a, b: (a << (b % 64)) & MASK64,
+}
+
+# Системные вызовы: опкод -> метод XVM
+SYSCALLS = {
+    45: "_sys_prints", 46: "_sys_printi", 50: "_sys_fwrite", 51: "_sys_fappend",
+    52: "_sys_fread", 53: "_sys_fappend_int",
+    54: "_sys_chain_append", 55: "_sys_chain_append_int", 56: "_sys_chain_commit",
+    57: "_sys_block_append", 58: "_sys_block_count", 59: "_sys_block_get",
+    60: "_sys_random", 61: "_sys_json_get_hash", 62: "_sys_sha512", 63: "_sys_keygen",
+    64: "_sys_block_reset", 65: "_sys_verify_ckpt_load", 66: "_sys_verify_ckpt_save",
+    67: "_sys_block_payload",
+    # 70-76 заняты суперинструкциями (xvm_superops)
+    80: "_sys_sha512_words", 81: "_sys_sha512_init", 82: "_sys_sha512_update", 83: "_sys_sha512_final",
+    84: "_sys_verify",
+}
 
 
 class XVM:
-    def __init__(self, code):
-        self.code = code
-        self.memory = [0] * 5000
-        self.heap = [0] * 500000
+    def __init__(self, code, engine="table", functions=None, jit=False, jit_threshold=JIT_THRESHOLD,
+                 backend=DEFAULT_BACKEND, chain_writer=None, verifier=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown XVM engine: {engine}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown XVM memory backend: {backend}")
+        self.engine = engine
+        # Хранилище слов: "array" (array('Q'), растет) или "list" (для отладки), см. xvm_memory
+        self.backend = backend
+        # JIT работает поверх табличного движка и нуждается в границах функций
+        self.functions = functions or {}
+        self.jit = jit and engine == "table"
+        self.jit_threshold = jit_threshold
+        self.jit_compiled = {}  # адрес функции -> число скомпилированных блоков
+        self.code = code_words(code, backend)
+        self.memory = words(MEMORY_WORDS, backend)
+        self.heap = words(HEAP_INITIAL if backend == "array" else HEAP_WORDS, backend)
         self.stack = []
         self.call_stack = []
+        # Буферизованная запись блоков (системные вызовы 54-56)
+        self.chain_writer = chain_writer or ChainWriter()
+        self.block_stores = {}  # имя файла -> BlockStore (системные вызовы 57-59)
+        self._batch_files = set()  # файлы цепочки с блоками, отложенными в batch()
+        # Кеш строк кучи: (вид, адрес) -> (адрес терминатора, значение).
+        # cache_span - [min, max] адресов всех записей для дешевой проверки в HSTORE
+        self.heap_cache = {}
+        self.cache_span = [1, 0]
+        # Потоковые хеши sha512_init/update/final: дескриптор -> (hashlib, режим)
+        self.hashers = {}
+        self._next_hasher = 1
+        # Проверка подписей Ed25519 (системный вызов 84), кеши ключей и проверенных подписей
+        self.verifier = verifier or SignatureVerifier()
+        # Арены запросов: куча выше arena_base освобождается в конце запроса,
+        # кроме постоянных выделений (ключи кошельков) ниже _pinned
+        self.arena_base = None
+        self._pinned = 0
+        self.heap_high_water = 0
+        self.arena_stats = {"arenas": 0, "reclaimed": 0, "peak": 0}
         self.hp = 200000
         self.pc = 0
         self.fp = 0
         self.running = True
+        self.steps = 0  # Счетчик шагов эталонного движка
+        # Декодированная программа табличного движка (обработчик по адресу pc)
+        self._prog = None
+        self._prog_bound = None
+
+    @property
+    def hp(self):
+        return self._hp
+
+    @hp.setter
+    def hp(self, value):
+        # Куча array-бэкенда растет вслед за указателем выделения
+        self._hp = value
+        if value > self.heap_high_water: self.heap_high_water = value
+        if value + HEAP_SLACK > len(self.heap) and self.backend == "array":
+            grow(self.heap, value + HEAP_SLACK)
+
+    @contextmanager
+    def arena(self):
+        """
+        Временная область кучи для одного запроса: все, что выделено внутри
+        (new, fread, sha512), освобождается и обнуляется на выходе. Вложенные
+        арены сливаются с внешней.
+        """
+        if self.arena_base is not None:
+            yield
+            return
+        self.arena_base = self.hp
+        try:
+            yield
+        finally:
+            base = max(self.arena_base, self._pinned)
+            used = self.hp - self.arena_base
+            clear(self.heap, base, self.hp)
+            self._cache_invalidate(base, self.hp)
+            stats = self.arena_stats
+            stats["arenas"] += 1
+            stats["reclaimed"] += self.hp - base
+            if used > stats["peak"]: stats["peak"] = used
+            self.arena_base = None
+            self.hp = base
+
+    def alloc_persistent(self, size):
+        """Выделение, которое переживает текущую арену (например, ключи кошелька)."""
+        ptr = self.hp
+        self.hp += size
+        if self.arena_base is not None: self._pinned = self.hp
+        return ptr
+
+    def heap_stats(self):
+        return {"hp": self.hp, "high_water": self.heap_high_water, "capacity": len(self.heap),
+                "persistent": self.hp if self.arena_base is None else self.arena_base, **self.arena_stats}
 
     def _mask64(self, v):
         return v & 0xFFFFFFFFFFFFFFFF
@@ -33,16 +171,23 @@ class XVM:
 
     def load_strings(self, smap):
         for addr, s in smap.items():
-            for i, c in enumerate(s): self.heap[addr + i] = ord(c)
-            self.heap[addr + len(s)] = 0
+            for i, c in enumerate(s): store(self.heap, addr + i, ord(c))
+            store(self.heap, addr + len(s), 0)
 
     def _read_str(self, addr):
-        res = ""
-        addr = int(addr)
-        while addr < len(self.heap) and self.heap[addr] != 0:
-            res += chr(int(self.heap[addr]))
-            addr += 1
-        return res
+        # Читаем кусками растущего размера и ищем терминатор на уровне C (index)
+        heap, addr = self.heap, int(addr)
+        parts, size = [], 64
+        while addr < len(heap):
+            chunk = heap[addr:addr + size]
+            try:
+                parts.append("".join(map(chr, chunk[:chunk.index(0)])))
+                break
+            except ValueError:
+                parts.append("".join(map(chr, chunk)))
+            addr += size
+            size *= 2
+        return "".join(parts)
 
     def step(self):
         if self.pc >= len(self.code) or self.pc < 0:
@@ -51,7 +196,17 @@ class XVM:
         op = self.code[self.pc]
         arg = self.code[self.pc + 1]
         self.pc += 2
+        self.steps += 1
 
+        if op in SUPER_OPS:
+            # Суперинструкция: исполняем исходную последовательность
+            x, y = self.code[self.pc], self.code[self.pc + 1]
+            self.pc += 2
+            for o, a in expand(op, arg, x, y): self._execute(o, a)
+        else:
+            self._execute(op, arg)
+
+    def _execute(self, op, arg):
         # --- Базовые операции ---
         if op == 1:
             self.stack.append(arg)
@@ -60,7 +215,10 @@ class XVM:
         elif op == 3:
             self.stack.append(self.memory[arg])
         elif op == 4:
-            if self.stack: self.memory[arg] = self.stack.pop()
+            if self.stack:
+                v = self.stack.pop()
+                try: self.memory[arg] = v
+                except (IndexError, OverflowError): store(self.memory, arg, v)
         elif op == 5:
             idx = self.fp - arg - 1
             self.stack.append(self.stack[idx] if 0 <= idx < len(self.stack) else 0)
@@ -124,13 +282,14 @@ class XVM:
             self.call_stack.append((self.pc, self.fp))
             self.fp = len(self.stack)
             self.pc = arg
-        elif op == 22:  # RET
+        elif op == 22:  # RET (arg - число параметров функции)
             val = self.stack.pop() if len(self.stack) > 0 else 0
             if not self.call_stack:
                 self.running = False
             else:
                 ret_pc, prev_fp = self.call_stack.pop()
-                while len(self.stack) > prev_fp: self.stack.pop()  # Чистим кадр
+                # Чистим кадр вместе с аргументами; временные значения вызывающего остаются
+                while len(self.stack) > self.fp - arg: self.stack.pop()
                 self.pc, self.fp = ret_pc, prev_fp
                 self.stack.append(val)
                 if self.pc == -1: self.running = False
@@ -145,108 +304,564 @@ class XVM:
             self.stack.append(self.heap[int(base + idx)])
         elif op == 43:
             v, i, b = self.stack.pop(), self.stack.pop(), self.stack.pop();
-            self.heap[int(b + i)] = v
-        elif op == 45:
-            print(self._read_str(self.stack.pop()), flush=True);
-            self.stack.append(0)
-        elif op == 46:
-            print(f"0x{self.stack.pop():016x}", flush=True);
+            try: self.heap[int(b + i)] = v
+            except (IndexError, OverflowError): store(self.heap, int(b + i), v)
+            span = self.cache_span
+            if span[0] <= b + i <= span[1]: self._cache_invalidate(int(b + i), int(b + i) + 1)
+        elif op in SYSCALLS:
+            getattr(self, SYSCALLS[op])()
+
+    # --- Системные вызовы (общие для обоих движков) ---
+
+    def _sys_prints(self):
+        print(self._read_str(self.stack.pop()), flush=True)
+        self.stack.append(0)
+
+    def _sys_printi(self):
+        print(f"0x{self.stack.pop():016x}", flush=True)
+        self.stack.append(0)
+
+    def _sys_fwrite(self):
+        d, n = self._heap_str(self.stack.pop()), self._heap_str(self.stack.pop())
+        self.chain_writer.release(n)
+        open(n, "w", encoding="utf-8").write(d)
+        self.stack.append(1)
+
+    def _sys_fappend(self):
+        d, n = self._heap_str(self.stack.pop()), self._heap_str(self.stack.pop())
+        self.chain_writer.release(n)
+        open(n, "a", encoding="utf-8").write(d)
+        self.stack.append(1)
+
+    def _sys_fread(self):
+        try:
+            name = self._heap_str(self.stack.pop())
+            self.chain_writer.release(name)
+            with open(name, "r", encoding="utf-8") as f:
+                content = f.read()
+            addr = self.hp
+            self.hp += len(content) + 1
+            # Коды символов одним срезом (utf-32 дает их как массив 32-битных слов)
+            codes = array("I", content.encode("utf-32-le"))
+            self.heap[addr:addr + len(content)] = array("Q", codes) if self.backend == "array" else codes.tolist()
+            self.heap[addr + len(content)] = 0
+            self._cache_invalidate(addr, addr + len(content) + 1)
+            self.stack.append(addr)
+        except:
             self.stack.append(0)
-        elif op == 50:
-            d, n = self._read_str(self.stack.pop()), self._read_str(self.stack.pop());
-            open(n, "w",
-                 encoding="utf-8").write(
-                d);
-            self.stack.append(1)
-        elif op == 51:
-            d, n = self._read_str(self.stack.pop()), self._read_str(self.stack.pop());
-            open(n, "a",
-                 encoding="utf-8").write(
-                d);
-            self.stack.append(1)
-        elif op == 52:
-            try:
-                name = self._read_str(self.stack.pop())
-                with open(name, "r", encoding="utf-8") as f:
-                    content = f.read()
-                addr = self.hp
-                for i, c in enumerate(content): self.heap[addr + i] = ord(c)
-                self.heap[addr + len(content)] = 0;
-                self.hp += len(content) + 1;
-                self.stack.append(addr)
-            except:
-                self.stack.append(0)
-        elif op == 53:
-            v, n = self.stack.pop(), self._read_str(self.stack.pop());
-            open(n, "a", encoding="utf-8").write(
-                str(int(v)));
-            self.stack.append(1)
-
-        # --- НОВЫЙ ОПКОД: RANDOM (Генерация ключей внутри VM) ---
-        elif op == 60:
-            # Генерируем случайное 63-битное число (чтобы не было проблем со знаком)
-            self.stack.append(random.getrandbits(63))
-
-        elif op == 61:
-            k_a, i_v, j_a = self.stack.pop(), self.stack.pop(), self.stack.pop()
-            key, json_str, idx = self._read_str(k_a), self._read_str(j_a), int(i_v) - 1
-            blocks = json_str.split("  {")
-            if 1 <= idx + 1 < len(blocks):
-                match = re.search(fr'"{key}":\s*"(-?\d+)"', blocks[idx + 1])
-                self.stack.append(int(match.group(1)) if match else 0)
+
+    def _sys_fappend_int(self):
+        v, n = self.stack.pop(), self._heap_str(self.stack.pop())
+        self.chain_writer.release(n)
+        open(n, "a", encoding="utf-8").write(str(int(v)))
+        self.stack.append(1)
+
+    # --- Буферизованная запись блока (см. xvm_chainwriter) ---
+    def _sys_chain_append(self):
+        d, n = self._heap_str(self.stack.pop()), self._heap_str(self.stack.pop())
+        self.chain_writer.append(n, d)
+        self.stack.append(1)
+
+    def _sys_chain_append_int(self):
+        v, n = self.stack.pop(), self._heap_str(self.stack.pop())
+        self.chain_writer.append(n, str(int(v)))
+        self.stack.append(1)
+
+    def _sys_chain_commit(self):
+        name = self._heap_str(self.stack.pop())
+        end = self.chain_writer.commit(name)
+        if end is None:  # пакет: вершина пишется после сброса буфера (см. batch)
+            self._batch_files.add(name)
+        else:
+            self._save_tips(end)
+        self.stack.append(1)
+
+    def _save_tips(self, end):
+        # Блок записан в оба файла - обновляем вершину хранилища
+        for store in self.block_stores.values():
+            if store.dirty: store.save_tip(end)
+
+    @contextmanager
+    def batch(self):
+        """
+        Несколько команд подряд с одной записью chain.json и одним fsync
+        (ChainWriter.batch); вершина хранилища обновляется один раз в конце.
+        """
+        try:
+            with self.chain_writer.batch():
+                yield
+        finally:
+            for name in self._batch_files:
+                self._save_tips(self.chain_writer.end(name))
+            self._batch_files.clear()
+
+    # --- Бинарное хранилище блоков (см. xvm_blockstore) ---
+    def block_store(self, name):
+        store = self.block_stores.get(name)
+        if store is None:
+            store = self.block_stores[name] = BlockStore(name)
+            self.chain_writer.attach(*store.files())
+        return store
+
+    def _sys_block_append(self):
+        # Стек: [name, index, type, data_ptr, size, prev_ptr, hash_ptr, flags]
+        flags, h, ph, size, ptr, t, idx = (self.stack.pop() for _ in range(7))
+        heap = self.heap
+        self.block_store(self._heap_str(self.stack.pop())).append(Block(
+            idx, t, flags, tuple(heap[ph:ph + 8]), tuple(heap[h:h + 8]), tuple(heap[ptr:ptr + size])))
+        self.stack.append(1)
+
+    def _sys_block_reset(self):
+        self.block_store(self._heap_str(self.stack.pop())).reset()
+        self.stack.append(1)
+
+    def _sys_block_count(self):
+        self.stack.append(len(self.block_store(self._heap_str(self.stack.pop()))))
+
+    def _sys_block_get(self):
+        # Стек: [name, i, key] -> слово поля (0, если блока нет)
+        key, i = self._heap_str(self.stack.pop()), self.stack.pop()
+        self.stack.append(self.block_store(self._heap_str(self.stack.pop())).field(int(i), key))
+
+    def _sys_block_payload(self):
+        # Стек: [name, i, ptr] -> число слов payload, скопированных в ptr (0, если блока нет)
+        ptr, i = self.stack.pop(), self.stack.pop()
+        block = self.block_store(self._heap_str(self.stack.pop())).get(int(i))
+        words = block.payload if block is not None else ()
+        if words:
+            end = ptr + len(words)
+            if end > len(self.heap): grow(self.heap, end)
+            self.heap[ptr:end] = array("Q", words) if isinstance(self.heap, array) else list(words)
+            self._cache_invalidate(ptr, end)
+        self.stack.append(len(words))
+
+    def _sys_verify_ckpt_load(self):
+        # Стек: [name, hash_ptr] -> индекс проверенного блока (0 - точки нет), хеш в hash_ptr
+        ptr = self.stack.pop()
+        ckpt = self.block_store(self._heap_str(self.stack.pop())).load_checkpoint()
+        index, words = ckpt if ckpt else (0, (0,) * 8)
+        for k, w in enumerate(words): self.heap[ptr + k] = w
+        self._cache_invalidate(ptr, ptr + 8)
+        self.stack.append(index)
+
+    def _sys_verify_ckpt_save(self):
+        # Стек: [name, index, hash_ptr]
+        ptr, index = self.stack.pop(), self.stack.pop()
+        self.block_store(self._heap_str(self.stack.pop())).save_checkpoint(int(index), self.heap[ptr:ptr + 8])
+        self.stack.append(1)
+
+    # --- RANDOM (Генерация ключей внутри VM) ---
+    def _sys_random(self):
+        # Генерируем случайное 63-битное число (чтобы не было проблем со знаком)
+        self.stack.append(random.getrandbits(63))
+
+    def _sys_json_get_hash(self):
+        k_a, i_v, j_a = self.stack.pop(), self.stack.pop(), self.stack.pop()
+        key, i = self._heap_str(k_a), int(i_v)
+        nblocks, columns = self._parsed_doc(int(j_a))
+        column = columns.get(key)
+        self.stack.append(column[i] if column is not None and 1 <= i < nblocks else 0)
+
+    def _parsed_doc(self, addr):
+        """
+        Документ по адресу addr: блоки как в split("  {") и таблица
+        ключ -> значения по номеру блока. Разбирается один раз, дальше
+        json_get_hash - это поиск в словаре и индекс в списке.
+        """
+        entry = self.heap_cache.get(("doc", addr))
+        if entry is not None:
+            return entry[1]
+        text = self._read_str(addr)
+        parts = text.split("  {")
+        columns = {}
+        for n, part in enumerate(parts):
+            seen = set()
+            for k, v in _JSON_HASH_FIELD.findall(part):
+                if k in seen:  # Как re.search: берется первое вхождение ключа
+                    continue
+                seen.add(k)
+                column = columns.get(k)
+                if column is None:
+                    column = columns[k] = [0] * len(parts)
+                column[n] = int(v)
+        docs = [key for key in self.heap_cache if key[0] == "doc"]
+        if len(docs) >= DOC_CACHE_SIZE:
+            del self.heap_cache[docs[0]]
+        self._cache_put(("doc", addr), addr + len(text), (len(parts), columns))
+        return len(parts), columns
+
+    def _heap_str(self, addr):
+        """_read_str с кешем для коротких строк (ключи полей, имена файлов)."""
+        addr = int(addr)
+        entry = self.heap_cache.get(("str", addr))
+        if entry is not None:
+            return entry[1]
+        text = self._read_str(addr)
+        if len(text) <= STR_CACHE_MAX_LEN:
+            if len(self.heap_cache) >= STR_CACHE_SIZE:
+                self._cache_invalidate(0, len(self.heap))
+            self._cache_put(("str", addr), addr + len(text), text)
+        return text
+
+    def _cache_put(self, key, term, value):
+        self.heap_cache[key] = (term, value)
+        span = self.cache_span
+        if span[0] > span[1]:
+            span[:] = [key[1], term]
+        else:
+            span[:] = [min(span[0], key[1]), max(span[1], term)]
+
+    def _cache_invalidate(self, start, end):
+        """Убирает из кеша строки, пересекающиеся с [start, end) (терминатор включительно)."""
+        span = self.cache_span
+        if end <= span[0] or start > span[1]:
+            return
+        cache = self.heap_cache
+        for key in [k for k, (term, _) in cache.items() if k[1] < end and start <= term]:
+            del cache[key]
+        if cache:
+            span[:] = [min(k[1] for k in cache), max(term for term, _ in cache.values())]
+        else:
+            span[:] = [1, 0]
+
+    # --- НАТИВНАЯ КРИПТОГРАФИЯ ---
+    def _push_digest(self, digest):
+        # Результат (8 слов) выделяется в куче, на стек - указатель
+        res_ptr = self.hp
+        self.hp += 8
+        if self.hp > len(self.heap): grow(self.heap, self.hp)
+        words = crypto.digest_words(digest)
+        self.heap[res_ptr:res_ptr + 8] = array("Q", words) if isinstance(self.heap, array) else list(words)
+        self._cache_invalidate(res_ptr, res_ptr + 8)
+        self.stack.append(res_ptr)
+
+    def _sys_sha512(self):
+        # Стек: [ptr_data, size] -> [ptr_hash_result]
+        # Режим v0: 1 слово памяти = 1 байт данных (младший байт, упрощенная модель)
+        size = self.stack.pop()
+        ptr = self.stack.pop()
+        self._push_digest(hashlib.sha512(crypto.pack_words(self.heap[ptr:ptr + size])).digest())
+
+    def _sys_sha512_words(self):
+        # Стек: [ptr_data, size] -> [ptr_hash_result]; режим v1: слова целиком, big-endian
+        size = self.stack.pop()
+        ptr = self.stack.pop()
+        self._push_digest(hashlib.sha512(crypto.pack_words(self.heap[ptr:ptr + size], crypto.HASH_WORDS)).digest())
+
+    def _sys_sha512_init(self):
+        # Стек: [mode] -> [дескриптор потокового хеша]
+        mode = self.stack.pop()
+        if mode not in crypto.HASH_MODES:
+            raise RuntimeError(f"Unknown hash mode: {mode}")
+        handle = self._next_hasher
+        self._next_hasher += 1
+        self.hashers[handle] = (hashlib.sha512(), mode)
+        self.stack.append(handle)
+
+    def _sys_sha512_update(self):
+        # Стек: [handle, ptr_data, size] -> [1]; данные хешируются прямо из кучи
+        size, ptr, handle = self.stack.pop(), self.stack.pop(), self.stack.pop()
+        hasher, mode = self.hashers[handle]
+        hasher.update(crypto.pack_words(self.heap[ptr:ptr + size], mode))
+        self.stack.append(1)
+
+    def _sys_sha512_final(self):
+        # Стек: [handle] -> [ptr_hash_result]; дескриптор освобождается
+        hasher, _ = self.hashers.pop(self.stack.pop())
+        self._push_digest(hasher.digest())
+
+    def _sys_verify(self):
+        # Стек: [key_ptr, msg_ptr, size, sig_ptr] -> [1 - подпись верна, 0 - нет]
+        sig, size, msg, key = self.stack.pop(), self.stack.pop(), self.stack.pop(), self.stack.pop()
+        heap = self.heap
+        ok = self.verifier.verify(heap[key:key + 4], heap[msg:msg + size], heap[sig:sig + 8])
+        self.stack.append(1 if ok else 0)
+
+    def _sys_keygen(self):
+        # Стек: [] -> [ptr_to_keys_array]
+        pub_words, priv_words = crypto.generate_ed25519_keys()
+
+        # Ключи живут в куче запроса (в арене - до ее конца); ID кошелька -
+        # первое слово публичного ключа, он не зависит от указателя кучи
+        pub_ptr = self.hp
+        self.hp += len(pub_words) + len(priv_words) + 3
+
+        # 1. Сохраняем Public Key (4 слова) в кучу
+        for i, w in enumerate(pub_words): self.heap[pub_ptr + i] = w
+
+        # 2. Сохраняем Private Key (4 слова) в кучу
+        priv_ptr = pub_ptr + len(pub_words)
+        for i, w in enumerate(priv_words): self.heap[priv_ptr + i] = w
+
+        # 3. Создаем массив-результат [pub_ptr, priv_ptr, wallet_id]
+        res_ptr = priv_ptr + len(priv_words)
+        self.heap[res_ptr] = pub_ptr
+        self.heap[res_ptr + 1] = priv_ptr
+        self.heap[res_ptr + 2] = crypto.wallet_id(pub_words)
+
+        # Возвращаем указатель на массив ключей
+        self.stack.append(res_ptr)
+
+    # --- Табличный движок ---
+
+    def _build_prog(self):
+        """
+        Декодирует self.code один раз: для каждой инструкции создается
+        замыкание с уже подставленным аргументом и адресом следующей
+        инструкции. Обработчик возвращает новый pc (вне кода - останов).
+        """
+        vm = self
+        code = self.code
+        stack, memory, heap = self.stack, self.memory, self.heap
+        push, pop = stack.append, stack.pop
+        M = MASK64
+
+        def op_push(arg, nxt):
+            def h(): push(arg); return nxt
+            return h
+
+        def op_pop(arg, nxt):
+            def h():
+                if stack: pop()
+                return nxt
+            return h
+
+        def op_load(arg, nxt):
+            def h(): push(memory[arg]); return nxt
+            return h
+
+        def op_store(arg, nxt):
+            def h():
+                if stack:
+                    v = pop()
+                    try: memory[arg] = v
+                    except (IndexError, OverflowError): store(memory, arg, v)
+                return nxt
+            return h
+
+        def op_lload(arg, nxt):
+            def h():
+                idx = vm.fp - arg - 1
+                push(stack[idx] if 0 <= idx < len(stack) else 0)
+                return nxt
+            return h
+
+        def op_lstore(arg, nxt):
+            def h():
+                idx = vm.fp - arg - 1
+                if 0 <= idx < len(stack) and stack: stack[idx] = pop()
+                return nxt
+            return h
+
+        def op_add(arg, nxt):
+            def h(): b = pop(); push((pop() + b) & M); return nxt
+            return h
+
+        def op_sub(arg, nxt):
+            def h(): b = pop(); push((pop() - b) & M); return nxt
+            return h
+
+        def op_mul(arg, nxt):
+            def h(): b = pop(); push((pop() * b) & M); return nxt
+            return h
+
+        def op_div(arg, nxt):
+            def h(): b, a = pop(), pop(); push(a // b if b != 0 else 0); return nxt
+            return h
+
+        def op_eq(arg, nxt):
+            def h(): b = pop(); push(1 if pop() == b else 0); return nxt
+            return h
+
+        def op_ne(arg, nxt):
+            def h(): b = pop(); push(1 if pop() != b else 0); return nxt
+            return h
+
+        def op_lt(arg, nxt):
+            def h(): b = pop(); push(1 if pop() < b else 0); return nxt
+            return h
+
+        def op_gt(arg, nxt):
+            def h(): b = pop(); push(1 if pop() > b else 0); return nxt
+            return h
+
+        def op_land(arg, nxt):
+            def h(): b, a = pop(), pop(); push(1 if a and b else 0); return nxt
+            return h
+
+        def op_lor(arg, nxt):
+            def h(): b, a = pop(), pop(); push(1 if a or b else 0); return nxt
+            return h
+
+        def op_band(arg, nxt):
+            def h(): b = pop(); push(pop() & b); return nxt
+            return h
+
+        def op_bor(arg, nxt):
+            def h(): b = pop(); push(pop() | b); return nxt
+            return h
+
+        def op_bxor(arg, nxt):
+            def h(): b = pop(); push(pop() ^ b); return nxt
+            return h
+
+        def op_shr(arg, nxt):
+            def h(): b = pop() % 64; push((pop() & M) >> b); return nxt
+            return h
+
+        def op_shl(arg, nxt):
+            def h(): b = pop() % 64; push((pop() << b) & M); return nxt
+            return h
+
+        def op_jmp(arg, nxt):
+            def h(): return arg
+            return h
+
+        def op_jz(arg, nxt):
+            def h(): return arg if pop() == 0 else nxt
+            return h
+
+        def op_call(arg, nxt):
+            call_stack = vm.call_stack
+
+            def h():
+                call_stack.append((nxt, vm.fp))
+                vm.fp = len(stack)
+                return arg
+            return h
+
+        def op_ret(arg, nxt):
+            call_stack = vm.call_stack
+
+            def h():
+                val = pop() if stack else 0
+                if not call_stack:
+                    vm.pc = nxt
+                    return HALT
+                ret_pc, prev_fp = call_stack.pop()
+                base = vm.fp - arg
+                del stack[base if base > 0 else 0:]  # Чистим кадр вместе с аргументами
+                vm.fp = prev_fp
+                push(val)
+                return ret_pc
+            return h
+
+        def op_new(arg, nxt):
+            def h(): size = pop(); push(vm.hp); vm.hp += int(size); return nxt
+            return h
+
+        def op_hload(arg, nxt):
+            def h(): idx = pop(); push(heap[int(pop() + idx)]); return nxt
+            return h
+
+        span = self.cache_span
+
+        def op_hstore(arg, nxt):
+            def h():
+                v, i, b = pop(), pop(), pop()
+                try: heap[int(b + i)] = v
+                except (IndexError, OverflowError): store(heap, int(b + i), v)
+                if span[0] <= b + i <= span[1]: vm._cache_invalidate(int(b + i), int(b + i) + 1)
+                return nxt
+            return h
+
+        # --- Суперинструкции (см. xvm_superops) ---
+        def op_lload_opc(arg, nxt):
+            bop, c = code[nxt - 2], code[nxt - 1]
+            f = BINOPS[bop]
+
+            def h():
+                idx = vm.fp - arg - 1
+                push(f(stack[idx] if 0 <= idx < len(stack) else 0, c))
+                return nxt
+            return h
+
+        def op_load_opc(arg, nxt):
+            bop, c = code[nxt - 2], code[nxt - 1]
+            f = BINOPS[bop]
+            if bop == 10:
+                def h(): push((memory[arg] + c) & M); return nxt
             else:
-                self.stack.append(0)
-
-        # --- НАТИВНАЯ КРИПТОГРАФИЯ (Исправлено положение блоков) ---
-        elif op == 62:  # SHA512 Native
-            # Стек: [ptr_data, size] -> [ptr_hash_result]
-            size = self.stack.pop()
-            ptr = self.stack.pop()
-
-            # Читаем сырые байты из памяти VM
-            data_bytes = bytearray()
-            # Предполагаем, что 1 слово памяти = 1 байт данных (упрощенная модель)
-            for i in range(size):
-                val = self.heap[ptr + i]
-                data_bytes.append(val & 0xFF)
-
-            # Вызываем Python функцию
-            hash_words = crypto.get_sha512_hash(data_bytes)
-
-            # Записываем результат (8 слов) в кучу
-            res_ptr = self.hp
-            for w in hash_words:
-                self.heap[self.hp] = w
-                self.hp += 1
-
-            self.stack.append(res_ptr)
-
-        elif op == 63:  # Ed25519 Keygen Native
-            # Стек: [] -> [ptr_to_keys_array]
-
-            pub_words, priv_words = crypto.generate_ed25519_keys()
-
-            # 1. Сохраняем Public Key (4 слова) в кучу
-            pub_ptr = self.hp
-            for w in pub_words:
-                self.heap[self.hp] = w
-                self.hp += 1
-
-            # 2. Сохраняем Private Key (4 слова) в кучу
-            priv_ptr = self.hp
-            for w in priv_words:
-                self.heap[self.hp] = w
-                self.hp += 1
-
-            # 3. Создаем массив-результат [pub_ptr, priv_ptr]
-            res_ptr = self.hp
-            self.heap[self.hp] = pub_ptr
-            self.hp += 1
-            self.heap[self.hp] = priv_ptr
-            self.hp += 1
-
-            # Возвращаем указатель на массив ключей
-            self.stack.append(res_ptr)
+                def h(): push(f(memory[arg], c)); return nxt
+            return h
+
+        def op_cmpc_jz(arg, nxt):
+            f, target = BINOPS[code[nxt - 2]], code[nxt - 1]
+
+            def h(): return target if f(pop(), arg) == 0 else nxt
+            return h
+
+        def op_load_hloadc(arg, nxt):
+            c = code[nxt - 1]
+
+            def h(): push(heap[int(memory[arg] + c)]); return nxt
+            return h
+
+        def op_lload_hloadc(arg, nxt):
+            c = code[nxt - 1]
+
+            def h():
+                idx = vm.fp - arg - 1
+                push(heap[int((stack[idx] if 0 <= idx < len(stack) else 0) + c)])
+                return nxt
+            return h
+
+        def op_load2_hload(arg, nxt):
+            i = code[nxt - 1]
+
+            def h(): push(heap[int(memory[arg] + memory[i])]); return nxt
+            return h
+
+        def op_nop(arg, nxt):
+            def h(): return nxt
+            return h
+
+        def op_sys(name):
+            method = getattr(vm, name)
+
+            def make(arg, nxt):
+                def h(): vm.pc = nxt; method(); return nxt
+                return h
+            return make
+
+        table = {
+            1: op_push, 2: op_pop, 3: op_load, 4: op_store, 5: op_lload, 6: op_lstore,
+            10: op_add, 11: op_sub, 12: op_mul, 13: op_div, 14: op_eq, 15: op_ne,
+            16: op_lt, 17: op_gt, 18: op_land, 19: op_lor, 7: op_band, 8: op_bor, 9: op_bxor,
+            32: op_shr, 33: op_shl, 20: op_jmp, 30: op_jz, 21: op_call, 22: op_ret,
+            41: op_new, 42: op_hload, 43: op_hstore,
+            70: op_lload_opc, 71: op_load_opc, 73: op_cmpc_jz,
+            74: op_load_hloadc, 75: op_lload_hloadc, 76: op_load2_hload,
+        }
+        for op, name in SYSCALLS.items(): table[op] = op_sys(name)
+
+        # prog[pc] - обработчик инструкции по адресу pc (адреса четные)
+        prog = [None] * len(code)
+        for pc, op, arg in instructions(code):
+            prog[pc] = table.get(op, op_nop)(arg, pc + (4 if op in SUPER_OPS else 2))
+        if self.jit and self.functions:
+            self.jit_compiled = {}
+            xvm_jit.install(self, prog)
+        self._prog = prog
+        self._prog_bound = (self.code, self.stack, self.memory, self.heap, self.call_stack)
+
+    def _run_table(self):
+        if not self.running: return
+        bound = self._prog_bound
+        if bound is None or any(x is not y for x, y in zip(bound, (
+                self.code, self.stack, self.memory, self.heap, self.call_stack))):
+            self._build_prog()
+        prog = self._prog
+        n = len(prog)
+        pc = self.pc
+        try:
+            while 0 <= pc < n:
+                pc = prog[pc]()
+        except Exception:
+            self.pc = pc + 2
+            raise
+        if pc != HALT: self.pc = pc
+        self.running = False
 
     def execute_function(self, addr, args):
         for a in reversed(args): self.stack.append(a)
@@ -254,8 +869,11 @@ class XVM:
         self.fp = len(self.stack)
         self.pc = addr
         self.running = True
-        while self.running: self.step()
+        self.run()
         return self.stack.pop() if self.stack else 0
 
     def run(self):
-        while self.running: self.step()
\ No newline at end of file
+        if self.engine == "table":
+            self._run_table()
+        else:
+            while self.running: self.step()
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Глубокий аудит цепочки: хеш каждого блока пересчитывается из хранилища.
+
+bc_verify_full_integrity сверяет только ph0-ph7 блока с h0-h7 предыдущего.
+Здесь хеш блока заново считается так же, как в bc_commit_block:
+SHA-512 от ph0-ph7 + payload, где каждое слово дает один байт (режим 0,
+младший байт слова) или 8 байт big-endian (режим 1, флаг FLAG_WORD_HASH).
+
+Цепочка делится на непрерывные диапазоны, которые проверяются параллельно
+в ProcessPoolExecutor; каждый диапазон возвращает ph первого и h последнего
+блока, и связи на границах сшиваются в конце. Блоки с FLAG_PARTIAL
+(импортированы из chain.json без полного payload) пересчитать нельзя -
+у них проверяются только связи. У блоков транзакций (тип 5) дополнительно
+пересчитывается Merkle root, как в bc_merkle_root.
+
+  python xvm_audit.py [chain.blk] [--workers N]
+"""
+import os
+import sys
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from array import array
+
+import crypto
+from xvm_blockstore import BlockStore, CHAIN_STORE, FLAG_PARTIAL, FLAG_WORD_HASH, TX_BLOCK, TX_HEADER, transactions
+
+GENESIS_PREV = (0,) * 8
+CHUNKS_PER_WORKER = 4  # диапазонов на процесс (выравнивание нагрузки)
+MIN_CHUNK = 2000  # меньшие цепочки проверяются без пула процессов
+MAX_ERRORS = 100  # ошибок в отчете не больше
+
+def _sha512_words(words, word_mode=False):
+    """SHA-512 слов VM, как crypto_hash; упаковка слов - общая с VM (crypto.pack_words)."""
+    raw = crypto.pack_words(array("Q", words), crypto.HASH_WORDS if word_mode else crypto.HASH_BYTES)
+    return crypto.digest_words(hashlib.sha512(raw).digest())
+
+
+def block_digest(block):
+    """Хеш блока, как его считает bc_commit_block (crypto_block_hash в режиме блока)."""
+    return _sha512_words((*block.prev, *block.payload), block.flags & FLAG_WORD_HASH)
+
+
+def merkle_root(block):
+    """Merkle root транзакций блока типа 5, как его считает bc_merkle_root."""
+    word_mode = block.flags & FLAG_WORD_HASH
+    level = [_sha512_words((tx.type, len(tx.payload), *tx.payload), word_mode) for tx in transactions(block)]
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [_sha512_words(level[k] + level[k + 1], word_mode) for k in range(0, len(level), 2)]
+    return level[0] if level else None
+
+
+def audit_range(path, start, end):
+    """
+    Проверяет блоки start..end-1: номер, связь с предыдущим внутри диапазона
+    и пересчитанный хеш. Возвращает (start, end, ph первого, h последнего,
+    пересчитано, пропущено, ошибки).
+    """
+    store = BlockStore(path, readonly=True)
+    try:
+        first_prev = last_hash = None
+        recomputed = partial = 0
+        errors = []
+        for i in range(start, end):
+            block = store.get(i)
+            if block is None:
+                errors.append((i, "missing"))
+                break
+            if block.index != i:
+                errors.append((i, "index mismatch"))
+            if last_hash is None:
+                first_prev = block.prev
+            elif block.prev != last_hash:
+                errors.append((i, "prev hash mismatch"))
+            if block.flags & FLAG_PARTIAL:
+                partial += 1
+            else:
+                if block_digest(block) != block.hash:
+                    errors.append((i, "hash mismatch"))
+                if block.type == TX_BLOCK and merkle_root(block) != block.payload[1:TX_HEADER]:
+                    errors.append((i, "merkle root mismatch"))
+                recomputed += 1
+            last_hash = block.hash
+        return start, end, first_prev, last_hash, recomputed, partial, errors[:MAX_ERRORS]
+    finally:
+        store.close()
+
+
+def split_ranges(n, parts):
+    """Непрерывные диапазоны [start, end) блоков 1..n."""
+    parts = max(1, min(parts, n))
+    step, extra = divmod(n, parts)
+    ranges, start = [], 1
+    for k in range(parts):
+        end = start + step + (1 if k < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def deep_audit(path=CHAIN_STORE, workers=None):
+    """
+    Полный пересчет цепочки. Отчет: is_valid, blocks, recomputed, partial,
+    errors [(номер, причина)], tip_hash, workers, seconds, blocks_per_sec.
+    """
+    t0 = time.perf_counter()
+    store = BlockStore(path, readonly=True)
+    n = len(store)
+    store.close()
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or n < MIN_CHUNK:
+        workers = 1
+        results = [audit_range(path, 1, n + 1)] if n else []
+    else:
+        ranges = split_ranges(n, workers * CHUNKS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(audit_range, [path] * len(ranges), *zip(*ranges)))
+
+    # Сшивание: ph первого блока диапазона == h последнего блока предыдущего
+    errors, prev_hash = [], GENESIS_PREV
+    for start, end, first_prev, last_hash, _, _, range_errors in results:
+        if first_prev is not None and first_prev != prev_hash:
+            errors.append((start, "prev hash mismatch"))
+        errors.extend(range_errors)
+        prev_hash = last_hash if last_hash is not None else prev_hash
+    errors.sort()
+
+    seconds = time.perf_counter() - t0
+    return {
+        "is_valid": not errors,
+        "blocks": n,
+        "recomputed": sum(r[4] for r in results),
+        "partial": sum(r[5] for r in results),
+        "errors": errors[:MAX_ERRORS],
+        "tip_hash": prev_hash,
+        "workers": workers,
+        "seconds": round(seconds, 3),
+        "blocks_per_sec": round(n / seconds) if seconds > 0 else 0,
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="recompute every block hash of an XVM block store")
+    ap.add_argument("store", nargs="?", default=CHAIN_STORE)
+    ap.add_argument("--workers", type=int, default=None, help="audit processes (default: CPU count)")
+    args = ap.parse_args()
+
+    report = deep_audit(args.store, args.workers)
+    for index, reason in report["errors"]:
+        print(f"Audit: BROKEN at block {index}: {reason}")
+    print(f"Audit: {report['blocks']} blocks, {report['recomputed']} recomputed, {report['partial']} partial, "
+          f"{report['workers']} workers, {report['seconds']}s ({report['blocks_per_sec']} blocks/s)")
+    print("Audit: chain is valid." if report["is_valid"] else "Audit: chain is BROKEN.")
+    sys.exit(0 if report["is_valid"] else 1)
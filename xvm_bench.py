@@ -0,0 +1,379 @@
+"""
+Офлайн-бенчмарки XVM и цепочки с отслеживанием регрессий.
+
+Случаи (все метрики - время на единицу работы, меньше - лучше):
+
+  vm.step.reference    нс на шаг: XVM.step в цикле (эталонный движок) на синтетическом цикле
+  vm.step.table        нс на шаг: тот же цикл на табличном движке
+  sha512.transform     мкс: один sha512_transform на чистом xlang (блок 128 байт)
+  sha512.native        мкс: native_sha512 от 128 байт через системный вызов (crypto_hash)
+  chain.commit_block   мкс на блок: bc_commit_block (NFT, режим хеша 1, без fsync)
+  chain.load_state.N   мс: bc_load_state на цепочке из N блоков (1k, 10k, 100k)
+  chain.verify_full.N  мс: bc_verify_full_integrity на той же цепочке
+  compile.main         мс: полная компиляция main.xl без кеша .xlc
+
+Каждый случай повторяется repeat раз (9, в --quick 5); значение - медиана,
+рядом пишется разброс (межквартильный размах, доля от медианы). Цепочки
+строятся синтетически (блоки NFT с настоящими хешами, как у
+bc_commit_block), исходники .xl копируются во временный каталог, поэтому
+рабочие файлы узла не трогаются.
+
+Результаты пишутся в JSON и сравниваются с базовым файлом: случай, который
+стал медленнее больше чем на порог, - регрессия, и прогон завершается с
+кодом 1. Порог случая - max(threshold, NOISE_FACTOR * разброс базы): на
+шумной машине граница раздвигается, а не дает ложных регрессий. Разброс
+текущего прогона порог не меняет - иначе медленный и шумный прогон сам
+оправдывал бы свою регрессию.
+
+Базовые числа зависят от машины, поэтому bench_baseline.json не хранится в
+репозитории: каждый снимает свою базу с --save-baseline. Если окружение базы
+(meta: quick, python, машина, уровень оптимизации) не совпадает с текущим,
+сравнение отказывается работать (код 2); --force сравнивает с
+предупреждением.
+
+  python xvm_bench.py --save-baseline
+  python xvm_bench.py [--quick] [--only PREFIX] [--threshold 0.25] [--force]
+"""
+import os
+import io
+import gc
+import sys
+import json
+import time
+import shutil
+import platform
+import statistics
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+from main import compile_program, create_vm, init_globals, DEFAULT_OPT_LEVEL
+from xvm_chainwriter import ChainWriter
+from xvm_blockstore import CHAIN_STORE, FLAG_WORD_HASH, BlockStore, Block
+from xvm_audit import GENESIS_PREV, block_digest
+
+RESULTS_FILE = "bench_results.json"
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_THRESHOLD = 0.25  # регрессия - медленнее базы больше чем на 25%
+NOISE_FACTOR = 3  # порог случая не ниже NOISE_FACTOR разбросов замера
+DEFAULT_REPEAT, QUICK_REPEAT = 9, 5
+FORMAT_VERSION = 2
+# Поля meta, которые должны совпадать у базы и прогона
+COMPARABLE_META = ("quick", "python", "implementation", "machine", "system", "node", "opt_level")
+CHAIN_SIZES = (1000, 10000, 100000)
+QUICK_CHAIN_SIZES = (1000, 10000)
+LOOP_ITERATIONS = 20000
+COMMIT_BLOCKS = 200
+OWNER = 0x1000
+
+# Синтетический цикл для шагов VM: арифметика, сравнение и переход
+LOOP_SOURCE = """
+func bench_loop(n) {
+    var s = Int(0);
+    for (var i = Int(0); i < n; i = i + Int(1)) { s = s + (i ^ Int(3)); }
+    return s;
+}
+
+func main() { return Int(0); }
+"""
+
+
+def timed(fn):
+    """(время fn() в секундах, результат); сборщик мусора на время замера отключен, как в timeit."""
+    gc.collect()
+    gc.disable()
+    try:
+        t = time.perf_counter()
+        result = fn()
+        return time.perf_counter() - t, result
+    finally:
+        gc.enable()
+
+
+def samples(fn, repeat):
+    """Времена fn() в секундах, repeat запусков."""
+    return [timed(fn)[0] for _ in range(repeat)]
+
+
+def spread(values):
+    """Межквартильный размах как доля от медианы (0 для одного замера)."""
+    if len(values) < 2:
+        return 0.0
+    q1, _, q3 = statistics.quantiles(values, n=4)
+    return (q3 - q1) / statistics.median(values)
+
+
+def nft_payload(i):
+    """Слова структуры NFT (NFT_STRUCT_SIZE = 13), как их собирает action_nft_create."""
+    return (i, OWNER, OWNER, *range(i, i + 8), 1715000001, 1)
+
+
+def build_chain(path, n):
+    """Синтетическая цепочка из n блоков NFT с хешами режима 1, как у bc_commit_block."""
+    store = BlockStore(path)
+    store.reset()
+    prev = GENESIS_PREV
+    for i in range(1, n + 1):
+        block = Block(i, 2, FLAG_WORD_HASH, prev, GENESIS_PREV, nft_payload(i))
+        block = block._replace(hash=block_digest(block))
+        store.append(block)
+        prev = block.hash
+    store.save_tip(0)
+    store.close()
+
+
+class Bench:
+    def __init__(self, work, repeat=DEFAULT_REPEAT, quick=False):
+        self.work = work
+        self.repeat = repeat
+        self.chain_sizes = QUICK_CHAIN_SIZES if quick else CHAIN_SIZES
+        self.results = {}
+        self._cg = None
+
+    def record(self, name, seconds, scale, unit):
+        """Случай по замерам seconds: медиана и минимум в unit (секунды * scale), разброс."""
+        self.results[name] = {"value": round(statistics.median(seconds) * scale, 3),
+                              "min": round(min(seconds) * scale, 3),
+                              "spread": round(spread(seconds), 4), "samples": len(seconds), "unit": unit}
+
+    def program(self):
+        """Скомпилированный main.xl (один раз на прогон)."""
+        if self._cg is None:
+            self._cg, _ = compile_program("main.xl", opt_level=DEFAULT_OPT_LEVEL, use_cache=False)
+        return self._cg
+
+    def vm(self, cg=None, **kwargs):
+        cg = cg or self.program()
+        vm = create_vm(cg, chain_writer=ChainWriter("none"), **kwargs)
+        init_globals(vm, cg)
+        return vm, cg.func_addresses
+
+    # --- Случаи ---
+
+    def bench_vm_step(self):
+        with open("bench_loop.xl", "w", encoding="utf-8") as f:
+            f.write(LOOP_SOURCE)
+        cg, _ = compile_program("bench_loop.xl", opt_level=DEFAULT_OPT_LEVEL, use_cache=False)
+        # Шаги считает только эталонный движок; байт-код цикла у движков общий
+        vm, fa = self.vm(cg, engine="reference", jit=False)
+        vm.execute_function(fa["bench_loop"], [LOOP_ITERATIONS])
+        steps = vm.steps
+        for engine in ("reference", "table"):
+            vm, fa = self.vm(cg, engine=engine, jit=False)
+            seconds = samples(lambda: vm.execute_function(fa["bench_loop"], [LOOP_ITERATIONS]), self.repeat)
+            self.record(f"vm.step.{engine}", seconds, 1e9 / steps, "ns/step")
+
+    def bench_sha512(self):
+        vm, fa = self.vm()
+        vm.execute_function(fa["init_sha_constants"], [])
+        h, w, data = vm.alloc_persistent(8), vm.alloc_persistent(80), vm.alloc_persistent(128)
+        for k in range(128):
+            vm.heap[data + k] = k
+        calls = 20
+
+        def transform():
+            for _ in range(calls):
+                for k in range(16):
+                    vm.heap[w + k] = k * 0x0101010101010101
+                vm.execute_function(fa["sha512_transform"], [h, w])
+
+        def native():
+            for _ in range(calls):
+                with vm.arena():
+                    vm.execute_function(fa["crypto_hash"], [data, 128, 0])
+        self.record("sha512.transform", samples(transform, self.repeat), 1e6 / calls, "us")
+        self.record("sha512.native", samples(native, self.repeat), 1e6 / calls, "us")
+
+    def bench_commit_block(self):
+        os.makedirs("commit", exist_ok=True)
+        os.chdir("commit")
+        try:
+            vm, fa = self.vm()
+            vm.execute_function(fa["bc_init"], [])
+            vm.execute_function(fa["bc_hash_init"], [1])
+            nft = vm.alloc_persistent(13)
+            counter = [0]
+
+            def commit():
+                for _ in range(COMMIT_BLOCKS):
+                    counter[0] += 1
+                    for k, word in enumerate(nft_payload(counter[0])):
+                        vm.heap[nft + k] = word
+                    with vm.arena():
+                        vm.execute_function(fa["bc_commit_block"], [nft, 13, 2])
+            seconds = samples(commit, self.repeat)
+            vm.chain_writer.close()
+        finally:
+            os.chdir(self.work)
+        self.record("chain.commit_block", seconds, 1e6 / COMMIT_BLOCKS, "us")
+
+    def bench_chain(self):
+        for n in self.chain_sizes:
+            folder = os.path.join(self.work, f"chain_{n}")
+            os.makedirs(folder, exist_ok=True)
+            os.chdir(folder)
+            try:
+                build_chain(CHAIN_STORE, n)
+                load, verify = [], []
+                for _ in range(self.repeat):
+                    # Свежая VM: в замер входит и открытие хранилища
+                    vm, fa = self.vm()
+                    seconds, ok = timed(lambda: vm.execute_function(fa["bc_load_state"], []))
+                    assert ok == 1, f"bc_load_state failed on {n} blocks"
+                    load.append(seconds)
+                    seconds, ok = timed(lambda: vm.execute_function(fa["bc_verify_full_integrity"], []))
+                    assert ok == 1, f"bc_verify_full_integrity failed on {n} blocks"
+                    verify.append(seconds)
+                    vm.chain_writer.close()
+                    for store in vm.block_stores.values(): store.close()
+            finally:
+                os.chdir(self.work)
+            self.record(f"chain.load_state.{n // 1000}k", load, 1e3, "ms")
+            self.record(f"chain.verify_full.{n // 1000}k", verify, 1e3, "ms")
+
+    def bench_compile(self):
+        seconds = samples(lambda: compile_program("main.xl", opt_level=DEFAULT_OPT_LEVEL, use_cache=False),
+                          self.repeat)
+        self.record("compile.main", seconds, 1e3, "ms")
+
+
+# Префикс имен случаев -> метод (цепочка меряет load_state и verify_full одним проходом)
+CASES = {"vm.step": "bench_vm_step", "sha512": "bench_sha512", "chain.commit_block": "bench_commit_block",
+         "chain.load_state": "bench_chain", "chain.verify_full": "bench_chain", "compile": "bench_compile"}
+
+
+def run_suite(source_dir, repeat=DEFAULT_REPEAT, quick=False, only=None):
+    """Прогон во временном каталоге с копией исходников .xl; результаты {имя: {value, min, spread, ...}}."""
+    methods = list(dict.fromkeys(m for prefix, m in CASES.items()
+                                 if not only or prefix.startswith(only) or only.startswith(prefix)))
+    work = tempfile.mkdtemp(prefix="xvm_bench_")
+    cwd = os.getcwd()
+    for name in os.listdir(source_dir):
+        if name.endswith(".xl"):
+            shutil.copy(os.path.join(source_dir, name), work)
+    bench = Bench(work, repeat, quick)
+    try:
+        os.chdir(work)
+        with redirect_stdout(io.StringIO()):
+            bench.program()
+        for method in methods:
+            known = set(bench.results)
+            # Вывод компилятора и prints VM не смешиваются с результатами
+            with redirect_stdout(io.StringIO()):
+                getattr(bench, method)()
+            for name in [name for name in bench.results if name not in known]:
+                if only and not name.startswith(only):
+                    del bench.results[name]
+                    continue
+                case = bench.results[name]
+                print(f"{name:<28}{case['value']:>14.3f} {case['unit']:<8} ±{case['spread']:.1%}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+    return bench.results
+
+
+def report(results, quick, repeat):
+    return {
+        "version": FORMAT_VERSION,
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "node": platform.node(),
+            "opt_level": DEFAULT_OPT_LEVEL,
+            "quick": quick,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def meta_mismatch(baseline, current):
+    """Поля meta, по которым база несравнима с прогоном: [(поле, база, сейчас)]."""
+    if baseline.get("version") != current["version"]:
+        return [("version", baseline.get("version"), current["version"])]
+    base, meta = baseline.get("meta", {}), current["meta"]
+    return [(key, base.get(key), meta[key]) for key in COMPARABLE_META if base.get(key) != meta[key]]
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Сравнение с базой: [(имя, база, сейчас, изменение, порог, статус)],
+    статус - ok | faster | REGRESSION | new. Порог случая - не меньше
+    NOISE_FACTOR разбросов базы (разброс прогона не учитывается). Случаи,
+    которых нет в прогоне, пропускаются.
+    """
+    rows = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            rows.append((name, None, current["value"], None, None, "new"))
+            continue
+        limit = max(threshold, NOISE_FACTOR * base.get("spread", 0))
+        change = current["value"] / base["value"] - 1
+        status = "REGRESSION" if change > limit else "faster" if change < -limit else "ok"
+        rows.append((name, base["value"], current["value"], change, limit, status))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"\n{'case':<28}{'baseline':>12}{'current':>12}{'change':>10}{'limit':>8}  status "
+          f"(threshold {threshold:.0%}, noise x{NOISE_FACTOR})")
+    for name, base, current, change, limit, status in rows:
+        base_s = f"{base:.3f}" if base is not None else "-"
+        change_s = f"{change:+.1%}" if change is not None else "-"
+        limit_s = f"{limit:.0%}" if limit is not None else "-"
+        print(f"{name:<28}{base_s:>12}{current:>12.3f}{change_s:>10}{limit_s:>8}  {status}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="XVM and chain benchmarks with a regression check against a baseline")
+    ap.add_argument("--quick", action="store_true",
+                    help=f"skip the 100k-block chain and repeat each case {QUICK_REPEAT} times")
+    ap.add_argument("--repeat", type=int, default=None,
+                    help=f"runs per case, the median counts (default {DEFAULT_REPEAT})")
+    ap.add_argument("--only", default=None, help="run only cases whose name starts with this prefix")
+    ap.add_argument("--out", default=RESULTS_FILE, help="results JSON")
+    ap.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON to compare with")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="allowed slowdown as a fraction (0.25 = 25%%), widened for noisy cases")
+    ap.add_argument("--force", action="store_true", help="compare even if the baseline was taken in another setup")
+    ap.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = ap.parse_args()
+
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    repeat = args.repeat or (QUICK_REPEAT if args.quick else DEFAULT_REPEAT)
+    doc = report(run_suite(source_dir, repeat, args.quick, args.only), args.quick, repeat)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    print(f"\n[Bench] Results written to {args.out}.")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+        print(f"[Bench] Baseline saved to {args.baseline}.")
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print(f"[Bench] No baseline {args.baseline}: run with --save-baseline on this machine to create one.")
+        sys.exit(0)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    mismatch = meta_mismatch(baseline, doc)
+    if mismatch:
+        fields = ", ".join(f"{key} {base!r} -> {current!r}" for key, base, current in mismatch)
+        if not args.force:
+            print(f"[Bench] Baseline {args.baseline} is not comparable ({fields}). "
+                  f"Re-run with --save-baseline, or --force to compare anyway.")
+            sys.exit(2)
+        print(f"[Bench] Warning: baseline taken in another setup ({fields}).")
+    rows = compare(doc["results"], baseline["results"], args.threshold)
+    print_comparison(rows, args.threshold)
+    regressions = [row[0] for row in rows if row[5] == "REGRESSION"]
+    if regressions:
+        print(f"[Bench] {len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+    print("[Bench] No regressions.")
@@ -0,0 +1,464 @@
+"""
+Бинарное хранилище блоков (chain.blk) с индексом смещений (chain.blk.idx).
+
+Запись блока (little-endian, с префиксом длины):
+
+  u32 длина записи после префикса
+  u16 версия формата, u16 флаги (FLAG_PARTIAL - payload восстановлен из chain.json,
+  FLAG_WORD_HASH - режим хеша 1, в chain.json поле "hash_mode": 1)
+  u64 индекс блока, u64 тип, u32 число слов payload
+  8 x u64 хеш предыдущего блока (ph0-ph7), 8 x u64 хеш блока (h0-h7)
+  N x u64 payload (все слова структуры, а не только попавшие в JSON)
+
+Индекс - массив u64 смещений записей, поэтому блок i и любое его поле
+читаются за O(1). Если индекс отстает от данных (сбой между двумя
+записями), он достраивается сканированием; недописанный хвост отрезается.
+
+Запись вершины (chain.blk.tip) обновляется после каждого блока: индекс и
+хеш последнего блока, конец его записи в chain.blk и конец chain.json.
+При старте она сверяется только с хвостом файлов; если совпала, индекс
+берется как есть, без сканирования и перезаписи. Иначе (записи нет, сбой
+между файлами) работает полное восстановление и chain.json переписывается
+экспортом.
+
+Блок типа 5 (bc_seal_block) несет транзакции из мемпула и их Merkle root:
+payload = [число транзакций, root (8 слов), тип, размер, слова, ...].
+
+Контрольная точка верификации (chain.blk.ckpt) хранит индекс и хеш
+последнего проверенного блока и смещение конца его записи.
+
+chain.json остается форматом обмена: export_json строит его из хранилища
+байт-в-байт как bc_commit_block, import_json переносит старую цепочку.
+
+  python xvm_blockstore.py export [chain.blk] [chain.json]
+  python xvm_blockstore.py import [chain.json] [chain.blk]
+"""
+import os
+import re
+import sys
+import zlib
+import struct
+from array import array
+from collections import namedtuple
+
+CHAIN_STORE = "chain.blk"
+CHAIN_JSON = "chain.json"
+FORMAT_VERSION = 1
+FLAG_PARTIAL = 1
+FLAG_WORD_HASH = 2  # хеш блока и Merkle root посчитаны по словам целиком (режим хеша 1)
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+_LEN = struct.Struct("<I")
+_HEAD = struct.Struct("<HHQQI")
+_CKPT = struct.Struct("<Q8QQ")  # индекс, хеш (8 слов), смещение конца блока
+_TIP = struct.Struct("<Q8QQQ")  # индекс, хеш, конец chain.blk, конец chain.json (+ crc32)
+_CRC = struct.Struct("<I")
+
+Block = namedtuple("Block", "index type flags prev hash payload")
+Tip = namedtuple("Tip", "index hash end json_end")
+
+# Поля payload, которые bc_commit_block пишет в chain.json: тип -> [(имя, слово)]
+JSON_PAYLOAD = {
+    1: [("pub_key", 0), ("role", 1), ("timestamp", 2)],
+    2: [("nft_id", 0), ("owner", 1), ("status", 12)],
+    3: [("nft_id", 0), ("new_owner", 1), ("timestamp", 2)],
+    4: [("nft_id", 0), ("status", 1), ("timestamp", 2)],
+}
+# Размер структуры payload по типу (base.xl: WALLET / NFT / transfer / deactivate)
+PAYLOAD_SIZE = {1: 7, 2: 13, 3: 3, 4: 3}
+# Блок транзакций из мемпула (bc_seal_block): payload = [число транзакций,
+# merkle root (8 слов), затем по каждой транзакции: тип, размер, слова]
+TX_BLOCK = 5
+TX_HEADER = 9
+
+
+def _field_getter(key):
+    """Ключ поля (как в json_get_hash) -> функция Block -> слово."""
+    if key == "index": return lambda b: b.index
+    if key == "type": return lambda b: b.type
+    if key == "flags": return lambda b: b.flags
+    if key == "size": return lambda b: len(b.payload)
+    m = re.fullmatch(r"(ph|h|p)(\d+)", key)
+    if not m:
+        return lambda b: 0
+    part, k = m.group(1), int(m.group(2))
+    words = {"ph": lambda b: b.prev, "h": lambda b: b.hash, "p": lambda b: b.payload}[part]
+    return lambda b: words(b)[k] if k < len(words(b)) else 0
+
+
+_GETTERS = {}
+
+
+def encode(block):
+    words = array("Q", [w & MASK64 for w in (*block.prev, *block.hash, *block.payload)])
+    body = _HEAD.pack(FORMAT_VERSION, block.flags, block.index, block.type, len(block.payload)) + words.tobytes()
+    return _LEN.pack(len(body)) + body
+
+
+def decode(body):
+    version, flags, index, type_id, n = _HEAD.unpack_from(body)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported block record version: {version}")
+    words = array("Q")
+    words.frombytes(body[_HEAD.size:_HEAD.size + 8 * (16 + n)])
+    return Block(index, type_id, flags, tuple(words[:8]), tuple(words[8:16]), tuple(words[16:]))
+
+
+def transactions(block):
+    """Транзакции блока типа 5 как Block(index, type, ...) с payload транзакции."""
+    p, txs, k = block.payload, [], TX_HEADER
+    for _ in range(p[0] if p else 0):
+        type_id, size = p[k], p[k + 1]
+        txs.append(block._replace(type=type_id, payload=p[k + 2:k + 2 + size]))
+        k += 2 + size
+    return txs
+
+
+def _tx_lists(block):
+    """Транзакции блока типа 5 в виде списков [тип, размер, слова...] из chain.json."""
+    return [[tx.type, len(tx.payload), *tx.payload] for tx in transactions(block)]
+
+
+def decode_at(buf, offset):
+    """Блок из записи, начинающейся в buf[offset] (bytes или mmap)."""
+    n = _LEN.unpack_from(buf, offset)[0]
+    return decode(buf[offset + _LEN.size:offset + _LEN.size + n])
+
+
+def record_end(buf, offset):
+    """Конец записи, начинающейся в buf[offset]."""
+    return offset + _LEN.size + _LEN.unpack_from(buf, offset)[0]
+
+
+def read_tip(tip_path):
+    """Запись вершины (Tip) или None, если ее нет или она повреждена (crc32)."""
+    try:
+        with open(tip_path, "rb") as f:
+            raw = f.read(_TIP.size + _CRC.size)
+    except OSError:
+        return None
+    if len(raw) != _TIP.size + _CRC.size or zlib.crc32(raw[:_TIP.size]) != _CRC.unpack_from(raw, _TIP.size)[0]:
+        return None
+    index, *words, end, json_end = _TIP.unpack_from(raw)
+    return Tip(index, tuple(words), end, json_end)
+
+
+class BlockStore:
+    def __init__(self, path=CHAIN_STORE, readonly=False):
+        """readonly - только чтение: файлы не создаются и не исправляются (аудит, реплики)."""
+        self.path = path
+        self.readonly = readonly
+        self.index_path = path + ".idx"
+        self.checkpoint_path = path + ".ckpt"
+        self.tip_path = path + ".tip"
+        self.tip = None  # Tip, совпадающая с хранилищем, или None
+        self.dirty = False  # добавлены блоки, вершина еще не записана
+        self._offsets = array("Q")
+        self._last = (None, None)  # (номер, Block) - последний прочитанный блок
+        self._open()
+
+    def _open(self):
+        if self.readonly:
+            self._data = open(self.path, "rb")
+            self._idx = open(self.index_path, "rb") if os.path.exists(self.index_path) else None
+            self._tip_file = None
+        else:
+            self._data = open(self.path, "a+b")
+            self._idx = open(self.index_path, "a+b")
+            self._tip_file = open(self.tip_path, "r+b" if os.path.exists(self.tip_path) else "w+b")
+        raw = b""
+        if self._idx is not None:
+            self._idx.seek(0)
+            raw = self._idx.read()
+        self._offsets.frombytes(raw[:len(raw) - len(raw) % 8])
+        size = os.fstat(self._data.fileno()).st_size
+
+        # Быстрый путь: вершина сходится с длиной индекса и концом данных
+        tip = read_tip(self.tip_path)
+        if tip is not None and len(raw) == 8 * tip.index and size == tip.end:
+            self._end, self.tip = size, tip
+            return
+
+        # Отбрасываем смещения за концом данных и достраиваем индекс по данным
+        while self._offsets and self._offsets[-1] >= size:
+            self._offsets.pop()
+        pos = 0
+        if self._offsets:
+            self._data.seek(self._offsets[-1])
+            pos = self._offsets[-1] + _LEN.size + _LEN.unpack(self._data.read(_LEN.size))[0]
+            if pos > size:
+                pos = self._offsets.pop()
+        while pos + _LEN.size <= size:
+            self._data.seek(pos)
+            n = _LEN.unpack(self._data.read(_LEN.size))[0]
+            if pos + _LEN.size + n > size:
+                break
+            self._offsets.append(pos)
+            pos += _LEN.size + n
+        self._end = pos  # конец последней целой записи
+        if tip is not None and tip.index == len(self._offsets) and tip.end == pos:
+            self.tip = tip
+        if self.readonly:
+            return
+        if pos < size:
+            self._data.truncate(pos)
+        self._idx.truncate(0)
+        self._idx.write(self._offsets.tobytes())
+        self._idx.flush()
+
+    def save_tip(self, json_end):
+        """Записывает вершину (последний блок и конец chain.json) поверх старой."""
+        n = len(self._offsets)
+        block_hash = self.get(n).hash if n else (0,) * 8
+        body = _TIP.pack(n, *block_hash, self._end, json_end)
+        os.pwrite(self._tip_file.fileno(), body + _CRC.pack(zlib.crc32(body)), 0)
+        self.tip = Tip(n, block_hash, self._end, json_end)
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def refresh(self):
+        """
+        Для readonly: подхватывает блоки, дописанные через другой дескриптор
+        (писатель VM, другой процесс). Берутся только записи, целиком
+        лежащие в данных; если индекс стал короче (reset), он читается заново.
+        """
+        if self._idx is None:
+            if not os.path.exists(self.index_path):
+                return len(self._offsets)
+            self._idx = open(self.index_path, "rb")
+        self._last = (None, None)
+        n = len(self._offsets)
+        if os.fstat(self._idx.fileno()).st_size < 8 * n:
+            self._offsets, self._end, n = array("Q"), 0, 0
+        self._idx.seek(8 * n)
+        raw = self._idx.read()
+        new = array("Q")
+        new.frombytes(raw[:len(raw) - len(raw) % 8])
+        size = os.fstat(self._data.fileno()).st_size
+        for offset in new:
+            self._data.seek(offset)
+            head = self._data.read(_LEN.size)
+            if len(head) < _LEN.size or offset + _LEN.size + _LEN.unpack(head)[0] > size:
+                break
+            self._offsets.append(offset)
+            self._end = offset + _LEN.size + _LEN.unpack(head)[0]
+        return len(self._offsets)
+
+    def append(self, block):
+        self._data.seek(0, os.SEEK_END)
+        offset = self._data.tell()
+        self._data.write(encode(block))
+        self._data.flush()
+        self._idx.write(struct.pack("<Q", offset))
+        self._idx.flush()
+        self._offsets.append(offset)
+        self._end = self._data.tell()
+        self._last = (len(self._offsets), block)
+        self.tip, self.dirty = None, True
+
+    def get(self, i):
+        """Блок с номером i (с 1, как block_index) или None."""
+        if self._last[0] == i:
+            return self._last[1]
+        if not 1 <= i <= len(self._offsets):
+            return None
+        self._data.seek(self._offsets[i - 1])
+        n = _LEN.unpack(self._data.read(_LEN.size))[0]
+        block = decode(self._data.read(n))
+        self._last = (i, block)
+        return block
+
+    def field(self, i, key):
+        getter = _GETTERS.get(key)
+        if getter is None:
+            getter = _GETTERS[key] = _field_getter(key)
+        block = self.get(i)
+        return getter(block) if block is not None else 0
+
+    def blocks(self, start=1):
+        for i in range(start, len(self._offsets) + 1):
+            yield self.get(i)
+
+    def end_offset(self, i):
+        """Смещение конца записи блока i."""
+        return self._offsets[i] if i < len(self._offsets) else self._end
+
+    def load_checkpoint(self):
+        """
+        (индекс, хеш) последнего проверенного блока или None. Точка
+        отбрасывается, если хранилище короче или блок с этим индексом
+        теперь другой (не тот хеш или не то смещение).
+        """
+        try:
+            with open(self.checkpoint_path, "rb") as f:
+                index, *words = _CKPT.unpack(f.read(_CKPT.size))
+        except (OSError, struct.error):
+            return None
+        block = self.get(index) if index else None
+        if block is None or block.hash != tuple(words[:8]) or self.end_offset(index) != words[8]:
+            return None
+        return index, block.hash
+
+    def save_checkpoint(self, index, block_hash):
+        if not 1 <= index <= len(self._offsets):
+            return
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_CKPT.pack(index, *[w & MASK64 for w in block_hash], self.end_offset(index)))
+        os.replace(tmp, self.checkpoint_path)
+
+    def files(self):
+        return self._data, self._idx, self._tip_file
+
+    def reset(self):
+        """Очищает хранилище (новая цепочка)."""
+        self._data.truncate(0)
+        self._idx.truncate(0)
+        self._offsets = array("Q")
+        self._end = 0
+        self._last = (None, None)
+        self._tip_file.truncate(0)
+        self.tip, self.dirty = None, False
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def close(self):
+        self._data.close()
+        for f in (self._idx, self._tip_file):
+            if f is not None: f.close()
+
+
+# --- Совместимость с chain.json ---
+
+def format_block(block):
+    """Текст блока в точности как его пишет bc_commit_block."""
+    out = ["," if block.index > 1 else "", "\n  {", f"\n    \"index\": {block.index},\n",
+           f"    \"type\": {block.type},\n", "    \"payload\": {\n"]
+    fields = JSON_PAYLOAD.get(block.type, [])
+    for n, (name, k) in enumerate(fields):
+        value = block.payload[k] if k < len(block.payload) else 0
+        out.append(f"      \"{name}\": {value}{',' if n + 1 < len(fields) else ''}\n")
+    if block.type == TX_BLOCK:
+        root = ", ".join(f'"{w}"' for w in block.payload[1:TX_HEADER])
+        txs = ", ".join("[" + ", ".join(map(str, tx)) + "]" for tx in _tx_lists(block))
+        out += [f"      \"tx_count\": {block.payload[0]},\n", f"      \"merkle_root\": [{root}],\n",
+                f"      \"txs\": [{txs}]\n"]
+    out.append("    },\n")
+    if block.flags & FLAG_WORD_HASH:
+        out.append("    \"hash_mode\": 1,\n")
+    out += [f"    \"ph{k}\": \"{w}\",\n" for k, w in enumerate(block.prev)]
+    out += [f"    \"h{k}\": \"{w}\",\n" for k, w in enumerate(block.hash)]
+    out[-1] = out[-1][:-2] + "\n  }"
+    return "".join(out)
+
+
+def block_record(block):
+    """Блок в виде объекта chain.json (те же поля и строковые ph/h)."""
+    record = {"index": block.index, "type": block.type,
+              "payload": {name: (block.payload[k] if k < len(block.payload) else 0)
+                          for name, k in JSON_PAYLOAD.get(block.type, [])}}
+    if block.type == TX_BLOCK:
+        record["payload"] = {"tx_count": block.payload[0],
+                             "merkle_root": [str(w) for w in block.payload[1:TX_HEADER]],
+                             "txs": _tx_lists(block)}
+    record.update((f"ph{k}", str(w)) for k, w in enumerate(block.prev))
+    record.update((f"h{k}", str(w)) for k, w in enumerate(block.hash))
+    return record
+
+
+def export_json(store, json_path=CHAIN_JSON, finished=False):
+    """Пишет chain.json из хранилища. finished добавляет "]" (как bc_finish)."""
+    tmp = json_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("[")
+        for block in store.blocks():
+            f.write(format_block(block))
+        if finished:
+            f.write("\n]")
+    os.replace(tmp, json_path)
+
+
+_JSON_BLOCK = re.compile(r'"index": (\d+),\s*"type": (\d+),\s*"payload": \{(.*?)\},(.*?)\n  \}', re.S)
+
+
+def import_json(json_path, store):
+    """
+    Переносит chain.json в пустое хранилище. В JSON есть не все слова
+    payload (например, хеш документа NFT), такие блоки помечаются FLAG_PARTIAL.
+    Блоки транзакций (тип 5) хранят в JSON все слова и переносятся полностью.
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    count = 0
+    for m in _JSON_BLOCK.finditer(content):
+        index, type_id = int(m.group(1)), int(m.group(2))
+        values = {k: int(v) for k, v in re.findall(r'"(\w+)": "?(-?\d+)"?', m.group(3) + m.group(4))}
+        payload = [0] * PAYLOAD_SIZE.get(type_id, 0)
+        for name, k in JSON_PAYLOAD.get(type_id, []):
+            payload[k] = values.get(name, 0)
+        flags = FLAG_PARTIAL if len(JSON_PAYLOAD.get(type_id, [])) < len(payload) else 0
+        if values.get("hash_mode") == 1:
+            flags |= FLAG_WORD_HASH
+        if type_id == TX_BLOCK:
+            root = re.search(r'"merkle_root": \[(.*?)\]', m.group(3)).group(1)
+            txs = re.search(r'"txs": \[(.*)\]', m.group(3), re.S).group(1)
+            payload = [values.get("tx_count", 0)] + [int(w) for w in re.findall(r'\d+', root)]
+            payload += [int(w) for w in re.findall(r'-?\d+', txs)]
+        store.append(Block(index, type_id, flags, tuple(values.get(f"ph{k}", 0) for k in range(8)),
+                           tuple(values.get(f"h{k}", 0) for k in range(8)), tuple(payload)))
+        count += 1
+    return count
+
+
+def json_end(json_path):
+    """Конец текста блоков в chain.json (без "]" от bc_finish)."""
+    size = os.path.getsize(json_path)
+    with open(json_path, "rb") as f:
+        f.seek(max(0, size - 2))
+        return size - 2 if f.read() == b"\n]" else size
+
+
+def json_matches_tip(store, json_path=CHAIN_JSON):
+    """chain.json сходится с вершиной: та же длина и последний блок в хвосте."""
+    tip = store.tip
+    if tip is None or not tip.index or not os.path.exists(json_path) or json_end(json_path) != tip.json_end:
+        return False
+    tail = format_block(store.get(tip.index)).encode()
+    with open(json_path, "rb") as f:
+        f.seek(max(0, tip.json_end - len(tail)))
+        return f.read(len(tail)) == tail
+
+
+def reconcile(store, json_path=CHAIN_JSON):
+    """
+    Синхронизация при старте узла: старая цепочка без хранилища
+    импортируется, а chain.json, который не сходится с вершиной
+    хранилища (нет файла, сбой между записями), переписывается экспортом.
+    """
+    if not len(store) and os.path.exists(json_path):
+        n = import_json(json_path, store)
+        if n: print(f"[BlockStore] Imported {n} blocks from {json_path}.")
+    elif len(store) and not json_matches_tip(store, json_path):
+        export_json(store, json_path)
+        print(f"[BlockStore] Exported {len(store)} blocks to {json_path}.")
+    if len(store) and store.tip is None:
+        store.save_tip(json_end(json_path))
+
+
+if __name__ == "__main__":
+    cmd, args = (sys.argv[1] if len(sys.argv) > 1 else "export"), sys.argv[2:]
+    if cmd == "export":
+        src, dst = (args + [CHAIN_STORE, CHAIN_JSON][len(args):])[:2]
+        s = BlockStore(src)
+        export_json(s, dst)
+        print(f"Exported {len(s)} blocks to {dst}")
+    elif cmd == "import":
+        src, dst = (args + [CHAIN_JSON, CHAIN_STORE][len(args):])[:2]
+        s = BlockStore(dst)
+        if len(s):
+            sys.exit(f"{dst} is not empty")
+        print(f"Imported {import_json(src, s)} blocks into {dst}")
+    else:
+        sys.exit("usage: python xvm_blockstore.py export|import [src] [dst]")
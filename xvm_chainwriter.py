@@ -0,0 +1,185 @@
+"""
+Буферизованная запись цепочки (chain.json) для XVM.
+
+Фрагменты блока (chain_append / chain_append_int) копятся в памяти, а
+chain_commit пишет весь блок одним вызовом write в заранее открытый файл.
+Когда делать fsync, определяет политика:
+
+  "block"        - после каждого блока;
+  "count:N"      - после каждых N блоков;
+  "interval:MS"  - групповой коммит: не чаще раза в MS миллисекунд; блок,
+                   оставленный без fsync, ставит срок (deadline), и не позже
+                   него fsync делает таймер interval_sync (в сервере - через
+                   очередь VM), даже если новых блоков нет;
+  "none"         - только write, без fsync (как старый fappend).
+
+Внутри batch() блоки только копятся в буфере: на выходе из пакета они
+уходят в файл одним write, а fsync делается один раз (если его требует
+политика).
+
+Перед обычными файловыми системными вызовами (fwrite, fappend, fread) над
+тем же файлом XVM вызывает release(): недописанный буфер уходит в файл, а
+дескриптор закрывается, чтобы порядок записи не нарушался.
+"""
+import os
+import time
+import asyncio
+import traceback
+from contextlib import contextmanager
+
+FSYNC_POLICIES = ("block", "count", "interval", "none")
+DEFAULT_FSYNC = "block"
+
+
+def parse_policy(spec):
+    """'block' | 'count:N' | 'interval:MS' | 'none' -> (политика, параметр)."""
+    name, _, value = spec.partition(":")
+    if name not in FSYNC_POLICIES:
+        raise ValueError(f"Unknown fsync policy: {spec}")
+    if name in ("count", "interval"):
+        if not value.isdigit() or int(value) <= 0:
+            raise ValueError(f"fsync policy {name} needs a positive value, e.g. {name}:10")
+        return name, int(value)
+    return name, 1
+
+
+class ChainWriter:
+    def __init__(self, fsync=DEFAULT_FSYNC):
+        self.policy, self.param = parse_policy(fsync)
+        self._files = {}    # имя файла -> открытый на дозапись файл
+        self._buffers = {}  # имя файла -> фрагменты текущего блока
+        self._attached = []  # чужие файлы, для которых fsync делается вместе с блоком (chain.blk)
+        self._unsynced = 0  # блоков записано после последнего fsync
+        self._last_sync = time.monotonic()
+        self.deadline = None  # interval: срок fsync для записанных без него блоков (monotonic)
+        self._batch = 0  # глубина вложенных batch()
+        self.stats = {"blocks": 0, "writes": 0, "fsyncs": 0, "batches": 0}
+
+    def attach(self, *files):
+        self._attached.extend(files)
+
+    def append(self, name, text):
+        self._buffers.setdefault(name, []).append(text)
+
+    def commit(self, name):
+        """
+        Пишет накопленный блок одним вызовом и применяет политику fsync.
+        Возвращает смещение конца файла (для записи вершины хранилища),
+        внутри batch() - None: блок еще в буфере.
+        """
+        self.stats["blocks"] += 1
+        self._unsynced += 1
+        if self._batch:
+            return None
+        self._write(name)
+        self._apply_policy()
+        return self.end(name)
+
+    def end(self, name):
+        """Смещение конца файла name с учетом уже записанного."""
+        f = self._files.get(name)
+        return f.tell() if f is not None else os.path.getsize(name)
+
+    @contextmanager
+    def batch(self):
+        """Пакет блоков: один write на файл и один fsync на выходе."""
+        self._batch += 1
+        try:
+            yield
+        finally:
+            self._batch -= 1
+            if not self._batch:
+                for name in list(self._buffers):
+                    self._write(name)
+                self.stats["batches"] += 1
+                if self._unsynced:
+                    self._apply_policy()
+
+    def _write(self, name):
+        parts = self._buffers.pop(name, None)
+        if not parts:
+            return
+        f = self._files.get(name)
+        if f is None:
+            f = self._files[name] = open(name, "a", encoding="utf-8")
+        f.write("".join(parts))
+        f.flush()
+        self.stats["writes"] += 1
+
+    def _apply_policy(self):
+        if self._sync_due():
+            self.sync()
+        elif self.policy == "interval" and self.deadline is None:
+            self.deadline = self._last_sync + self.param / 1000
+
+    def sync_delay(self):
+        """Секунды до срока fsync (0 - срок прошел) или None, если ждать нечего."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def sync_if_due(self):
+        """fsync, если срок прошел (вызывается в потоке VM). True - fsync сделан."""
+        if self.deadline is None or time.monotonic() < self.deadline or self._batch:
+            return False
+        self.sync()
+        return True
+
+    def _sync_due(self):
+        if self.policy == "block":
+            return True
+        if self.policy == "count":
+            return self._unsynced >= self.param
+        if self.policy == "interval":
+            return (time.monotonic() - self._last_sync) * 1000 >= self.param
+        return False
+
+    def sync(self):
+        if self.policy != "none":
+            for f in (*self._files.values(), *self._attached):
+                if not f.closed: os.fsync(f.fileno())
+            self.stats["fsyncs"] += 1
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.deadline = None
+
+    def release(self, name):
+        """Дописывает буфер файла и закрывает его (перед fwrite/fappend/fread)."""
+        self._write(name)
+        f = self._files.pop(name, None)
+        if f is not None:
+            if self._unsynced and self.policy != "none":
+                os.fsync(f.fileno())
+            f.close()
+
+    def close(self):
+        """Дописывает все буферы, делает fsync и закрывает файлы."""
+        for name in list(self._buffers):
+            self._write(name)
+        if self._unsynced:
+            self.sync()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+async def interval_sync(writer, submit):
+    """
+    Таймер политики interval:MS: ждет срока writer.deadline и выполняет
+    writer.sync_if_due через submit - корутину, которая отдает функцию в
+    поток VM (в сервере - через очередь VM; если она полна, submit
+    пропускает команду, и fsync сделает следующий срок или блок). Без
+    ожидающих блоков проверяет срок каждые MS/4.
+    """
+    idle = writer.param / 4000
+    while True:
+        delay = writer.sync_delay()
+        await asyncio.sleep(idle if delay is None else delay)
+        if delay is None:
+            continue
+        try:
+            await submit(writer.sync_if_due)
+        except Exception:
+            traceback.print_exc()
+        if writer.sync_delay() == 0:  # Команда пропущена (очередь полна) - повтор через MS/4, без спина
+            await asyncio.sleep(idle)
@@ -0,0 +1,77 @@
+"""
+Единственный исполнитель команд VM для API-узла.
+
+XVM не потокобезопасна: execute_function меняет stack, pc, fp и hp. Все
+команды, которые входят в VM, ставятся в asyncio.Queue ограниченной
+глубины и выполняются по одной в выделенном потоке; обработчик запроса
+ждет результат через await. Если очередь полна, submit сразу бросает
+QueueFull (сервер отвечает 429), а не копит задержку.
+
+Чтение индексов и кеша ответов идет в потоке цикла событий, мимо очереди.
+"""
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUE_DEPTH = 64
+
+
+class QueueFull(Exception):
+    pass
+
+
+class VMExecutor:
+    def __init__(self, depth=QUEUE_DEPTH):
+        self.depth = depth
+        self._queue = None
+        self._worker = None
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="xvm")
+        self.stats = {"executed": 0, "failed": 0, "rejected": 0, "max_wait_ms": 0.0, "max_run_ms": 0.0}
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.depth)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Выполняет уже принятые команды и останавливает поток VM."""
+        if self._worker is not None:
+            await self._queue.join()
+            self._worker.cancel()
+            self._worker = None
+        self._thread.shutdown(wait=True)
+
+    async def submit(self, fn, *args):
+        """Выполняет fn(*args) в потоке VM и возвращает результат."""
+        if self._worker is None:
+            raise RuntimeError("VM executor is not running")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((fn, args, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise QueueFull(f"VM queue is full ({self.depth} commands)")
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            fn, args, future, queued = await self._queue.get()
+            start = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(self._thread, fn, *args)
+            except Exception as e:
+                self.stats["failed"] += 1
+                if not future.cancelled(): future.set_exception(e)
+            else:
+                if not future.cancelled(): future.set_result(result)
+            finally:
+                done = time.perf_counter()
+                stats = self.stats
+                stats["executed"] += 1
+                stats["max_wait_ms"] = max(stats["max_wait_ms"], (start - queued) * 1000)
+                stats["max_run_ms"] = max(stats["max_run_ms"], (done - start) * 1000)
+                self._queue.task_done()
+
+    def queue_stats(self):
+        stats = {k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()}
+        return {"depth": self.depth, "queued": self._queue.qsize() if self._queue else 0, **stats}
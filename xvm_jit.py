@@ -0,0 +1,254 @@
+"""
+JIT-уровень XVM: трансляция базовых блоков функций в Python-замыкания.
+
+Каждый базовый блок функции (от метки до перехода / CALL / RET / системного
+вызова) превращается в Python-функцию без диспетчеризации по опкодам.
+Промежуточные значения стека живут в локальных переменных и выталкиваются
+в настоящий стек VM только на границе блока, поэтому интерпретатор видит
+ровно то же состояние стека, что и без JIT. CALL, RET и системные вызовы
+по-прежнему исполняет табличный движок.
+
+Исходник для функции генерируется один раз и кешируется по ее байт-коду.
+"""
+
+from xvm_superops import SUPER_OPS, CMPC_JZ, instructions, expand, width
+from xvm_memory import store
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+# Опкоды, которые транслируются в блоки (остальные исполняет интерпретатор)
+PURE_OPS = {1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 32, 33, 41, 42, 43,
+            *(SUPER_OPS - {CMPC_JZ})}
+JUMP_OPS = {20, 30, CMPC_JZ}
+
+BINOPS = {
+    10: "({a} + {b}) & M", 11: "({a} - {b}) & M", 12: "({a} * {b}) & M",
+    14: "1 if {a} == {b} else 0", 15: "1 if {a} != {b} else 0",
+    16: "1 if {a} < {b} else 0", 17: "1 if {a} > {b} else 0",
+    18: "1 if {a} and {b} else 0", 19: "1 if {a} or {b} else 0",
+    7: "{a} & {b}", 8: "{a} | {b}", 9: "{a} ^ {b}",
+}
+
+# Кеш фабрик: (адрес, байт-код функции) -> фабрика обработчиков
+_factory_cache = {}
+
+
+def jump_targets(code):
+    """Все адреса, на которые есть переходы в программе."""
+    targets = set()
+    for pc, op, arg in instructions(code):
+        if op == CMPC_JZ:
+            targets.add(code[pc + 3])
+        elif op in JUMP_OPS:
+            targets.add(arg)
+    return targets
+
+
+def function_ranges(code, functions):
+    """Границы функций [start, end) по таблице CodeGen.func_addresses."""
+    starts = sorted(set(functions.values()))
+    return [(s, starts[i + 1] if i + 1 < len(starts) else len(code)) for i, s in enumerate(starts)]
+
+
+class _BlockEmitter:
+    """Генератор исходника одного базового блока с виртуальным стеком."""
+
+    def __init__(self):
+        self.lines = []
+        self.vs = []  # Виртуальная вершина стека: имена временных переменных или литералы
+        self.tmp = 0
+        self.uses_fp = False
+
+    def emit(self, line):
+        self.lines.append(line)
+
+    def new_tmp(self, expr):
+        name = f"t{self.tmp}"
+        self.tmp += 1
+        self.emit(f"{name} = {expr}")
+        return name
+
+    def pop(self):
+        if self.vs:
+            return self.vs.pop()
+        return self.new_tmp("pop()")
+
+    def shift_amount(self):
+        b = self.pop()
+        if b.lstrip("(-").rstrip(")").isdigit():
+            return repr(int(b.strip("()")) % 64)  # Литерал: сдвиг вычисляется при генерации
+        return self.new_tmp(f"{b} % 64")
+
+    def store(self, buf, addr, value):
+        # Быстрый путь; маска и рост array-буфера - в xvm_memory.store
+        self.emit(f"try: {buf}[{addr}] = {value}")
+        self.emit(f"except (IndexError, OverflowError): store({buf}, {addr}, {value})")
+
+    def flush(self):
+        if len(self.vs) == 1:
+            self.emit(f"push({self.vs[0]})")
+        elif self.vs:
+            self.emit(f"s.extend(({', '.join(self.vs)}))")
+        self.vs = []
+
+    def op(self, op, arg):
+        vs = self.vs
+        if op == 1:
+            vs.append(f"({arg!r})" if arg < 0 else repr(arg))
+        elif op == 2:
+            if vs:
+                vs.pop()
+            else:
+                self.emit("if s: pop()")
+        elif op == 3:
+            vs.append(self.new_tmp(f"memory[{arg}]"))
+        elif op == 4:
+            if vs:
+                self.store("memory", arg, vs.pop())
+            else:
+                v = self.new_tmp("pop() if s else None")
+                self.emit(f"if {v} is not None:")
+                self.emit(f"    try: memory[{arg}] = {v}")
+                self.emit(f"    except (IndexError, OverflowError): store(memory, {arg}, {v})")
+        elif op == 5:
+            self.uses_fp = True
+            idx = self.new_tmp(f"fp - {arg + 1}")
+            if vs:
+                n = self.new_tmp("len(s)")
+                self.emit(f"{idx} = s[{idx}] if 0 <= {idx} < {n} else "
+                          f"(({', '.join(vs)},)[{idx} - {n}] if 0 <= {idx} < {n} + {len(vs)} else 0)")
+            else:
+                self.emit(f"{idx} = s[{idx}] if 0 <= {idx} < len(s) else 0")
+            vs.append(idx)
+        elif op == 6:
+            self.uses_fp = True
+            self.flush()
+            idx = self.new_tmp(f"fp - {arg + 1}")
+            self.emit(f"if 0 <= {idx} < len(s) and s: s[{idx}] = pop()")
+        elif op in BINOPS:
+            b = self.pop()
+            a = self.pop()
+            vs.append(self.new_tmp(BINOPS[op].format(a=a, b=b)))
+        elif op == 13:
+            b = self.pop()
+            a = self.pop()
+            vs.append(self.new_tmp(f"{a} // {b} if {b} != 0 else 0"))
+        elif op == 32:
+            b = self.shift_amount()
+            a = self.pop()
+            vs.append(self.new_tmp(f"({a} & M) >> {b}"))
+        elif op == 33:
+            b = self.shift_amount()
+            a = self.pop()
+            vs.append(self.new_tmp(f"({a} << {b}) & M"))
+        elif op == 41:
+            size = self.pop()
+            vs.append(self.new_tmp("vm.hp"))
+            self.emit(f"vm.hp += int({size})")
+        elif op == 42:
+            idx = self.pop()
+            base = self.pop()
+            vs.append(self.new_tmp(f"heap[{base} + {idx}]"))
+        elif op == 43:
+            v = self.pop()
+            i = self.pop()
+            b = self.pop()
+            self.store("heap", f"{b} + {i}", v)
+            self.emit(f"if span[0] <= {b} + {i} <= span[1]: vm._cache_invalidate({b} + {i}, {b} + {i} + 1)")
+
+
+def generate_source(code, start, end, targets):
+    """
+    Генерирует исходник фабрики обработчиков для функции [start, end).
+    Возвращает (исходник, список адресов скомпилированных блоков).
+    """
+    leaders = {start} | {t for t in targets if start <= t < end}
+    for pc, op, _ in instructions(code, start, end):
+        if op not in PURE_OPS:
+            leaders.add(pc + width(op))
+
+    out = ["def _factory(vm, s, memory, heap):",
+           "    push, pop, M = s.append, s.pop, " + str(MASK64),
+           "    span = vm.cache_span",
+           "    handlers = {}"]
+    blocks = []
+    for leader in sorted(leaders):
+        if leader >= end or code[leader] not in PURE_OPS | JUMP_OPS:
+            continue
+        em = _BlockEmitter()
+        pc = leader
+        while True:
+            op, arg = code[pc], code[pc + 1]
+            nxt = pc + width(op)
+            seq = expand(op, arg, code[pc + 2], code[pc + 3]) if op in SUPER_OPS else [(op, arg)]
+            for o, a in seq:
+                if o == 20:
+                    em.flush()
+                    em.emit(f"return {a}")
+                elif o == 30:
+                    cond = em.pop()
+                    em.flush()
+                    em.emit(f"return {a} if {cond} == 0 else {nxt}")
+                else:
+                    em.op(o, a)
+            if seq[-1][0] in (20, 30):
+                break
+            pc = nxt
+            if pc >= end or pc in leaders or code[pc] not in PURE_OPS | JUMP_OPS:
+                em.flush()
+                em.emit(f"return {pc}")
+                break
+        body = (["fp = vm.fp"] if em.uses_fp else []) + em.lines
+        out.append(f"    def b{leader}():")
+        out.extend(f"        {line}" for line in body)
+        out.append(f"    handlers[{leader}] = b{leader}")
+        blocks.append(leader)
+    out.append("    return handlers")
+    return "\n".join(out) + "\n", blocks
+
+
+def get_factory(code, start, end, targets):
+    key = (start, tuple(code[start:end]), frozenset(t for t in targets if start <= t < end))
+    factory = _factory_cache.get(key)
+    if factory is None:
+        source, _ = generate_source(code, start, end, targets)
+        ns = {"store": store}
+        exec(compile(source, f"<xvm-jit@{start}>", "exec"), ns)
+        factory = _factory_cache[key] = ns["_factory"]
+    return factory
+
+
+def install(vm, prog):
+    """
+    Ставит счетчики вызовов на входы функций. Функция компилируется,
+    когда число входов в нее достигает vm.jit_threshold.
+    """
+    code = vm.code
+    targets = jump_targets(code)
+
+    def compile_range(start, end):
+        handlers = get_factory(code, start, end, targets)(vm, vm.stack, vm.memory, vm.heap)
+        for pc, h in handlers.items(): prog[pc] = h
+        vm.jit_compiled[start] = len(handlers)
+
+    for start, end in function_ranges(code, vm.functions):
+        if start >= len(code):
+            continue
+        if vm.jit_threshold <= 0:
+            compile_range(start, end)
+            continue
+
+        def counting(start=start, end=end, orig=prog[start]):
+            count = 0
+
+            def h():
+                nonlocal count
+                count += 1
+                if count < vm.jit_threshold:
+                    return orig()
+                prog[start] = orig
+                compile_range(start, end)
+                return prog[start]()
+            return h
+
+        prog[start] = counting()
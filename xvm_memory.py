@@ -0,0 +1,67 @@
+"""
+Хранилища слов XVM: память глобальных переменных, куча и байт-код.
+
+  "array" - типизированные буферы array('Q'): 8 байт на слово без
+            отдельных объектов int, куча растет вслед за hp;
+  "list"  - списки Python фиксированного размера (прежняя модель, для отладки).
+
+Слово XVM - беззнаковое 64-битное число. array('Q') не принимает
+отрицательные и слишком большие значения: такая запись (как и запись за
+концом буфера) уходит с быстрого пути в store(), которая маскирует значение
+и при необходимости растит буфер. Объект буфера при росте не меняется,
+поэтому замыкания табличного движка и JIT остаются действительными.
+"""
+import sys
+from array import array
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+BACKENDS = ("array", "list")
+DEFAULT_BACKEND = "array"
+
+MEMORY_WORDS = 5000
+HEAP_WORDS = 500000  # Размер кучи list-бэкенда
+HEAP_INITIAL = 1 << 18  # Начальная емкость кучи array-бэкенда (строки начинаются со 100000)
+# Запас за hp: в только что выделенную память можно писать до сдвига hp
+HEAP_SLACK = 1 << 12
+
+
+def words(n, backend):
+    """Буфер из n нулевых слов."""
+    if backend == "array":
+        return array("Q", bytes(8 * n))
+    return [0] * n
+
+
+def code_words(code, backend):
+    """Байт-код для VM. В array-бэкенде - компактная копия (CodeGen.code не трогаем)."""
+    if backend == "array":
+        return array("Q", [w & MASK64 for w in code])
+    return code
+
+
+def grow(buf, size):
+    """Увеличивает array-буфер минимум до size слов (с удвоением емкости)."""
+    if isinstance(buf, array) and len(buf) < size:
+        buf.frombytes(bytes(8 * (max(size, 2 * len(buf)) - len(buf))))
+
+
+def store(buf, addr, value):
+    """Медленный путь записи: маска 64 бита и рост буфера."""
+    if addr >= len(buf):
+        grow(buf, addr + 1)
+    buf[addr] = value & MASK64
+
+
+def clear(buf, start, end):
+    """Обнуляет слова [start, end)."""
+    if end > start:
+        buf[start:end] = array("Q", bytes(8 * (end - start))) if isinstance(buf, array) else [0] * (end - start)
+
+
+def footprint(buf):
+    """Занимаемая память в байтах, включая объекты int вне кеша малых чисел."""
+    size = sys.getsizeof(buf)
+    if isinstance(buf, list):
+        size += sum(sys.getsizeof(v) for v in buf if not -5 <= v <= 256)
+    return size
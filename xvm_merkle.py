@@ -0,0 +1,149 @@
+"""
+Merkle-аккумулятор хешей блоков (Merkle Mountain Range) для доказательств
+включения без загрузки chain.json.
+
+Лист - хеш блока h0-h7 (64 байта big-endian), листья идут по номерам
+блоков. Хеши (SHA-512, с разделением доменов):
+
+  leaf = H(0x00 || h0..h7)
+  node = H(0x01 || left || right)
+  root = H(0x02 || peak_1 || H(0x02 || peak_2 || ... peak_k)) - вершины
+         гор слева направо (одна вершина - сама и есть root)
+
+Добавление блока - O(log n): лист дописывается на уровень 0, и пока на
+уровне четное число узлов, два последних сливаются в узел уровня выше.
+Узлы не меняются, поэтому доказательство строится по индексам за O(log n)
+и для любого прежнего размера дерева (size), без прохода по цепочке.
+
+Доказательство: path - соседи от листа до вершины его горы (направление
+по битам номера листа), peaks - вершины остальных гор, peak - место горы
+блока среди вершин. verify_proof проверяет его без узла. /root подписан
+ключом узла (Ed25519) поверх root_message(size, root): sign_root строит
+ответ, verify_root проверяет его подпись.
+"""
+import struct
+import hashlib
+
+import nacl.signing
+import nacl.exceptions
+
+_HASH = struct.Struct(">8Q")
+LEAF, NODE, PEAK = b"\x00", b"\x01", b"\x02"
+ROOT_DOMAIN = b"XVM-MERKLE-ROOT"
+
+
+def leaf_hash(block_hash):
+    return hashlib.sha512(LEAF + _HASH.pack(*block_hash)).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha512(NODE + left + right).digest()
+
+
+def bag_peaks(peaks):
+    """Root по вершинам гор слева направо."""
+    root = peaks[-1]
+    for peak in reversed(peaks[:-1]):
+        root = hashlib.sha512(PEAK + peak + root).digest()
+    return root
+
+
+def root_message(size, root):
+    """Байты, которые узел подписывает для корня дерева из size блоков."""
+    return ROOT_DOMAIN + struct.pack(">Q", size) + root
+
+
+def sign_root(key, size, root):
+    """Ответ /root: корень дерева из size блоков с подписью ключа узла (SigningKey)."""
+    return {"size": size, "root": root.hex(),
+            "public_key": key.verify_key.encode().hex(),
+            "signature": key.sign(root_message(size, root)).signature.hex()}
+
+
+def verify_root(signed, public_key=None):
+    """Проверяет подпись ответа sign_root (ключом public_key в hex, по умолчанию - из ответа)."""
+    key = nacl.signing.VerifyKey(bytes.fromhex(public_key or signed["public_key"]))
+    try:
+        key.verify(root_message(signed["size"], bytes.fromhex(signed["root"])), bytes.fromhex(signed["signature"]))
+    except nacl.exceptions.BadSignatureError:
+        return False
+    return True
+
+
+def mountains(size):
+    """Горы дерева из size листьев слева направо: [(уровень, номер узла на уровне)]."""
+    result, offset = [], 0
+    for level in range(size.bit_length() - 1, -1, -1):
+        if size >> level & 1:
+            result.append((level, offset >> level))
+            offset += 1 << level
+    return result
+
+
+class MerkleAccumulator:
+    def __init__(self):
+        self.levels = [[]]  # levels[h] - узлы над 2^h листьями, слева направо
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    def append(self, block_hash):
+        node = leaf_hash(block_hash)
+        level = 0
+        self.levels[0].append(node)
+        while len(self.levels[level]) % 2 == 0:
+            nodes = self.levels[level]
+            node = node_hash(nodes[-2], nodes[-1])
+            level += 1
+            if level == len(self.levels):
+                self.levels.append([])
+            self.levels[level].append(node)
+
+    def clear(self):
+        self.levels = [[]]
+
+    def _check_size(self, size):
+        size = len(self) if size is None else size
+        if not 0 < size <= len(self):
+            raise IndexError(f"Tree size {size} is out of range 1..{len(self)}")
+        return size
+
+    def root(self, size=None):
+        size = self._check_size(size)
+        return bag_peaks([self.levels[h][k] for h, k in mountains(size)])
+
+    def proof(self, index, size=None):
+        """Доказательство включения блока index (с 1) в дерево из size блоков."""
+        size = self._check_size(size)
+        if not 1 <= index <= size:
+            raise IndexError(f"Block {index} is not in a tree of {size} blocks")
+        leaf, path, level = index - 1, [], 0
+        # Вверх, пока соседний узел целиком лежит в первых size листьях
+        while ((leaf >> level ^ 1) + 1) << level <= size:
+            path.append(self.levels[level][leaf >> level ^ 1])
+            level += 1
+        mounts = mountains(size)
+        peaks = [self.levels[h][k] for h, k in mounts]
+        position = [h for h, _ in mounts].index(level)
+        return {"index": index, "size": size, "path": [p.hex() for p in path],
+                "peak": position, "peaks": [p.hex() for n, p in enumerate(peaks) if n != position],
+                "root": bag_peaks(peaks).hex()}
+
+
+def verify_proof(block_hash, proof, root=None):
+    """Проверяет доказательство для хеша блока h0-h7; root (hex) - подписанный корень."""
+    index, size = proof["index"], proof["size"]
+    if not 1 <= index <= size:
+        return False
+    # Длина пути и номер вершины задаются (index, size): иначе лист подменяется чужим местом
+    node, leaf, level = leaf_hash(block_hash), index - 1, 0
+    while ((leaf >> level ^ 1) + 1) << level <= size:
+        level += 1
+    levels = [h for h, _ in mountains(size)]
+    if len(proof["path"]) != level or proof["peak"] != levels.index(level) or len(proof["peaks"]) != len(levels) - 1:
+        return False
+    for level, sibling in enumerate(bytes.fromhex(p) for p in proof["path"]):
+        node = node_hash(node, sibling) if leaf >> level & 1 == 0 else node_hash(sibling, node)
+    peaks = [bytes.fromhex(p) for p in proof["peaks"]]
+    peaks.insert(proof["peak"], node)
+    return bag_peaks(peaks).hex() == (root or proof["root"])
@@ -0,0 +1,118 @@
+"""
+Реплики чтения: процессы без VM, которые отвечают на /verify и запросы
+состояния по отображенной в память (mmap) цепочке.
+
+Писатель - единственный процесс с VM - после каждого блока (или пакета)
+обновляет запись вершины chain.blk.tip (BlockStore.save_tip). Это и есть
+файл координации: ChainView читает его одним pread, и если вершина
+сменилась, заново отображает chain.blk и chain.blk.idx до текущей длины.
+mmap не читает файл, поэтому новые блоки видны сразу, без перечитывания
+цепочки; блоки, которые вершина еще не опубликовала, реплике не видны.
+Если вершины нет (старое хранилище или запись на полпути), берутся
+записи индекса, целиком лежащие в данных.
+
+  XVM_ROLE=reader uvicorn server:app --port 8001 --workers N
+"""
+import os
+import mmap
+
+from xvm_blockstore import CHAIN_STORE, TX_BLOCK, TX_HEADER, decode_at, record_end, read_tip
+from xvm_audit import GENESIS_PREV, merkle_root
+
+
+def _map(path):
+    """Отображение файла целиком (только чтение) или None, если файла нет или он пуст."""
+    try:
+        with open(path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError:
+        return None
+
+
+class ChainView:
+    """Хранилище блоков только для чтения поверх mmap (интерфейс чтения BlockStore)."""
+    readonly = True
+
+    def __init__(self, path=CHAIN_STORE):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.tip_path = path + ".tip"
+        self.tip = None  # опубликованная вершина, по которой построено отображение
+        self._data = self._idx = self._offsets = None
+        self._n = 0
+        self._last = (None, None)
+        self.refresh()
+
+    def __len__(self):
+        return self._n
+
+    def refresh(self):
+        """Подхватывает вершину, опубликованную писателем; O(1), если она не менялась."""
+        tip = read_tip(self.tip_path)
+        if tip is not None and tip == self.tip:
+            return self._n
+        self._unmap()
+        self._data, self._idx = _map(self.path), _map(self.index_path)
+        if self._data is None or self._idx is None:
+            return self._n
+        self._offsets = memoryview(self._idx)[:len(self._idx) - len(self._idx) % 8].cast("Q")
+        n, size = len(self._offsets), len(self._data)
+        if tip is not None and tip.index <= n and tip.end <= size:
+            self._n, self.tip = tip.index, tip
+            return self._n
+        # Вершины нет: только записи, целиком лежащие в данных
+        while n and (self._offsets[n - 1] >= size or record_end(self._data, self._offsets[n - 1]) > size):
+            n -= 1
+        self._n = n
+        return n
+
+    def _unmap(self):
+        if self._offsets is not None:
+            self._offsets.release()
+        for m in (self._data, self._idx):
+            if m is not None: m.close()
+        self._data = self._idx = self._offsets = None
+        self._n, self.tip, self._last = 0, None, (None, None)
+
+    def get(self, i):
+        """Блок с номером i (с 1) или None."""
+        if self._last[0] == i:
+            return self._last[1]
+        if not 1 <= i <= self._n:
+            return None
+        block = decode_at(self._data, self._offsets[i - 1])
+        self._last = (i, block)
+        return block
+
+    def blocks(self, start=1):
+        for i in range(start, self._n + 1):
+            yield self.get(i)
+
+    def close(self):
+        self._unmap()
+
+
+def verify_chain(path=CHAIN_STORE, start=1, prev=GENESIS_PREV):
+    """
+    Проверка связей, как bc_verify_from: ph блока == h предыдущего, у блоков
+    типа 5 - Merkle root. start/prev - продолжение с уже проверенного блока;
+    если цепочка с тех пор переписана, проверка идет с начала.
+    Отчет: is_valid, blocks_checked, broken_at, height, tip_hash.
+    """
+    view = ChainView(path)
+    try:
+        if start > 1 and (view.get(start - 1) is None or view.get(start - 1).hash != prev):
+            start, prev = 1, GENESIS_PREV
+        checked, broken = 0, None
+        for block in view.blocks(start):
+            checked += 1
+            if block.prev != prev or (block.type == TX_BLOCK and merkle_root(block) != block.payload[1:TX_HEADER]):
+                broken = block.index
+                break
+            prev = block.hash
+        return {"is_valid": broken is None, "blocks_checked": checked, "broken_at": broken,
+                "height": len(view) if broken is None else broken - 1, "tip_hash": prev}
+    finally:
+        view.close()
@@ -0,0 +1,112 @@
+"""
+Проверка подписей Ed25519 для действий VM (syscall native_verify).
+
+Подписываются слова VM, 8 байт big-endian на слово (crypto.pack_words в
+режиме HASH_WORDS); публичный ключ - 4 слова, подпись - 8 слов:
+
+  mint:     [MSG_MINT, nft_id, owner, creator, doc_hash x8] - ключ создателя
+  transfer: [MSG_TRANSFER, nft_id, new_owner, nonce]         - ключ владельца,
+            nonce - число изменений NFT (создание - 1); сервер принимает
+            только текущий nonce, так что подпись нельзя повторить
+
+SignatureVerifier держит LRU разобранных VerifyKey (по словам ключа) и LRU
+уже проверенных троек (ключ, сообщение, подпись). Сервер проверяет подписи
+до входа в VM - одиночные в пуле потоков, пакеты через verify_many
+параллельно (libsodium отпускает GIL), - поэтому в потоке VM проверка
+обычно сводится к попаданию в кеш.
+"""
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import nacl.signing
+import nacl.exceptions
+
+import crypto
+
+MSG_MINT = 2
+MSG_TRANSFER = 3
+KEY_WORDS, SIG_WORDS = 4, 8
+VERIFY_KEY_CACHE = 4096  # разобранных ключей
+VERIFIED_CACHE = 65536  # проверенных подписей
+BATCH_CHUNK = 64  # подписей на задачу пула в verify_many
+
+_KEY = struct.Struct(">4Q")
+_SIG = struct.Struct(">8Q")
+
+
+def mint_message(nft_id, owner, creator, doc_hash):
+    return [MSG_MINT, nft_id, owner, creator, *doc_hash]
+
+
+def transfer_message(nft_id, new_owner, nonce):
+    return [MSG_TRANSFER, nft_id, new_owner, nonce]
+
+
+def sign_words(priv_key_words, words):
+    """Подпись сообщения из слов VM ключом кошелька (4 слова seed) -> 8 слов."""
+    return crypto.sign_data(crypto.pack_words(words, crypto.HASH_WORDS), priv_key_words)
+
+
+class SignatureVerifier:
+    def __init__(self, key_cache=VERIFY_KEY_CACHE, verified_cache=VERIFIED_CACHE):
+        self.key_cache = key_cache
+        self.verified_cache = verified_cache
+        self._keys = OrderedDict()
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        self.stats = {"verified": 0, "rejected": 0, "cache_hits": 0, "key_hits": 0, "key_misses": 0}
+
+    def _verify_key(self, key):
+        with self._lock:
+            vk = self._keys.get(key)
+            if vk is not None:
+                self._keys.move_to_end(key)
+                self.stats["key_hits"] += 1
+                return vk
+            self.stats["key_misses"] += 1
+        vk = nacl.signing.VerifyKey(_KEY.pack(*key))
+        with self._lock:
+            self._keys[key] = vk
+            if len(self._keys) > self.key_cache:
+                self._keys.popitem(last=False)
+        return vk
+
+    def verify(self, key_words, words, sig_words):
+        """True, если sig_words - подпись слов words ключом key_words."""
+        key, sig = tuple(key_words), tuple(sig_words)
+        if len(key) != KEY_WORDS or len(sig) != SIG_WORDS:
+            return False
+        entry = (key, tuple(words), sig)
+        with self._lock:
+            if entry in self._verified:
+                self._verified.move_to_end(entry)
+                self.stats["cache_hits"] += 1
+                return True
+        try:
+            self._verify_key(key).verify(crypto.pack_words(entry[1], crypto.HASH_WORDS), _SIG.pack(*sig))
+        except (nacl.exceptions.BadSignatureError, ValueError):
+            with self._lock:
+                self.stats["rejected"] += 1
+            return False
+        with self._lock:
+            self.stats["verified"] += 1
+            self._verified[entry] = True
+            if len(self._verified) > self.verified_cache:
+                self._verified.popitem(last=False)
+        return True
+
+    def verify_many(self, items, workers=None):
+        """
+        Пакет [(ключ, слова, подпись)] -> [bool]. Проверяется кусками по
+        BATCH_CHUNK в пуле потоков; результаты попадают в кеш проверенных.
+        """
+        if len(items) <= BATCH_CHUNK:
+            return [self.verify(*item) for item in items]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xvm-sig")
+        chunks = [items[k:k + BATCH_CHUNK] for k in range(0, len(items), BATCH_CHUNK)]
+        return [ok for part in self._pool.map(lambda chunk: [self.verify(*item) for item in chunk], chunks)
+                for ok in part]
@@ -0,0 +1,110 @@
+"""
+Снимок состояния XVM после загрузки узла (xvm.snap).
+
+Формат (little-endian): заголовок _HEAD, затем слова u64 подряд:
+memory, heap[0:hp], stack. В заголовке - хеш байт-кода и вершина цепочки
+(число блоков и хеш последнего), при которых снимок сделан.
+
+Восстановление отображает файл через mmap и копирует слова прямо в уже
+существующие буферы VM (memoryview -> memoryview, без промежуточных
+объектов int), поэтому замыкания табличного движка и JIT остаются
+действительными. Снимок не подходит, если байт-код или вершина цепочки
+изменились - тогда узел загружается обычным путем.
+"""
+import os
+import mmap
+import struct
+import hashlib
+from array import array
+
+from xvm_memory import MASK64
+
+SNAPSHOT_FILE = "xvm.snap"
+SNAPSHOT_VERSION = 1
+_MAGIC = b"XVMS"
+# magic, версия, хеш кода, число блоков, хеш вершины, pc, fp, hp, слов memory, слов stack
+_HEAD = struct.Struct("<4sI32sQ8QqqQQQ")  # pc после execute_function равен -1
+
+
+def code_hash(vm):
+    code = vm.code if isinstance(vm.code, array) else array("Q", [w & MASK64 for w in vm.code])
+    return hashlib.sha256(code.tobytes()).digest()
+
+
+def chain_tip(store):
+    """(число блоков, хеш последнего) хранилища блоков."""
+    n = len(store)
+    return n, (store.get(n).hash if n else (0,) * 8)
+
+
+def _words(buf, start, end):
+    if isinstance(buf, array):
+        return memoryview(buf)[start:end].cast("B")
+    return array("Q", [w & MASK64 for w in buf[start:end]]).tobytes()
+
+
+def save_snapshot(vm, store, path=SNAPSHOT_FILE):
+    """Пишет снимок VM атомарно (tmp + replace). Только вне арены запроса."""
+    if vm.arena_base is not None:
+        raise RuntimeError("Cannot snapshot XVM inside a request arena")
+    n, tip = chain_tip(store)
+    stack = array("Q", [w & MASK64 for w in vm.stack])
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEAD.pack(_MAGIC, SNAPSHOT_VERSION, code_hash(vm), n, *tip,
+                           vm.pc, vm.fp, vm.hp, len(vm.memory), len(stack)))
+        f.write(_words(vm.memory, 0, len(vm.memory)))
+        f.write(_words(vm.heap, 0, vm.hp))
+        f.write(stack.tobytes())
+    os.replace(tmp, path)
+
+
+def _copy_into(buf, mm, offset, count):
+    """count слов из mm[offset:] в начало buf."""
+    src = memoryview(mm)[offset:offset + 8 * count]
+    try:
+        if isinstance(buf, array):
+            with memoryview(buf) as dst:
+                dst.cast("B")[:8 * count] = src
+        else:
+            words = array("Q")
+            words.frombytes(src)
+            buf[:count] = words.tolist()
+    finally:
+        src.release()
+
+
+def load_snapshot(vm, store, path=SNAPSHOT_FILE):
+    """
+    Восстанавливает только что созданную VM из снимка. True, если снимок
+    подошел (тот же байт-код и та же вершина цепочки), иначе False и VM
+    не меняется.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return False
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _HEAD.size:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, chash, n, *rest = _HEAD.unpack_from(mm)
+            tip, (pc, fp, hp, nmem, nstack) = tuple(rest[:8]), rest[8:]
+            if (magic != _MAGIC or version != SNAPSHOT_VERSION or chash != code_hash(vm)
+                    or (n, tip) != chain_tip(store) or nmem > len(vm.memory)
+                    or size != _HEAD.size + 8 * (nmem + hp + nstack)
+                    or (not isinstance(vm.heap, array) and hp > len(vm.heap))):
+                return False
+            vm.hp = hp  # растит кучу array-бэкенда
+            offset = _HEAD.size
+            _copy_into(vm.memory, mm, offset, nmem)
+            offset += 8 * nmem
+            _copy_into(vm.heap, mm, offset, hp)
+            offset += 8 * hp
+            vm.stack[:] = array("Q", mm[offset:offset + 8 * nstack]).tolist()
+    vm.heap_cache.clear()
+    vm.cache_span[:] = [1, 0]
+    vm.pc, vm.fp, vm.running = pc, fp, True
+    vm.heap_high_water = hp
+    return True
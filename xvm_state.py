@@ -0,0 +1,145 @@
+"""
+Индекс состояния мира поверх хранилища блоков.
+
+  nfts:    nft_id -> NFTState(owner, creator, status, block), где block -
+           последний блок, изменивший NFT
+  wallets: pub_key -> role
+  keys:    pub_key -> публичный ключ Ed25519 (4 слова) для проверки подписей;
+           повторный блок кошелька с тем же pub_key не применяется
+  history: nft_id -> номера блоков, касавшихся NFT (создание, передачи, деактивация)
+  owned:   owner -> множество nft_id
+  accumulator: Merkle-аккумулятор хешей блоков (xvm_merkle) для /proof и /root
+
+Ответы read-эндпоинтов кешируются в LRU (ResponseCache) по ключам
+("nft", id), ("history", id), ("wallet", pub), ("block", i); применение
+блока сбрасывает только ключи затронутых NFT и кошельков.
+
+Индекс строится одним проходом при старте, дальше sync() применяет только
+блоки, добавленные после последней синхронизации (bc_commit_block типов
+1-4; блок транзакций типа 5 применяется по транзакциям с номером блока). Если хранилище сброшено или переписано (хеш блока height уже другой),
+индекс строится заново. Хранилище, открытое readonly (отдельный дескриптор
+от писателя VM), перед этим подхватывает новые записи через refresh().
+"""
+from collections import namedtuple, OrderedDict
+
+from xvm_blockstore import TX_BLOCK, transactions
+from xvm_merkle import MerkleAccumulator
+
+NFTState = namedtuple("NFTState", "owner creator status block")
+
+NFT_ACTIVE = 1
+READ_CACHE_SIZE = 4096
+
+
+class ResponseCache:
+    """LRU готовых ответов: ключ -> значение."""
+
+    def __init__(self, maxsize=READ_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "invalidated": 0}
+
+    def get(self, key, build):
+        """Значение из кеша или build() (результат None не кешируется)."""
+        items = self._items
+        if key in items:
+            items.move_to_end(key)
+            self.stats["hits"] += 1
+            return items[key]
+        self.stats["misses"] += 1
+        value = build()
+        if value is not None and self.maxsize:
+            items[key] = value
+            if len(items) > self.maxsize:
+                items.popitem(last=False)
+        return value
+
+    def invalidate(self, *keys):
+        for key in keys:
+            if self._items.pop(key, None) is not None:
+                self.stats["invalidated"] += 1
+
+    def clear(self):
+        self._items.clear()
+
+
+class WorldState:
+    def __init__(self, store, cache_size=READ_CACHE_SIZE):
+        self.store = store
+        self.nfts = {}
+        self.wallets = {}
+        self.keys = {}
+        self.history = {}
+        self.owned = {}
+        self.accumulator = MerkleAccumulator()
+        self.cache = ResponseCache(cache_size)
+        self.height = 0  # блоков уже применено
+        self._tip_hash = None  # хеш блока height
+        self.sync()
+
+    def sync(self):
+        """Применяет новые блоки; O(1), если цепочка не менялась."""
+        store = self.store
+        n = store.refresh() if store.readonly else len(store)
+        if self.height and (n < self.height or store.get(self.height).hash != self._tip_hash):
+            for index in (self.nfts, self.wallets, self.keys, self.history, self.owned):
+                index.clear()
+            self.cache.clear()
+            self.accumulator.clear()
+            self.height = 0
+        if n == self.height:
+            return self
+        for i in range(self.height + 1, n + 1):
+            block = store.get(i)
+            self.apply(block)
+            self.accumulator.append(block.hash)
+        self.height = n
+        self._tip_hash = store.get(n).hash
+        return self
+
+    def apply(self, block):
+        p = block.payload
+        if not p:
+            return
+        if block.type == TX_BLOCK:
+            for tx in transactions(block):
+                self.apply(tx)
+            return
+        if block.type == 1:  # Кошелек: pub_key, role, timestamp, ключ Ed25519 (4 слова)
+            if p[0] in self.wallets:  # ID уже занят: роль и ключ первого кошелька не перезаписываются
+                return
+            self.wallets[p[0]] = p[1] if len(p) > 1 else 0
+            if len(p) >= 7 and any(p[3:7]):
+                self.keys[p[0]] = p[3:7]
+            self.cache.invalidate(("wallet", p[0]))
+            return
+        nft_id, old = p[0], self.nfts.get(p[0])
+        if block.type == 2:  # NFT: nft_id, owner, creator, ..., status
+            new = NFTState(p[1], p[2], p[12] if len(p) > 12 else NFT_ACTIVE, block.index)
+        elif old is None:  # Передача или деактивация неизвестного NFT
+            return
+        elif block.type == 3:  # Передача: nft_id, new_owner
+            new = old._replace(owner=p[1], block=block.index)
+        elif block.type == 4:  # Деактивация: nft_id, status
+            new = old._replace(status=p[1], block=block.index)
+        else:
+            return
+        self.nfts[nft_id] = new
+        self.history.setdefault(nft_id, []).append(block.index)
+        if old is not None and old.owner != new.owner:
+            self.owned[old.owner].discard(nft_id)
+            self.cache.invalidate(("wallet", old.owner))
+        self.owned.setdefault(new.owner, set()).add(nft_id)
+        self.cache.invalidate(("nft", nft_id), ("history", nft_id), ("wallet", new.owner))
+
+    def nft(self, nft_id):
+        return self.nfts.get(nft_id)
+
+    def role(self, pub_key):
+        return self.wallets.get(pub_key)
+
+    def verify_key(self, pub_key):
+        return self.keys.get(pub_key)
+
+    def nfts_of(self, owner):
+        return sorted(self.owned.get(owner, ()))
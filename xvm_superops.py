@@ -0,0 +1,54 @@
+"""
+Суперинструкции XVM (генерирует xlang_peephole).
+
+Обычная инструкция занимает пару слов [op, arg]. Суперинструкция занимает
+две пары: [op, arg] и пару-операнд [x, y], которая никогда не исполняется
+сама по себе (на нее нет переходов).
+
+  70 LLOAD_OPC   [70, local] [binop, c]  = LLOAD local; PUSH c; binop
+  71 LOAD_OPC    [71, addr]  [binop, c]  = LOAD addr; PUSH c; binop
+  73 CMPC_JZ     [73, c]     [cmp, tgt]  = PUSH c; cmp; JZ tgt
+  74 LOAD_HLOADC [74, addr]  [0, c]      = LOAD addr; PUSH c; HLOAD
+  75 LLOAD_HLOADC[75, local] [0, c]      = LLOAD local; PUSH c; HLOAD
+  76 LOAD2_HLOAD [76, base]  [0, idx]    = LOAD base; LOAD idx; HLOAD
+"""
+
+LLOAD_OPC, LOAD_OPC, CMPC_JZ, LOAD_HLOADC, LLOAD_HLOADC, LOAD2_HLOAD = 70, 71, 73, 74, 75, 76
+
+SUPER_OPS = {LLOAD_OPC, LOAD_OPC, CMPC_JZ, LOAD_HLOADC, LLOAD_HLOADC, LOAD2_HLOAD}
+
+# Бинарные операции (pop b, pop a, push a op b) и сравнения
+BINARY_OPS = {7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 32, 33}
+COMPARE_OPS = {14, 15, 16, 17}
+
+
+def width(op):
+    """Длина инструкции в словах."""
+    return 4 if op in SUPER_OPS else 2
+
+
+def expand(op, arg, x, y):
+    """Раскладывает суперинструкцию на исходную последовательность [(op, arg)]."""
+    if op == LLOAD_OPC:
+        return [(5, arg), (1, y), (x, 0)]
+    if op == LOAD_OPC:
+        return [(3, arg), (1, y), (x, 0)]
+    if op == CMPC_JZ:
+        return [(1, arg), (x, 0), (30, y)]
+    if op == LOAD_HLOADC:
+        return [(3, arg), (1, y), (42, 0)]
+    if op == LLOAD_HLOADC:
+        return [(5, arg), (1, y), (42, 0)]
+    if op == LOAD2_HLOAD:
+        return [(3, arg), (3, y), (42, 0)]
+    raise ValueError(f"Not a superinstruction: {op}")
+
+
+def instructions(code, start=0, end=None):
+    """Итерирует (pc, op, arg) с учетом длины суперинструкций."""
+    end = len(code) if end is None else end
+    pc = start
+    while pc < end - 1:
+        op = code[pc]
+        yield pc, op, code[pc + 1]
+        pc += width(op)